@@ -226,7 +226,7 @@ class CommanderStorage(BaseStorage):
         """Write task data"""
         if operation == "insert":
             task_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO tasks 
                 (id, title, description, priority, status, assigned_agent, 
                  parent_task_id, complexity, estimated_duration)
@@ -243,7 +243,7 @@ class CommanderStorage(BaseStorage):
                 data.get('estimated_duration')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE tasks 
                 SET status=?, assigned_agent=?, result=?, error=?,
                     started_at=?, completed_at=?, actual_duration=?
@@ -259,15 +259,13 @@ class CommanderStorage(BaseStorage):
                 data['id']
             ))
         elif operation == "delete":
-            self.conn.execute("DELETE FROM tasks WHERE id=?", (data['id'],))
-        
-        self.conn.commit()
+            self._execute("DELETE FROM tasks WHERE id=?", (data['id'],))
     
     def _write_agent(self, data: Dict[str, Any], operation: str):
         """Write agent registry data"""
         if operation == "insert":
             agent_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO agents
                 (id, name, role, node_id, status, capabilities, 
                  current_task_id, performance_score)
@@ -283,7 +281,7 @@ class CommanderStorage(BaseStorage):
                 data.get('performance_score', 5.0)
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE agents
                 SET status=?, current_task_id=?, last_heartbeat=?,
                     tasks_completed=?, tasks_failed=?, 
@@ -300,15 +298,13 @@ class CommanderStorage(BaseStorage):
                 data['id']
             ))
         elif operation == "delete":
-            self.conn.execute("DELETE FROM agents WHERE id=?", (data['id'],))
-        
-        self.conn.commit()
+            self._execute("DELETE FROM agents WHERE id=?", (data['id'],))
     
     def _write_decision(self, data: Dict[str, Any], operation: str):
         """Write decision history data"""
         if operation == "insert":
             decision_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT INTO decisions
                 (id, decision_type, context, options_considered, chosen_option,
                  reasoning, confidence_score, related_task_id)
@@ -324,7 +320,7 @@ class CommanderStorage(BaseStorage):
                 data.get('related_task_id')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE decisions
                 SET outcome=?, outcome_quality=?
                 WHERE id=?
@@ -333,14 +329,12 @@ class CommanderStorage(BaseStorage):
                 data.get('outcome_quality'),
                 data['id']
             ))
-        
-        self.conn.commit()
     
     def _write_metric(self, data: Dict[str, Any], operation: str):
         """Write metric data"""
         if operation == "insert":
             metric_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT INTO metrics
                 (id, metric_type, metric_name, value, unit, tags)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -352,14 +346,12 @@ class CommanderStorage(BaseStorage):
                 data.get('unit'),
                 json.dumps(data.get('tags', {}))
             ))
-        
-        self.conn.commit()
     
     def _write_goal(self, data: Dict[str, Any], operation: str):
         """Write strategic goal data"""
         if operation == "insert":
             goal_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO goals
                 (id, title, description, goal_type, priority, status,
                  success_criteria, progress, deadline)
@@ -376,7 +368,7 @@ class CommanderStorage(BaseStorage):
                 data.get('deadline')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE goals
                 SET status=?, progress=?, completed_at=?
                 WHERE id=?
@@ -386,14 +378,12 @@ class CommanderStorage(BaseStorage):
                 data.get('completed_at'),
                 data['id']
             ))
-        
-        self.conn.commit()
     
     def _write_communication(self, data: Dict[str, Any], operation: str):
         """Write communication log data"""
         if operation == "insert":
             comm_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT INTO communications
                 (id, from_agent, to_agent, message_type, content, related_task_id)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -405,8 +395,6 @@ class CommanderStorage(BaseStorage):
                 json.dumps(data.get('content', {})),
                 data.get('related_task_id')
             ))
-        
-        self.conn.commit()
     
     # High-level Commander API methods
     
@@ -428,9 +416,12 @@ class CommanderStorage(BaseStorage):
 
     async def get_agent_info(self, agent_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific agent"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM agents WHERE id = ?", (agent_id,))
-        row = cursor.fetchone()
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM agents WHERE id = ?", (agent_id,))
+            return cursor.fetchone()
+        
+        row = await self._read(_query)
         
         if not row:
             return None
@@ -478,11 +469,13 @@ class CommanderStorage(BaseStorage):
         
         query += " ORDER BY performance_score DESC"
         
-        cursor = self.conn.cursor()
-        cursor.execute(query, tuple(params))
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute(query, tuple(params))
+            return cursor.fetchall()
         
         agents = []
-        for row in cursor.fetchall():
+        for row in await self._read(_query):
             agents.append({
                 'id': row[0],
                 'name': row[1],
@@ -520,16 +513,18 @@ class CommanderStorage(BaseStorage):
     
     async def get_active_tasks(self) -> List[Dict[str, Any]]:
         """Get all active tasks"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, title, priority, status, assigned_agent, complexity
-            FROM tasks
-            WHERE status IN ('pending', 'assigned', 'in_progress')
-            ORDER BY priority DESC, created_at ASC
-        """)
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, title, priority, status, assigned_agent, complexity
+                FROM tasks
+                WHERE status IN ('pending', 'assigned', 'in_progress')
+                ORDER BY priority DESC, created_at ASC
+            """)
+            return cursor.fetchall()
         
         tasks = []
-        for row in cursor.fetchall():
+        for row in await self._read(_query):
             tasks.append({
                 'id': row[0],
                 'title': row[1],
@@ -543,20 +538,22 @@ class CommanderStorage(BaseStorage):
     
     async def get_agent_performance_summary(self) -> Dict[str, Any]:
         """Get performance summary across all agents"""
-        cursor = self.conn.cursor()
-        
-        # Total stats
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_agents,
-                COUNT(CASE WHEN status = 'idle' THEN 1 END) as idle_count,
-                COUNT(CASE WHEN status = 'busy' THEN 1 END) as busy_count,
-                AVG(performance_score) as avg_performance,
-                SUM(tasks_completed) as total_tasks_completed
-            FROM agents
-        """)
+        def _query(conn):
+            cursor = conn.cursor()
+            
+            # Total stats
+            cursor.execute("""
+                SELECT 
+                    COUNT(*) as total_agents,
+                    COUNT(CASE WHEN status = 'idle' THEN 1 END) as idle_count,
+                    COUNT(CASE WHEN status = 'busy' THEN 1 END) as busy_count,
+                    AVG(performance_score) as avg_performance,
+                    SUM(tasks_completed) as total_tasks_completed
+                FROM agents
+            """)
+            return cursor.fetchone()
         
-        row = cursor.fetchone()
+        row = await self._read(_query)
         return {
             'total_agents': row[0],
             'idle_agents': row[1],
@@ -158,7 +158,7 @@ class RecruiterAgentStorage(BaseStorage):
         """Write candidate data"""
         if operation == "insert":
             candidate_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO candidates 
                 (id, name, email, phone, skills, experience_years, education, 
                  location, status, source, notes)
@@ -177,7 +177,7 @@ class RecruiterAgentStorage(BaseStorage):
                 data.get('notes')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE candidates 
                 SET name=?, email=?, phone=?, skills=?, experience_years=?,
                     education=?, location=?, status=?, notes=?
@@ -195,15 +195,13 @@ class RecruiterAgentStorage(BaseStorage):
                 data['id']
             ))
         elif operation == "delete":
-            self.conn.execute("DELETE FROM candidates WHERE id=?", (data['id'],))
-        
-        self.conn.commit()
+            self._execute("DELETE FROM candidates WHERE id=?", (data['id'],))
     
     def _write_interview(self, data: Dict[str, Any], operation: str):
         """Write interview data"""
         if operation == "insert":
             interview_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO interviews
                 (id, candidate_id, interviewer_agent, scheduled_date, actual_date,
                  interview_type, notes, score, outcome)
@@ -220,7 +218,7 @@ class RecruiterAgentStorage(BaseStorage):
                 data.get('outcome', 'pending')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE interviews
                 SET scheduled_date=?, actual_date=?, interview_type=?,
                     notes=?, score=?, outcome=?
@@ -235,15 +233,13 @@ class RecruiterAgentStorage(BaseStorage):
                 data['id']
             ))
         elif operation == "delete":
-            self.conn.execute("DELETE FROM interviews WHERE id=?", (data['id'],))
-        
-        self.conn.commit()
+            self._execute("DELETE FROM interviews WHERE id=?", (data['id'],))
     
     def _write_job(self, data: Dict[str, Any], operation: str):
         """Write job requisition data"""
         if operation == "insert":
             job_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO job_requisitions
                 (id, title, department, required_skills, preferred_skills,
                  experience_required, location, status, priority, description)
@@ -261,7 +257,7 @@ class RecruiterAgentStorage(BaseStorage):
                 data.get('description')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE job_requisitions
                 SET title=?, department=?, required_skills=?, preferred_skills=?,
                     experience_required=?, location=?, status=?, priority=?, description=?
@@ -279,15 +275,13 @@ class RecruiterAgentStorage(BaseStorage):
                 data['id']
             ))
         elif operation == "delete":
-            self.conn.execute("DELETE FROM job_requisitions WHERE id=?", (data['id'],))
-        
-        self.conn.commit()
+            self._execute("DELETE FROM job_requisitions WHERE id=?", (data['id'],))
     
     def _write_interaction(self, data: Dict[str, Any], operation: str):
         """Write agent interaction data"""
         if operation == "insert":
             interaction_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT INTO agent_interactions
                 (id, source_agent, target_agent, interaction_type, context)
                 VALUES (?, ?, ?, ?, ?)
@@ -299,9 +293,7 @@ class RecruiterAgentStorage(BaseStorage):
                 json.dumps(data.get('context', {}))
             ))
         elif operation == "delete":
-            self.conn.execute("DELETE FROM agent_interactions WHERE id=?", (data['id'],))
-        
-        self.conn.commit()
+            self._execute("DELETE FROM agent_interactions WHERE id=?", (data['id'],))
     
     # High-level API methods
     
@@ -328,14 +320,16 @@ class RecruiterAgentStorage(BaseStorage):
     
     async def get_candidate(self, candidate_id: str) -> Optional[Dict[str, Any]]:
         """Get candidate by ID"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, name, email, phone, skills, experience_years,
-                   education, location, status, source, notes, created_at
-            FROM candidates WHERE id = ?
-        """, (candidate_id,))
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, email, phone, skills, experience_years,
+                       education, location, status, source, notes, created_at
+                FROM candidates WHERE id = ?
+            """, (candidate_id,))
+            return cursor.fetchone()
         
-        row = cursor.fetchone()
+        row = await self._read(_query)
         if not row:
             return None
         
@@ -383,11 +377,13 @@ class RecruiterAgentStorage(BaseStorage):
             query += " AND experience_years >= ?"
             params.append(min_experience)
         
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in await self._read(_query):
             candidate_skills = json.loads(row[4])
             
             # Filter by skills if provided
@@ -419,17 +415,19 @@ class RecruiterAgentStorage(BaseStorage):
     
     async def get_candidate_interviews(self, candidate_id: str) -> List[Dict[str, Any]]:
         """Get all interviews for a candidate"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, interviewer_agent, scheduled_date, actual_date,
-                   interview_type, notes, score, outcome
-            FROM interviews
-            WHERE candidate_id = ?
-            ORDER BY created_at DESC
-        """, (candidate_id,))
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, interviewer_agent, scheduled_date, actual_date,
+                       interview_type, notes, score, outcome
+                FROM interviews
+                WHERE candidate_id = ?
+                ORDER BY created_at DESC
+            """, (candidate_id,))
+            return cursor.fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in await self._read(_query):
             results.append({
                 'id': row[0],
                 'candidate_id': candidate_id,
@@ -454,17 +452,19 @@ class RecruiterAgentStorage(BaseStorage):
     
     async def get_open_jobs(self) -> List[Dict[str, Any]]:
         """Get all open job requisitions"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT id, title, department, required_skills, preferred_skills,
-                   experience_required, location, priority, description
-            FROM job_requisitions
-            WHERE status = 'open'
-            ORDER BY priority DESC, created_at DESC
-        """, ())
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, title, department, required_skills, preferred_skills,
+                       experience_required, location, priority, description
+                FROM job_requisitions
+                WHERE status = 'open'
+                ORDER BY priority DESC, created_at DESC
+            """, ())
+            return cursor.fetchall()
         
         results = []
-        for row in cursor.fetchall():
+        for row in await self._read(_query):
             results.append({
                 'id': row[0],
                 'title': row[1],
@@ -0,0 +1,289 @@
+"""
+The-Commander: Message Archive
+Cold tier for messages aged out of the MessageStore database.
+
+Layout (append-only; a segment is never rewritten once published):
+  <root>/<YYYY-MM-DD>/seg-<first_id>-<last_id>-<n>.ndz   blocks of zlib-compressed NDJSON
+  <root>/<YYYY-MM-DD>/seg-<first_id>-<last_id>-<n>.idx   sparse index (JSON), written last
+
+Each .idx lists the segment's time/id range and task ids, plus one
+entry per block (offset, length, time/id range), so a query only
+inflates the blocks whose range it overlaps. A segment without an
+.idx was never published (e.g. a crash mid-export) and is ignored.
+
+Version: 1.1.0
+"""
+
+import json
+import logging
+import os
+import threading
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".ndz"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+# Records per compressed block: the unit a query has to inflate
+BLOCK_RECORDS = 256
+
+# Row columns carried into the archive (content is stored decoded, so
+# segments stay readable without the database's compression dictionaries)
+ARCHIVE_COLUMNS = ('id', 'timestamp', 'task_id', 'sender', 'recipient', 'role',
+                   'iteration', 'content', 'metadata_json', 'content_hash')
+
+
+def _partition(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _fsync_write(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _Segment:
+    """In-memory sparse index of one published segment."""
+
+    __slots__ = ("path", "min_ts", "max_ts", "min_id", "max_id", "count", "tasks", "blocks")
+
+    def __init__(self, path: Path, index: Dict[str, Any]):
+        self.path = path
+        self.min_ts = index["min_ts"]
+        self.max_ts = index["max_ts"]
+        self.min_id = index["min_id"]
+        self.max_id = index["max_id"]
+        self.count = index["count"]
+        self.tasks = frozenset(index["tasks"])
+        # [offset, length, count, min_ts, max_ts, min_id, max_id]
+        self.blocks = index["blocks"]
+
+
+class MessageArchive:
+    """
+    Date-partitioned, append-only segment store for archived messages.
+
+    Segments are loaded lazily, block by block; only the sparse indexes
+    are kept in memory.
+    """
+
+    def __init__(self, root: str, block_records: int = BLOCK_RECORDS, level: int = 6):
+        """
+        Args:
+            root: Archive directory (created if missing)
+            block_records: Records per compressed block
+            level: zlib compression level
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.block_records = block_records
+        self.level = level
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._load_indexes()
+
+    def _load_indexes(self):
+        for index_path in sorted(self.root.glob(f"*/*{INDEX_SUFFIX}")):
+            try:
+                index = json.loads(index_path.read_text())
+                segment_path = index_path.with_suffix(SEGMENT_SUFFIX)
+                if index.get("version") != INDEX_VERSION or not segment_path.exists():
+                    raise ValueError("unknown version or missing segment")
+                self._segments.append(_Segment(segment_path, index))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping archive segment {index_path}: {e}")
+        if self._segments:
+            logger.info(f"Archive {self.root}: {len(self._segments)} segments, {self.count} messages")
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return sum(segment.count for segment in self._segments)
+
+    @property
+    def max_timestamp(self) -> Optional[float]:
+        """Newest archived timestamp (None while the archive is empty)."""
+        with self._lock:
+            return max((segment.max_ts for segment in self._segments), default=None)
+
+    # ===========================
+    # Export
+    # ===========================
+
+    def write(self, records: Iterable[Mapping[str, Any]]) -> int:
+        """
+        Append records as new segments, one per UTC date, durably (fsync) before returning.
+
+        Args:
+            records: Mappings with ARCHIVE_COLUMNS (content decoded to text)
+
+        Returns:
+            Number of records written.
+        """
+        partitions: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            row = {column: record[column] for column in ARCHIVE_COLUMNS}
+            partitions.setdefault(_partition(row['timestamp']), []).append(row)
+
+        written = 0
+        for day, rows in sorted(partitions.items()):
+            rows.sort(key=lambda r: (r['timestamp'], r['id']))
+            self._write_segment(day, rows)
+            written += len(rows)
+        return written
+
+    def _write_segment(self, day: str, rows: List[Dict[str, Any]]):
+        directory = self.root / day
+        directory.mkdir(exist_ok=True)
+        ids = [row['id'] for row in rows]
+        stem = f"seg-{min(ids)}-{max(ids)}"
+        # Re-exporting a range after a crash publishes a sibling; readers skip repeated ids
+        n = sum(1 for _ in directory.glob(f"{stem}-*{INDEX_SUFFIX}"))
+        segment_path = directory / f"{stem}-{n}{SEGMENT_SUFFIX}"
+
+        data = bytearray()
+        blocks = []
+        for start in range(0, len(rows), self.block_records):
+            block = rows[start:start + self.block_records]
+            payload = "\n".join(json.dumps(row, separators=(",", ":")) for row in block).encode("utf-8")
+            compressed = zlib.compress(payload, self.level)
+            blocks.append([len(data), len(compressed), len(block),
+                           block[0]['timestamp'], block[-1]['timestamp'],
+                           min(r['id'] for r in block), max(r['id'] for r in block)])
+            data += compressed
+
+        index = {
+            "version": INDEX_VERSION,
+            "count": len(rows),
+            "min_ts": rows[0]['timestamp'],
+            "max_ts": rows[-1]['timestamp'],
+            "min_id": min(ids),
+            "max_id": max(ids),
+            "tasks": sorted({row['task_id'] for row in rows if row['task_id'] is not None}),
+            "blocks": blocks,
+        }
+        # Segment first, index last: the index publishes the segment
+        _fsync_write(segment_path, bytes(data))
+        _fsync_write(segment_path.with_suffix(INDEX_SUFFIX), json.dumps(index).encode("utf-8"))
+        with self._lock:
+            self._segments.append(_Segment(segment_path, index))
+
+    # ===========================
+    # Query
+    # ===========================
+
+    def query(self,
+              task_id: Optional[str] = None,
+              sender: Optional[str] = None,
+              role: Optional[str] = None,
+              since_ts: Optional[float] = None,
+              before_ts: Optional[float] = None,
+              key: Optional[Tuple[float, int]] = None,
+              ascending: bool = False,
+              limit: Optional[int] = 50,
+              recipient: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Archived records matching the filters, ordered by (timestamp, id).
+
+        Args:
+            since_ts: Only records at or after this timestamp.
+            before_ts: Only records older than this timestamp.
+            key: Keyset position (timestamp, id); records strictly after it in the ordering.
+            ascending: Oldest first (default newest first).
+            limit: Maximum records (None: all).
+            recipient: Only records addressed to this recipient.
+
+        Returns:
+            Records with ARCHIVE_COLUMNS.
+        """
+        lo = since_ts
+        hi = before_ts
+        if key is not None:
+            if ascending:
+                lo = key[0] if lo is None else max(lo, key[0])
+            else:
+                hi = key[0] if hi is None else min(hi, key[0])
+
+        def overlaps(min_ts: float, max_ts: float) -> bool:
+            if lo is not None and max_ts < lo:
+                return False
+            # Inclusive at both ends: exact bounds and keyset ties are resolved per row
+            return hi is None or min_ts <= hi
+
+        with self._lock:
+            segments = [s for s in self._segments
+                        if overlaps(s.min_ts, s.max_ts) and (task_id is None or task_id in s.tasks)]
+        # Visit segments nearest the start of the ordering first so we can stop early
+        if ascending:
+            segments.sort(key=lambda s: (s.min_ts, s.min_id))
+        else:
+            segments.sort(key=lambda s: (s.max_ts, s.max_id), reverse=True)
+
+        def wanted(row: Dict[str, Any]) -> bool:
+            ts = row['timestamp']
+            if task_id is not None and row['task_id'] != task_id:
+                return False
+            if sender is not None and row['sender'] != sender:
+                return False
+            if role is not None and row['role'] != role:
+                return False
+            if recipient is not None and recipient not in json.loads(row['recipient'] or "[]"):
+                return False
+            if since_ts is not None and ts < since_ts:
+                return False
+            if before_ts is not None and ts >= before_ts:
+                return False
+            if key is not None:
+                position = (ts, row['id'])
+                if (position <= key) if ascending else (position >= key):
+                    return False
+            return True
+
+        found: Dict[int, Dict[str, Any]] = {}
+        order = lambda r: (r['timestamp'], r['id'])  # noqa: E731
+        for segment in segments:
+            if limit and len(found) >= limit:
+                ranked = sorted(found.values(), key=order, reverse=not ascending)
+                boundary = ranked[limit - 1]['timestamp']
+                # Segments are visited in order of their nearest edge
+                if (segment.min_ts > boundary) if ascending else (segment.max_ts < boundary):
+                    break
+            for row in self._read_segment(segment, overlaps):
+                if row['id'] not in found and wanted(row):
+                    found[row['id']] = row
+
+        rows = sorted(found.values(), key=order, reverse=not ascending)
+        return rows[:limit] if limit else rows
+
+    def _read_segment(self, segment: _Segment, overlaps) -> Iterable[Dict[str, Any]]:
+        """Decode the blocks of a segment whose time range passes `overlaps`."""
+        blocks = [b for b in segment.blocks if overlaps(b[3], b[4])]
+        if not blocks:
+            return
+        with open(segment.path, "rb") as f:
+            for offset, length, *_ in blocks:
+                f.seek(offset)
+                payload = zlib.decompress(f.read(length))
+                for line in payload.split(b"\n"):
+                    yield json.loads(line)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = list(self._segments)
+        return {
+            "root": str(self.root),
+            "segments": len(segments),
+            "messages": sum(s.count for s in segments),
+            "bytes": sum(s.path.stat().st_size for s in segments if s.path.exists()),
+            "min_ts": min((s.min_ts for s in segments), default=None),
+            "max_ts": max((s.max_ts for s in segments), default=None),
+        }
@@ -0,0 +1,108 @@
+"""
+The-Commander: Async Memory Facade
+Awaitable MessageStore API for asyncio code (FastAPI handlers, broadcasters).
+
+Every call runs on a small dedicated thread pool, so a slow query, a
+large decompression or a writer holding the SQLite lock delays only the
+awaiting request, never the event loop. The pool size bounds how many
+store operations run at once; further calls queue.
+
+Query results are decoded on the pool thread as well (MessageRecords
+are lazy), so the loop only receives plain dicts.
+
+Version: 1.0.0
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+
+from commander_os.core.memory import MessagePage, MessageStore
+from commander_os.core.tokens import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Store operations allowed to run at once
+DEFAULT_CONCURRENCY = 4
+
+
+class AsyncMessageStore:
+    """
+    Async wrapper around a MessageStore (or PartitionedMessageStore).
+
+    The wrapped store keeps its owner: close() here only stops the pool.
+    """
+
+    def __init__(self, store: MessageStore, max_concurrency: int = DEFAULT_CONCURRENCY):
+        """
+        Args:
+            store: Store to wrap
+            max_concurrency: Pool threads (concurrent store operations)
+        """
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="memory-async")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking store call on the pool and await its result."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    @staticmethod
+    def _materialize(page: MessagePage) -> MessagePage:
+        return MessagePage([dict(record) for record in page], getattr(page, "next_cursor", None))
+
+    # ===========================
+    # MessageStore surface
+    # ===========================
+
+    async def log_message(self, *args, **kwargs) -> Union[int, Future]:
+        """MessageStore.log_message (with wait=False, the store's Future of the id)."""
+        return await self.run(self.store.log_message, *args, **kwargs)
+
+    async def log_messages_bulk(self, messages: List[Dict[str, Any]]) -> List[int]:
+        return await self.run(self.store.log_messages_bulk, messages)
+
+    async def query_messages(self, *args, **kwargs) -> MessagePage:
+        """MessageStore.query_messages, with records decoded to dicts off the loop."""
+        return await self.run(lambda: self._materialize(self.store.query_messages(*args, **kwargs)))
+
+    async def search_text(self, *args, **kwargs) -> MessagePage:
+        return await self.run(self.store.search_text, *args, **kwargs)
+
+    async def get_recent_context(self, task_id: str, max_tokens: int = 8000,
+                                 counter: Optional[TokenCounter] = None) -> str:
+        return await self.run(self.store.get_recent_context, task_id, max_tokens, counter)
+
+    async def delete_messages(self, message_ids: List[int]) -> int:
+        return await self.run(self.store.delete_messages, message_ids)
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        return await self.run(self.store.flush, timeout)
+
+    def stats(self) -> Dict[str, Union[int, str]]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "completed": self.completed
+            }
+
+    def close(self):
+        """Stop the pool after queued calls finish (the store itself stays open)."""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,306 @@
+"""
+The-Commander: Message Content Codecs
+Pluggable compression for stored message content.
+
+Codecs:
+- none: UTF-8 bytes as-is (short messages skip compression entirely)
+- gzip: legacy format written before codecs existed (read-only)
+- zlib: raw deflate, optionally primed with a trained preset dictionary
+- zstd: Zstandard with a trained dictionary (optional `zstandard` package)
+
+Dictionaries are identified by a hash of their bytes, so one dict_id
+means the same dictionary in every database; decoders resolve ids
+through a process-wide registry filled by whoever loads them.
+
+Version: 1.0.0
+"""
+
+import collections
+import gzip
+import hashlib
+import logging
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_NONE = "none"
+CODEC_GZIP = "gzip"
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+CODECS = (CODEC_NONE, CODEC_GZIP, CODEC_ZLIB, CODEC_ZSTD)
+
+# Messages shorter than this (UTF-8 bytes) are stored raw
+DEFAULT_RAW_THRESHOLD = 128
+
+# zlib only looks back 32 KiB, so a larger preset dictionary is wasted
+ZLIB_DICT_SIZE = 32 * 1024
+ZSTD_DICT_SIZE = 16 * 1024
+
+# Tokens a zlib dictionary is assembled from: JSON keys and quoted values,
+# identifiers and dotted/dashed names (deflate needs matches of 3+ bytes)
+_DICT_TOKEN = re.compile(r'"[^"\\]{1,48}"\s*:?\s*|[A-Za-z_][\w.\-]{2,}\s?')
+
+_dictionaries: Dict[int, bytes] = {}
+_dictionaries_lock = threading.Lock()
+_zlib_templates: Dict[Tuple[int, int], "zlib._Compress"] = {}
+_zstd_local = threading.local()
+
+
+def zstd_available() -> bool:
+    """True if the optional zstandard package is installed."""
+    return zstandard is not None
+
+
+def dictionary_id(data: bytes) -> int:
+    """Stable id for a dictionary: the first 63 bits of its SHA-256."""
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big") >> 1
+
+
+def register_dictionary(data: bytes) -> int:
+    """Make a dictionary available to encode()/decode() and return its id."""
+    dict_id = dictionary_id(data)
+    with _dictionaries_lock:
+        _dictionaries[dict_id] = data
+    return dict_id
+
+
+def get_dictionary(dict_id: int) -> bytes:
+    """Look up a registered dictionary (KeyError if it was never loaded)."""
+    try:
+        return _dictionaries[dict_id]
+    except KeyError:
+        raise KeyError(f"Compression dictionary {dict_id} is not loaded")
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zstd codec requires the 'zstandard' package")
+
+
+def encode(data: bytes, codec: str, dict_id: Optional[int] = None, level: int = 6) -> bytes:
+    """
+    Compress bytes with a codec.
+
+    Args:
+        data: Plain bytes
+        codec: One of CODECS
+        dict_id: Registered dictionary to prime the codec with (zlib/zstd)
+        level: Compression level
+
+    Returns:
+        Encoded blob
+    """
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_GZIP:
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if codec == CODEC_ZLIB:
+        compressor = _zlib_compressor(dict_id, level)
+        return compressor.compress(data) + compressor.flush()
+    if codec == CODEC_ZSTD:
+        _require_zstd()
+        return _zstd_compressor(dict_id, level).compress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decode(blob: bytes, codec: str, dict_id: Optional[int] = None) -> bytes:
+    """Inverse of encode()."""
+    if codec == CODEC_NONE:
+        return blob
+    if codec == CODEC_GZIP:
+        return gzip.decompress(blob)
+    if codec == CODEC_ZLIB:
+        return _zlib_decompressor(dict_id).decompress(blob)
+    if codec == CODEC_ZSTD:
+        _require_zstd()
+        return _zstd_decompressor(dict_id).decompress(blob)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decode_prefix(blob: bytes, codec: str, dict_id: Optional[int], max_bytes: int) -> bytes:
+    """Decode at most `max_bytes` leading bytes, inflating no further than needed."""
+    if codec == CODEC_NONE:
+        return blob[:max_bytes]
+    if codec == CODEC_GZIP:
+        return zlib.decompressobj(wbits=31).decompress(blob, max_bytes)  # 31 = gzip container
+    if codec == CODEC_ZLIB:
+        return _zlib_decompressor(dict_id).decompress(blob, max_bytes)
+    if codec == CODEC_ZSTD:
+        _require_zstd()
+        with _zstd_decompressor(dict_id).stream_reader(blob) as reader:
+            return reader.read(max_bytes)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def _zlib_compressor(dict_id: Optional[int], level: int):
+    # wbits=-15: raw deflate, no zlib header/checksum to pay for per message
+    if dict_id is None:
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    # Loading a 32 KiB preset dictionary costs more than compressing a short
+    # message; keep one primed template per dictionary and clone it
+    template = _zlib_templates.get((dict_id, level))
+    if template is None:
+        template = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=get_dictionary(dict_id))
+        _zlib_templates[(dict_id, level)] = template
+    return template.copy()
+
+
+def _zlib_decompressor(dict_id: Optional[int]):
+    if dict_id is not None:
+        return zlib.decompressobj(wbits=-15, zdict=get_dictionary(dict_id))
+    return zlib.decompressobj(wbits=-15)
+
+
+def _zstd_compressor(dict_id: Optional[int], level: int):
+    # zstd contexts are reusable but not thread-safe: keep one per thread
+    cache = _zstd_local.__dict__.setdefault("compressors", {})
+    key = (dict_id, level)
+    compressor = cache.get(key)
+    if compressor is None:
+        if dict_id is None:
+            compressor = zstandard.ZstdCompressor(level=level)
+        else:
+            # The dictionary id is already on the row; skip it and the checksum in every frame
+            compressor = zstandard.ZstdCompressor(
+                level=level,
+                dict_data=zstandard.ZstdCompressionDict(get_dictionary(dict_id)),
+                write_dict_id=False,
+                write_checksum=False
+            )
+        cache[key] = compressor
+    return compressor
+
+
+def _zstd_decompressor(dict_id: Optional[int]):
+    cache = _zstd_local.__dict__.setdefault("decompressors", {})
+    decompressor = cache.get(dict_id)
+    if decompressor is None:
+        if dict_id is None:
+            decompressor = zstandard.ZstdDecompressor()
+        else:
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=zstandard.ZstdCompressionDict(get_dictionary(dict_id))
+            )
+        cache[dict_id] = decompressor
+    return decompressor
+
+
+# ===========================
+# Dictionary Training
+# ===========================
+
+def train_dictionary(samples: Iterable[bytes], codec: str = CODEC_ZLIB, size: Optional[int] = None) -> bytes:
+    """
+    Build a compression dictionary from sample messages.
+
+    zstd uses the library's COVER trainer. zlib has no trainer, so its
+    preset dictionary is assembled from the tokens (JSON keys, common
+    values, identifiers) that recur across the most samples, with the
+    most valuable ones last where deflate reaches them cheapest.
+
+    Args:
+        samples: Representative message bodies
+        codec: CODEC_ZLIB or CODEC_ZSTD
+        size: Maximum dictionary size in bytes
+
+    Returns:
+        Dictionary bytes
+    """
+    samples = [s for s in samples if s]
+    if not samples:
+        raise ValueError("Cannot train a dictionary without samples")
+
+    if codec == CODEC_ZSTD:
+        _require_zstd()
+        try:
+            trained = zstandard.train_dictionary(size or ZSTD_DICT_SIZE, samples)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"zstd dictionary training failed ({len(samples)} samples): {e}")
+        return trained.as_bytes()
+    if codec != CODEC_ZLIB:
+        raise ValueError(f"Codec {codec} does not use a dictionary")
+
+    size = min(size or ZLIB_DICT_SIZE, ZLIB_DICT_SIZE)
+    doc_freq: "collections.Counter[str]" = collections.Counter()
+    for sample in samples:
+        doc_freq.update(set(_DICT_TOKEN.findall(sample.decode("utf-8", errors="ignore"))))
+
+    # Worth = bytes saved across the corpus; one-off tokens never pay for themselves
+    ranked = sorted(
+        ((count * len(token), token) for token, count in doc_freq.items() if count > 1),
+        reverse=True
+    )
+    chosen: List[bytes] = []
+    used = 0
+    for _, token in ranked:
+        encoded = token.encode("utf-8")
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    if not chosen:
+        raise ValueError(f"No recurring content in {len(samples)} samples to build a dictionary from")
+    return b"".join(reversed(chosen))
+
+
+# ===========================
+# Storage Policy
+# ===========================
+
+class ContentCodec:
+    """
+    Encoding policy for new message content.
+
+    Short messages, and any message the codec fails to shrink, are
+    stored raw so a blob is never larger than its text.
+    """
+
+    def __init__(self,
+                 codec: str = CODEC_ZLIB,
+                 dict_id: Optional[int] = None,
+                 raw_threshold: int = DEFAULT_RAW_THRESHOLD,
+                 level: int = 6):
+        """
+        Args:
+            codec: Codec for messages at or above raw_threshold
+            dict_id: Registered dictionary to use with it
+            raw_threshold: Size in UTF-8 bytes below which messages are stored raw
+            level: Compression level
+        """
+        if codec not in CODECS or codec == CODEC_GZIP:
+            raise ValueError(f"Unsupported storage codec: {codec}")
+        if codec == CODEC_ZSTD:
+            _require_zstd()
+        if dict_id is not None:
+            get_dictionary(dict_id)  # fail fast on an unloaded dictionary
+        self.codec = codec
+        self.dict_id = dict_id if codec != CODEC_NONE else None
+        self.raw_threshold = raw_threshold
+        self.level = level
+
+    def encode(self, content: str) -> Tuple[bytes, str, Optional[int]]:
+        """
+        Encode message text.
+
+        Returns:
+            (blob, codec, dict_id) as stored on the row
+        """
+        data = content.encode("utf-8")
+        if self.codec == CODEC_NONE or len(data) < self.raw_threshold:
+            return data, CODEC_NONE, None
+        blob = encode(data, self.codec, self.dict_id, self.level)
+        if len(blob) >= len(data):
+            return data, CODEC_NONE, None
+        return blob, self.codec, self.dict_id
+
+    def __repr__(self) -> str:
+        return f"ContentCodec({self.codec}, dict_id={self.dict_id}, raw_threshold={self.raw_threshold})"
@@ -41,6 +41,7 @@ class EngineConfig:
     ngl: int = 999
     fa: bool = True
     extra_flags: str = ""
+    tokenizer: str = ""  # Local tokenizer.json for token counting; empty = engine /tokenize
 
 
 @dataclass
@@ -235,7 +236,8 @@ class ConfigManager:
                         ctx=e_data.get('ctx', 4096),
                         ngl=e_data.get('ngl', 999),
                         fa=e_data.get('fa', True),
-                        extra_flags=e_data.get('extra_flags', '')
+                        extra_flags=e_data.get('extra_flags', ''),
+                        tokenizer=e_data.get('tokenizer', '')
                     )
 
                 node = NodeConfig(
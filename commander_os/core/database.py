@@ -0,0 +1,126 @@
+"""
+The-Commander: Database Engines
+One tuned SQLAlchemy engine per database URL per process.
+
+SystemManager, the relay, the REST API and the TUI may each open a
+MessageStore on the same file; they share its engine (and connection
+pool) instead of each holding their own. SQLite connections get the
+same PRAGMAs as the agent storage engine (WAL, synchronous=NORMAL, a
+larger page cache), plus mmap and a busy timeout.
+
+Tuning (environment):
+- COMMANDER_SQLITE_CACHE_MB   page cache per connection (default 64)
+- COMMANDER_SQLITE_MMAP_MB    memory-mapped I/O window (default 256, 0 disables)
+- COMMANDER_SQLITE_BUSY_MS    wait for a locked database before failing (default 5000)
+- COMMANDER_DB_POOL_SIZE      pooled connections per file database (default 5)
+
+Version: 1.0.0
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+logger = logging.getLogger(__name__)
+
+_engines: Dict[str, Tuple[Engine, int]] = {}
+_engines_lock = threading.Lock()
+
+
+def _is_memory_url(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def _engine_key(db_url: str) -> str:
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite" and not _is_memory_url(url):
+        # Relative file paths name the same database from any URL spelling
+        url = url.set(database=os.path.abspath(url.database))
+    return url.render_as_string(hide_password=False)
+
+
+def _apply_sqlite_pragmas(engine: Engine, in_memory: bool):
+    cache_kb = int(os.getenv("COMMANDER_SQLITE_CACHE_MB", "64")) * 1024
+    mmap_bytes = int(os.getenv("COMMANDER_SQLITE_MMAP_MB", "256")) * 1024 * 1024
+    busy_ms = int(os.getenv("COMMANDER_SQLITE_BUSY_MS", "5000"))
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            if not in_memory:
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute(f"PRAGMA mmap_size={mmap_bytes}")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA cache_size=-{cache_kb}")
+            cursor.execute(f"PRAGMA busy_timeout={busy_ms}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+        finally:
+            cursor.close()
+
+
+def _create(db_url: str) -> Engine:
+    url = make_url(db_url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(db_url, pool_pre_ping=True)
+
+    in_memory = _is_memory_url(url)
+    if in_memory:
+        # Every connection to :memory: is a new database: keep exactly one
+        engine = create_engine(db_url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        pool_size = int(os.getenv("COMMANDER_DB_POOL_SIZE", "5"))
+        engine = create_engine(
+            db_url,
+            connect_args={"check_same_thread": False},
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=pool_size * 2
+        )
+    _apply_sqlite_pragmas(engine, in_memory)
+    return engine
+
+
+def get_engine(db_url: str) -> Engine:
+    """
+    Shared engine for a database URL (created on first use).
+
+    Each call must be paired with release_engine(). In-memory SQLite URLs
+    are never shared: each call gets a private database, as before.
+    """
+    if _is_memory_url(make_url(db_url)):
+        return _create(db_url)
+    key = _engine_key(db_url)
+    with _engines_lock:
+        entry = _engines.get(key)
+        if entry is None:
+            engine = _create(db_url)
+            logger.info(f"Database engine opened for {key}")
+        else:
+            engine = entry[0]
+        _engines[key] = (engine, (entry[1] if entry else 0) + 1)
+        return engine
+
+
+def release_engine(engine: Engine):
+    """Drop one reference to an engine; the last one disposes its pool."""
+    with _engines_lock:
+        for key, (shared, refs) in _engines.items():
+            if shared is engine:
+                if refs > 1:
+                    _engines[key] = (shared, refs - 1)
+                    return
+                del _engines[key]
+                break
+    engine.dispose()
+
+
+def open_engines() -> Dict[str, int]:
+    """URL -> reference count of the shared engines currently open."""
+    with _engines_lock:
+        return {key: refs for key, (_, refs) in _engines.items()}
@@ -3,30 +3,240 @@ The-Commander: Memory System
 Persistent message storage and retrieval using SQLite + SQLAlchemy.
 
 Features:
-- Log messages with compression
+- Log messages with a pluggable codec (raw below a size threshold, zlib/zstd with trained dictionaries)
 - Structured querying (task_id, sender, role)
-- Deduping via hashing
+- Deduping via hashing (opt-in strict mode: unique dedup key + INSERT OR IGNORE)
 - Archival support
+- Batched ingestion (bulk insert + background writer)
+- Full-text search (contentless FTS5 index fed at insert time)
+- Keyset pagination (since-id polling, opaque continuation cursors)
+- Projected, lazily decoded query results
+- Token-budgeted tail context with an incremental per-task LRU cache
+  (engine tokenizer counts memoized per content hash and tokenizer in message_token_counts)
+- Chunked retention with optional cold-tier archive segments (queries fan out to them)
+- Shared, tuned engine per database (WAL, mmap, pooled); schema DDL skipped when current
+- Recipient index (message_recipients) for per-agent inbox queries
+- Streaming export (server-side cursor, fetchmany batches)
 
-Version: 1.1.0
+Version: 1.13.3
 """
 
 import logging
 import json
-import gzip
 import hashlib
-import io
+import queue
+import re
+from collections import OrderedDict
+from collections.abc import Mapping
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import List, Dict, Optional, Any, Union
+from typing import List, Dict, Optional, Any, Union, Iterable, Iterator, Tuple
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, LargeBinary, Float, Index, Boolean
+from sqlalchemy import bindparam, insert, delete, null, select, text, inspect, Column, Integer, String, Text, LargeBinary, Float, Index, Boolean
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker
+
+from commander_os.core import codecs
+from commander_os.core.archive import ARCHIVE_COLUMNS, MessageArchive
+from commander_os.core.codecs import CODEC_GZIP, CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD, ContentCodec
+from commander_os.core.database import get_engine, release_engine
+from commander_os.core.tokens import CHARS_PER_TOKEN, TokenCounter, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
+FTS_TABLE = "messages_fts"
+
+# Rows fetched per round trip (and NDJSON lines per chunk) when streaming an export
+EXPORT_BATCH = 500
+
+
+def _stored_codec(is_compressed: bool, codec: Optional[str]) -> str:
+    """Codec of a row; rows written before the codec column are gzip or raw."""
+    if codec:
+        return codec
+    return CODEC_GZIP if is_compressed else CODEC_NONE
+
+
+def decompress_content(blob: Optional[bytes], is_compressed: bool,
+                       codec: Optional[str] = None, dict_id: Optional[int] = None) -> str:
+    """Decode a stored content blob back to text."""
+    if not blob:
+        return ""
+    try:
+        return codecs.decode(blob, _stored_codec(is_compressed, codec), dict_id).decode('utf-8')
+    except Exception as e:
+        return f"<Error decompressing: {e}>"
+
+
+def preview_content(blob: Optional[bytes], is_compressed: bool, chars: int,
+                    codec: Optional[str] = None, dict_id: Optional[int] = None) -> str:
+    """
+    Decode only the first `chars` characters of a content blob.
+    Compressed streams are inflated incrementally, stopping once enough bytes are out.
+    """
+    if not blob or chars <= 0:
+        return ""
+    max_bytes = chars * 4  # worst case UTF-8 width
+    try:
+        raw = codecs.decode_prefix(blob, _stored_codec(is_compressed, codec), dict_id, max_bytes)
+    except Exception as e:
+        return f"<Error decompressing: {e}>"
+    # A cut may split a multi-byte character; drop the fragment
+    return raw.decode('utf-8', errors='ignore')[:chars]
+
+
+def _query_terms(query: str) -> List[str]:
+    """Split free text into search terms (a trailing * marks a prefix term)."""
+    return re.findall(r"\w+\*?", query)
+
+
+def _fts_match(terms: List[str]) -> str:
+    """Build an FTS5 MATCH expression; every term is quoted so user text can't break the syntax."""
+    parts = []
+    for term in terms:
+        if term.endswith("*"):
+            parts.append(f'"{term[:-1]}"*')
+        else:
+            parts.append(f'"{term}"')
+    return " ".join(parts)
+
+
+def make_snippet(content: str, terms: List[str], width: int = 160,
+                 mark: tuple = ("[", "]")) -> str:
+    """Window of `content` around the first matching term, with matches marked."""
+    if not terms:
+        return content[:width]
+    pattern = re.compile(
+        "|".join(rf"\b{re.escape(t[:-1])}\w*" if t.endswith("*") else rf"\b{re.escape(t)}\b" for t in terms),
+        re.IGNORECASE
+    )
+    first = pattern.search(content)
+    start = max(0, first.start() - width // 2) if first else 0
+    end = min(len(content), start + width)
+    window = pattern.sub(lambda m: f"{mark[0]}{m.group(0)}{mark[1]}", content[start:end])
+    return ("..." if start > 0 else "") + window + ("..." if end < len(content) else "")
+
+
+class MessagePage(list):
+    """A page of results plus the opaque cursor for the next page (None when exhausted)."""
+
+    def __init__(self, items=(), next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+# Result field -> columns it is decoded from
+MESSAGE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'id': ('id',),
+    'timestamp': ('timestamp',),
+    'task_id': ('task_id',),
+    'sender': ('sender',),
+    'recipient': ('recipient',),
+    'role': ('role',),
+    'iteration': ('iteration',),
+    'content': ('content_blob', 'is_compressed', 'codec', 'dict_id'),
+    'metadata': ('metadata_json',),
+    'hash': ('content_hash',),
+}
+
+
+def ndjson_chunks(records: Iterable[Mapping], rows_per_chunk: int = EXPORT_BATCH) -> Iterator[bytes]:
+    """
+    Encode records as NDJSON, a few hundred lines per chunk.
+    
+    Chunking keeps per-write overhead (and a streaming response's thread
+    hops) proportional to batches, not rows.
+    """
+    lines: List[str] = []
+    for record in records:
+        lines.append(json.dumps(dict(record), separators=(",", ":"), default=str))
+        if len(lines) >= rows_per_chunk:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class MessageRecord(Mapping):
+    """
+    Read-only message row that decodes fields on first access.
+    
+    Content is only decompressed when 'content' is read (and only the
+    first `preview_chars` characters when a preview was requested);
+    recipient and metadata JSON are parsed on demand. Use dict(record)
+    where a plain dict is required (e.g. json.dumps).
+    """
+
+    __slots__ = ("_row", "_fields", "_preview_chars", "_cache")
+
+    def __init__(self, row: Mapping, fields: Tuple[str, ...], preview_chars: Optional[int] = None):
+        self._row = row
+        self._fields = fields
+        self._preview_chars = preview_chars
+        self._cache: Dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        if key not in self._cache:
+            self._cache[key] = self._decode(key)
+        return self._cache[key]
+
+    def _decode(self, key: str) -> Any:
+        row = self._row
+        if key == 'content':
+            if self._preview_chars is not None:
+                return preview_content(row['content_blob'], row['is_compressed'], self._preview_chars,
+                                       row['codec'], row['dict_id'])
+            return decompress_content(row['content_blob'], row['is_compressed'], row['codec'], row['dict_id'])
+        if key == 'recipient':
+            return json.loads(row['recipient']) if row['recipient'] else []
+        if key == 'metadata':
+            return json.loads(row['metadata_json']) if row['metadata_json'] else {}
+        return row[MESSAGE_FIELDS[key][0]]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self) -> str:
+        return f"MessageRecord(id={self._row.get('id')}, fields={self._fields})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self)
+
+    @property
+    def position(self) -> Tuple[float, int]:
+        """Keyset position (timestamp, id), available whatever fields were selected."""
+        return self._row['timestamp'], self._row['id']
+
+    def _replace(self, **columns) -> "MessageRecord":
+        """Copy of this record with some underlying column values replaced."""
+        return MessageRecord({**self._row, **columns}, self._fields, self._preview_chars)
+
+
+def parse_message_cursor(cursor: str) -> Tuple[str, tuple]:
+    """
+    Split a query_messages continuation cursor.
+    
+    Returns:
+        (mode, key): ("i", (id,)) for since-id polling, ("a"|"d", (timestamp, id)) otherwise.
+    """
+    try:
+        mode, *parts = cursor.split(":")
+        if mode not in ("i", "a", "d"):
+            raise ValueError(mode)
+        key = (int(parts[0]),) if mode == "i" else (float(parts[0]), int(parts[1]))
+    except (ValueError, IndexError):
+        raise ValueError(f"Invalid message cursor: {cursor}")
+    return mode, key
+
 class MessageModel(Base):
     """SQLAlchemy model for stored messages."""
     __tablename__ = "messages"
@@ -38,23 +248,19 @@ class MessageModel(Base):
     recipient = Column(String)  # JSON list
     role = Column(String)
     iteration = Column(Integer, default=0)
-    content_blob = Column(LargeBinary)  # Gzipped content
+    content_blob = Column(LargeBinary)  # Content encoded with `codec`
     metadata_json = Column(Text)  # JSON metadata
     content_hash = Column(String, index=True)
     is_compressed = Column(Boolean, default=True)
+    fts_indexed = Column(Boolean, default=False)  # Row's text is in messages_fts
+    codec = Column(String)  # none/gzip/zlib/zstd; NULL = legacy (see is_compressed)
+    dict_id = Column(Integer)  # compression_dicts.id the blob was encoded with
+    dedup_key = Column(String)  # Strict dedup only: content_hash[:envelope id], unique when set
+    content_chars = Column(Integer)  # len(content); sizes context without decompressing
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary, decompressing content."""
-        content = ""
-        if self.content_blob:
-            if self.is_compressed:
-                try:
-                    with gzip.GzipFile(fileobj=io.BytesIO(self.content_blob), mode='rb') as f:
-                        content = f.read().decode('utf-8')
-                except Exception as e:
-                    content = f"<Error decompressing: {e}>"
-            else:
-                content = self.content_blob.decode('utf-8')
+        content = decompress_content(self.content_blob, self.is_compressed, self.codec, self.dict_id)
 
         return {
             'id': self.id,
@@ -69,40 +275,369 @@ class MessageModel(Base):
             'hash': self.content_hash
         }
 
+
+class CompressionDictModel(Base):
+    """Trained compression dictionaries; rows reference them by id."""
+    __tablename__ = "compression_dicts"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # codecs.dictionary_id(data)
+    codec = Column(String, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(Float, nullable=False)
+    sample_count = Column(Integer, default=0)
+
+class MessageRecipientModel(Base):
+    """One row per (message, recipient): the indexed form of messages.recipient."""
+    __tablename__ = "message_recipients"
+
+    message_id = Column(Integer, primary_key=True)
+    recipient = Column(String, primary_key=True)
+
+class MessageTokenCountModel(Base):
+    """Exact token count of a message text under one tokenizer (TokenCounter.tokenizer_id)."""
+    __tablename__ = "message_token_counts"
+
+    content_hash = Column(String, primary_key=True)
+    tokenizer = Column(String, primary_key=True)
+    token_count = Column(Integer, nullable=False)
+
+class StoreMetaModel(Base):
+    """Key/value facts about the database itself (schema version)."""
+    __tablename__ = "store_meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+# Bump whenever tables, MIGRATED_COLUMNS or indexes change: databases at the
+# current version skip create_all and the migration checks on open
+SCHEMA_VERSION = 2
+
+# Columns added after the first release: name -> DDL used to migrate older databases
+MIGRATED_COLUMNS = {
+    "fts_indexed": "BOOLEAN DEFAULT 0",
+    "codec": "VARCHAR",
+    "dict_id": "INTEGER",
+    "dedup_key": "VARCHAR",
+    "content_chars": "INTEGER",
+}
+
+# Keyset pagination: filter by task/sender, walk by timestamp
+Index("ix_messages_task_ts", MessageModel.task_id, MessageModel.timestamp)
+Index("ix_messages_sender_ts", MessageModel.sender, MessageModel.timestamp)
+
+# Strict dedup: a retried message collides here and is ignored
+Index("ux_messages_dedup_key", MessageModel.dedup_key, unique=True,
+      sqlite_where=MessageModel.dedup_key.isnot(None))
+
+# Inbox queries: messages addressed to a recipient, newest ids last
+Index("ix_message_recipients_recipient", MessageRecipientModel.recipient, MessageRecipientModel.message_id)
+
+# Rows still waiting for the FTS backfill
+Index("ix_messages_fts_pending", MessageModel.id, sqlite_where=MessageModel.fts_indexed == False)  # noqa: E712
+
+# Columns needed to decode a row's content
+_CONTENT_COLUMNS = (MessageModel.id, MessageModel.content_blob, MessageModel.is_compressed,
+                    MessageModel.codec, MessageModel.dict_id)
+
+
+def _row_text(row) -> str:
+    return decompress_content(row.content_blob, row.is_compressed, row.codec, row.dict_id)
+
+
+def _archived_row(record: Mapping) -> Dict[str, Any]:
+    """Archive record -> row mapping MessageRecord can decode (content stored raw)."""
+    row = dict(record)
+    row.update(content_blob=row.pop('content').encode('utf-8'), is_compressed=False,
+               codec=CODEC_NONE, dict_id=None)
+    return row
+
+# Rows per multi-VALUES INSERT (keeps under SQLite's bound-parameter limit)
+BULK_INSERT_CHUNK = 500
+
+# Messages per transaction when backfilling message_recipients
+RECIPIENT_BACKFILL_CHUNK = 5000
+
+# Context line headers are estimated, not tokenized: digits and
+# punctuation tokenize densely, so assume 2 characters per token
+HEADER_CHARS_PER_TOKEN = 2
+
+# Rows sized per step of the backwards context walk
+CONTEXT_PAGE = 64
+
+# Rows archived/deleted per retention transaction (keeps write-lock holds short)
+RETENTION_CHUNK = 500
+
+# Queue markers for the background writer
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class _BackgroundWriter:
+    """
+    Buffers message rows and flushes them with one INSERT per batch.
+    A batch is written once `batch_size` rows are buffered or
+    `flush_interval` seconds have passed since its first row.
+    """
+
+    def __init__(self, store: "MessageStore", batch_size: int, flush_interval: float):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is written."""
+        barrier: Future = Future()
+        self._queue.put((_FLUSH, barrier))
+        try:
+            barrier.result(timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    def close(self, timeout: float = 5.0):
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout=timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch, barriers = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                row, future = item
+                if row is _STOP:
+                    stopping = True
+                    break
+                if row is _FLUSH:
+                    barriers.append(future)
+                    break
+                batch.append((row, future))
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for barrier in barriers:
+                barrier.set_result(True)
+
+    def _write(self, batch: List[tuple]):
+        try:
+            ids = self.store._insert_rows([row for row, _ in batch])
+        except Exception as e:
+            logger.error(f"Failed to write batch of {len(batch)} messages: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), msg_id in zip(batch, ids):
+            future.set_result(msg_id)
+
+
+def _context_line(timestamp: float, sender: str, role: str, content: str) -> str:
+    return f"[{timestamp}] {sender} ({role}): {content}\n"
+
+
+class _ContextEntry:
+    """Cached tail context of one task: whole lines (oldest first) and their budget cost."""
+
+    __slots__ = ("lines", "sizes", "used", "last_id", "text")
+
+    def __init__(self, lines: List[str], sizes: List[int], last_id: int):
+        self.lines = lines
+        self.sizes = sizes
+        self.used = sum(sizes)
+        self.last_id = last_id
+        self.text = "".join(lines)
+
+
 class MessageStore:
     """
     Persistent memory manager backed by SQLite.
     """
 
-    def __init__(self, db_path: str = "sqlite:///commander_memory.db"):
+    def __init__(self,
+                 db_path: str = "sqlite:///commander_memory.db",
+                 batch_size: int = 500,
+                 flush_interval: float = 0.05,
+                 codec: Optional[str] = None,
+                 raw_threshold: int = codecs.DEFAULT_RAW_THRESHOLD,
+                 dedup: bool = False,
+                 context_cache_size: int = 64,
+                 token_counter: Optional[TokenCounter] = None,
+                 archive_dir: Optional[str] = None):
         """
         Initialize MessageStore.
         
         Args:
             db_path: Database connection string.
+            batch_size: Max rows per background-writer flush.
+            flush_interval: Max seconds a buffered row waits for its batch.
+            codec: Codec for new messages (none/zlib/zstd). Default: the codec of
+                   the most recently trained dictionary, else zlib.
+            raw_threshold: Messages shorter than this many bytes are stored raw.
+            dedup: Strict dedup. Logging a message whose dedup key already exists
+                   inserts nothing and returns the existing id.
+            context_cache_size: Tasks whose recent context is kept cached.
+            token_counter: Default tokenizer for context budgets (None: character estimate).
+            archive_dir: Cold-tier segment directory. Retention exports aged-out messages
+                         there before deleting them, and query_messages reads them back.
         """
-        self.engine = create_engine(db_path, connect_args={"check_same_thread": False})
+        # Shared with every other store on this database in the process
+        self.engine = get_engine(db_path)
         SessionMaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         self.SessionLocal = SessionMaker
         
-        # Create tables
-        Base.metadata.create_all(bind=self.engine)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup = dedup
+        self.duplicates_ignored = 0
+        self.context_cache_size = context_cache_size
+        self.token_counter = token_counter
+        self._context_cache: "OrderedDict[Tuple[str, int], _ContextEntry]" = OrderedDict()
+        self._context_lock = threading.Lock()
+        self._writer: Optional[_BackgroundWriter] = None
+        self._writer_lock = threading.Lock()
+        self.archive = MessageArchive(archive_dir) if archive_dir else None
+        self._retention_thread: Optional[threading.Thread] = None
+        self._retention_stop = threading.Event()
+        
+        version = self._schema_version()
+        if version is None or version < SCHEMA_VERSION:
+            Base.metadata.create_all(bind=self.engine)
+            self._migrate_schema(version)
+        elif version > SCHEMA_VERSION:
+            # Written by newer code: never "migrate" it back or downgrade its marker
+            logger.error(f"Database {db_path} has schema version {version}, newer than this "
+                         f"release's {SCHEMA_VERSION}; opening it without schema changes")
+        self.raw_threshold = raw_threshold
+        self.codec = self._load_codec(codec)
+        
+        # Serializes FTS deletes against the backfill within this process
+        self._fts_lock = threading.Lock()
+        self._backfill_thread: Optional[threading.Thread] = None
+        self._backfill_stop = threading.Event()
+        self.fts_enabled = self._init_fts()
+        if self.fts_enabled and self._fts_backlog():
+            self.start_fts_backfill()
         logger.info(f"MessageStore initialized at {db_path}")
 
-    def log_message(self, 
+    def _schema_version(self) -> Optional[int]:
+        """Schema version recorded in store_meta (None for new or pre-versioning databases)."""
+        if not inspect(self.engine).has_table(StoreMetaModel.__tablename__):
+            return None
+        with self.engine.connect() as conn:
+            value = conn.execute(
+                select(StoreMetaModel.value).where(StoreMetaModel.key == "schema_version")
+            ).scalar()
+        return int(value) if value is not None else None
+
+    def _migrate_schema(self, from_version: Optional[int] = None):
+        """
+        Bring an older database up to SCHEMA_VERSION: add columns and indexes
+        introduced after it was created (SQLite ALTER TABLE) and backfill new tables.
+        """
+        existing = {col["name"] for col in inspect(self.engine).get_columns(MessageModel.__tablename__)}
+        missing = {name: ddl for name, ddl in MIGRATED_COLUMNS.items() if name not in existing}
+        if missing:
+            with self.engine.begin() as conn:
+                for name, ddl in missing.items():
+                    conn.exec_driver_sql(f"ALTER TABLE {MessageModel.__tablename__} ADD COLUMN {name} {ddl}")
+            logger.info(f"Migrated messages table: added {', '.join(missing)}")
+        for table in (MessageModel.__table__, MessageRecipientModel.__table__):
+            for index in table.indexes:
+                index.create(bind=self.engine, checkfirst=True)
+        if from_version is None or from_version < 2:
+            self._backfill_recipients()
+        with self.engine.begin() as conn:
+            conn.execute(delete(StoreMetaModel).where(StoreMetaModel.key == "schema_version"))
+            conn.execute(insert(StoreMetaModel).values(key="schema_version", value=str(SCHEMA_VERSION)))
+
+    def _backfill_recipients(self) -> int:
+        """Index the recipients of messages written before message_recipients existed."""
+        total = 0
+        last_id = 0
+        while True:
+            with self.engine.begin() as conn:
+                rows = conn.execute(
+                    select(MessageModel.id, MessageModel.recipient)
+                    .where(MessageModel.id > last_id)
+                    .order_by(MessageModel.id)
+                    .limit(RECIPIENT_BACKFILL_CHUNK)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                pairs = [
+                    {"message_id": row.id, "recipient": recipient}
+                    for row in rows
+                    for recipient in dict.fromkeys(json.loads(row.recipient) if row.recipient else [])
+                ]
+                if pairs:
+                    conn.execute(insert(MessageRecipientModel).prefix_with("OR IGNORE"), pairs)
+                total += len(pairs)
+        if total:
+            logger.info(f"Backfilled message_recipients: {total} entries")
+        return total
+
+    def _load_codec(self, codec: Optional[str]) -> ContentCodec:
+        """Register stored dictionaries and pick the newest one matching the requested codec."""
+        with self.engine.connect() as conn:
+            dictionaries = conn.execute(
+                select(CompressionDictModel.id, CompressionDictModel.codec, CompressionDictModel.data)
+                .order_by(CompressionDictModel.created_at)
+            ).all()
+        usable = []
+        for row in dictionaries:
+            codecs.register_dictionary(row.data)
+            if row.codec != CODEC_ZSTD or codecs.zstd_available():
+                usable.append(row)
+        
+        if codec is None:
+            codec = usable[-1].codec if usable else CODEC_ZLIB
+        if codec == CODEC_ZSTD and not codecs.zstd_available():
+            logger.warning("zstandard is not installed; storing new messages with zlib")
+            codec = CODEC_ZLIB
+        dict_id = next((row.id for row in reversed(usable) if row.codec == codec), None)
+        return ContentCodec(codec, dict_id, self.raw_threshold)
+
+    def _init_fts(self) -> bool:
+        """Create the contentless FTS5 index (SQLite only). Returns False when unavailable."""
+        if self.engine.dialect.name != "sqlite":
+            return False
+        try:
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5(content, content='', tokenize='unicode61')"
+                )
+            return True
+        except Exception as e:
+            logger.warning(f"FTS5 unavailable, text search will scan messages: {e}")
+            return False
+
+    def _build_row(self,
                    task_id: str,
                    sender: str,
                    recipient: Union[str, List[str]],
                    role: str,
                    content: str,
                    iteration: int = 0,
-                   metadata: Optional[Dict[str, Any]] = None) -> int:
-        """
-        Log a new message to memory.
-        
-        Returns:
-            ID of the inserted message.
-        """
+                   metadata: Optional[Dict[str, Any]] = None,
+                   dedup_id: Optional[str] = None) -> Dict[str, Any]:
+        """Normalize, hash and compress one message into column values."""
         # 1. Normalize recipient
         if isinstance(recipient, str):
             recipients = [recipient]
@@ -113,116 +648,968 @@ class MessageStore:
         # Hash based on content + task + sender + iter
         hash_input = f"{task_id}:{sender}:{iteration}:{content}".encode('utf-8')
         content_hash = hashlib.sha256(hash_input).hexdigest()
+        dedup_key = None
+        if self.dedup:
+            dedup_key = f"{content_hash}:{dedup_id}" if dedup_id else content_hash
         
-        # 3. Compress Content
-        content_bytes = content.encode('utf-8')
-        out = io.BytesIO()
-        with gzip.GzipFile(fileobj=out, mode='wb') as f:
-            f.write(content_bytes)
-        compressed_content = out.getvalue()
-        
-        # 4. Create Record
-        db_msg = MessageModel(
-            timestamp=datetime.now().timestamp(),
-            task_id=task_id,
-            sender=sender,
-            recipient=json.dumps(recipients),
-            role=role,
-            iteration=iteration,
-            content_blob=compressed_content,
-            metadata_json=json.dumps(metadata or {}),
-            content_hash=content_hash,
-            is_compressed=True
-        )
-        
-        session = self.SessionLocal()
-        try:
-            # check dedup? For now, we allow duplicates but store hash. 
-            # If strict dedup needed, query content_hash first.
+        # 3. Encode Content (short messages stay raw)
+        blob, codec, dict_id = self.codec.encode(content)
+        
+        return {
+            'timestamp': datetime.now().timestamp(),
+            'task_id': task_id,
+            'sender': sender,
+            'recipient': json.dumps(recipients),
+            'role': role,
+            'iteration': iteration,
+            'content_blob': blob,
+            'metadata_json': json.dumps(metadata or {}),
+            'content_hash': content_hash,
+            'is_compressed': codec != CODEC_NONE,
+            'codec': codec,
+            'dict_id': dict_id,
+            'dedup_key': dedup_key,
+            'content_chars': len(content),
+            'fts_indexed': self.fts_enabled,
+            '_text': content,  # FTS input, stripped before insert
+            '_recipients': list(dict.fromkeys(recipients))  # message_recipients rows, likewise
+        }
+
+    def _insert_rows(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Insert prepared rows in one transaction, one multi-VALUES INSERT per chunk.
+        
+        Rows whose dedup_key already exists (in the table or earlier in the
+        batch) are skipped by INSERT OR IGNORE and resolved to the existing id.
+        """
+        texts = [row.pop('_text', None) for row in rows]
+        recipients = [row.pop('_recipients', ()) for row in rows]
+        ids: List[Optional[int]] = []
+        inserted: List[bool] = []
+        with self.engine.begin() as conn:
+            for start in range(0, len(rows), BULK_INSERT_CHUNK):
+                chunk = rows[start:start + BULK_INSERT_CHUNK]
+                stmt = insert(MessageModel).values(chunk).returning(MessageModel.id, MessageModel.dedup_key)
+                if any(row.get('dedup_key') for row in chunk):
+                    stmt = stmt.prefix_with("OR IGNORE")
+                result = conn.execute(stmt)
+                # Rowids are assigned in VALUES order within one statement
+                returned = sorted(result.all())
+                pos = 0
+                seen = set()
+                for row in chunk:
+                    key = row.get('dedup_key')
+                    if pos < len(returned) and returned[pos][1] == key and (key is None or key not in seen):
+                        ids.append(returned[pos][0])
+                        inserted.append(True)
+                        pos += 1
+                    else:
+                        ids.append(None)
+                        inserted.append(False)
+                    seen.add(key)
             
-            session.add(db_msg)
-            session.commit()
-            session.refresh(db_msg)
-            return db_msg.id
+            duplicates = [row['dedup_key'] for row, done in zip(rows, inserted) if not done]
+            if duplicates:
+                existing = dict(conn.execute(
+                    select(MessageModel.dedup_key, MessageModel.id)
+                    .where(MessageModel.dedup_key.in_(set(duplicates)))
+                ).all())
+                ids = [msg_id if done else existing[row['dedup_key']]
+                       for msg_id, done, row in zip(ids, inserted, rows)]
+            
+            recipient_rows = [{"message_id": msg_id, "recipient": recipient}
+                              for msg_id, names, done in zip(ids, recipients, inserted) if done
+                              for recipient in names]
+            if recipient_rows:
+                conn.execute(insert(MessageRecipientModel), recipient_rows)
+            
+            fts_rows = [(msg_id, content) for msg_id, content, done in zip(ids, texts, inserted)
+                        if done and content is not None]
+            if self.fts_enabled and fts_rows:
+                conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (?, ?)", fts_rows)
+        if duplicates:
+            # Runs on the background writer and on log_messages_bulk callers alike
+            with self._writer_lock:
+                self.duplicates_ignored += len(duplicates)
+        return ids
+
+    def log_message(self, 
+                   task_id: str,
+                   sender: str,
+                   recipient: Union[str, List[str]],
+                   role: str,
+                   content: str,
+                   iteration: int = 0,
+                   metadata: Optional[Dict[str, Any]] = None,
+                   wait: bool = True,
+                   dedup_id: Optional[str] = None) -> Union[int, Future]:
+        """
+        Log a new message to memory.
+        
+        Args:
+            dedup_id: Extra dedup key component (e.g. the envelope id) so distinct
+                      messages with identical content are kept in strict mode.
+            wait: Insert now and return the id. With wait=False the row is
+                  buffered for the background writer and a Future resolving
+                  to the id is returned instead.
+        
+        Returns:
+            ID of the inserted message (or a Future of it when wait=False).
+        """
+        row = self._build_row(task_id, sender, recipient, role, content, iteration, metadata, dedup_id)
+        
+        if not wait:
+            return self._get_writer().submit(row)
+        
+        try:
+            # Strict mode dedups inside the INSERT; otherwise duplicates are kept
+            return self._insert_rows([row])[0]
         except Exception as e:
-            session.rollback()
             logger.error(f"Failed to log message: {e}")
             raise
-        finally:
-            session.close()
+
+    def log_messages_bulk(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """
+        Log many messages in a single transaction.
+        
+        Args:
+            messages: Dicts with log_message's keyword arguments
+                      (task_id, sender, recipient, role, content, iteration, metadata, dedup_id).
+        
+        Returns:
+            IDs of the inserted messages, in input order.
+        """
+        if not messages:
+            return []
+        rows = [self._build_row(**message) for message in messages]
+        try:
+            return self._insert_rows(rows)
+        except Exception as e:
+            logger.error(f"Failed to log {len(rows)} messages: {e}")
+            raise
+
+    def _get_writer(self) -> _BackgroundWriter:
+        """Start the background writer on first use."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = _BackgroundWriter(self, self.batch_size, self.flush_interval)
+            return self._writer
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for buffered (wait=False) messages to be written."""
+        writer = self._writer
+        if writer is None:
+            return True
+        return writer.flush(timeout)
+
+    def close(self):
+        """Flush and stop the background writer, then release pooled connections."""
+        self._backfill_stop.set()
+        self._retention_stop.set()
+        for thread in (self._backfill_thread, self._retention_thread):
+            if thread:
+                thread.join(timeout=5.0)
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        release_engine(self.engine)
 
     def query_messages(self, 
                       task_id: Optional[str] = None, 
                       sender: Optional[str] = None,
                       role: Optional[str] = None,
-                      limit: int = 50) -> List[Dict[str, Any]]:
+                      limit: int = 50,
+                      ascending: bool = False,
+                      after_id: Optional[int] = None,
+                      before_ts: Optional[float] = None,
+                      cursor: Optional[str] = None,
+                      fields: Optional[Iterable[str]] = None,
+                      preview_chars: Optional[int] = None,
+                      since_ts: Optional[float] = None,
+                      recipient: Optional[str] = None) -> MessagePage:
         """
         Search for messages.
+        
+        Newest first by default; ascending=True returns oldest first. With an
+        archive configured, pages reaching past the newest archived message
+        are merged with matching archived messages (polling stays hot-only).
+        
+        Args:
+            after_id: Only rows with id > after_id, in id order (polling for new rows).
+            before_ts: Only rows older than this timestamp (history browsing).
+            since_ts: Only rows at or after this timestamp.
+            recipient: Only rows addressed to this recipient (via message_recipients).
+            cursor: next_cursor of a previous page; continues that page's ordering.
+            fields: Result keys to include (default: all). Unselected columns are not read.
+            preview_chars: Decode only this many leading characters of 'content'.
+        
+        Returns:
+            MessagePage of lazily decoded MessageRecords; next_cursor is set when
+            more rows may follow.
         """
-        session = self.SessionLocal()
-        try:
-            query = session.query(MessageModel)
-            
-            if task_id:
-                query = query.filter(MessageModel.task_id == task_id)
-            if sender:
-                query = query.filter(MessageModel.sender == sender)
-            if role:
-                query = query.filter(MessageModel.role == role)
+        fields, query = self._select_messages(fields, task_id, sender, role, recipient, since_ts, before_ts)
+
+        mode = "i" if after_id is not None else ("a" if ascending else "d")
+        key: tuple = ()
+        if cursor:
+            mode, key = parse_message_cursor(cursor)
+        
+        if mode == "i":
+            # Since-id polling: ids only grow, so this never rescans old rows
+            last_id = key[0] if key else after_id
+            query = query.where(MessageModel.id > last_id).order_by(MessageModel.id.asc())
+        elif mode == "a":
+            if key:
+                ts, last_id = key
+                query = query.where(
+                    (MessageModel.timestamp > ts) |
+                    ((MessageModel.timestamp == ts) & (MessageModel.id > last_id))
+                )
+            query = query.order_by(MessageModel.timestamp.asc(), MessageModel.id.asc())
+        else:
+            if key:
+                ts, last_id = key
+                query = query.where(
+                    (MessageModel.timestamp < ts) |
+                    ((MessageModel.timestamp == ts) & (MessageModel.id < last_id))
+                )
+            query = query.order_by(MessageModel.timestamp.desc(), MessageModel.id.desc())
+        
+        if limit:
+            query = query.limit(limit)
+        
+        with self.engine.connect() as conn:
+            rows = [row._mapping for row in conn.execute(query).all()]
+        if self.archive is not None and mode != "i":
+            rows = self._merge_archived(rows, mode == "a", key, limit, dict(
+                task_id=task_id, sender=sender, role=role, since_ts=since_ts, before_ts=before_ts,
+                recipient=recipient
+            ))
+        
+        next_cursor = None
+        if limit and len(rows) == limit:
+            last = rows[-1]
+            next_cursor = f"i:{last['id']}" if mode == "i" else f"{mode}:{last['timestamp']!r}:{last['id']}"
+        return MessagePage([MessageRecord(row, fields, preview_chars) for row in rows], next_cursor)
+
+    @staticmethod
+    def _select_messages(fields: Optional[Iterable[str]], task_id: Optional[str], sender: Optional[str],
+                         role: Optional[str], recipient: Optional[str], since_ts: Optional[float],
+                         before_ts: Optional[float]) -> Tuple[Tuple[str, ...], Any]:
+        """Validated result fields and the filtered SELECT of the columns they need."""
+        fields = tuple(fields) if fields else tuple(MESSAGE_FIELDS)
+        unknown = [f for f in fields if f not in MESSAGE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown message fields: {', '.join(unknown)}")
+        # id/timestamp are always read: they build the continuation cursor
+        column_names = dict.fromkeys(('id', 'timestamp'))
+        for name in fields:
+            column_names.update(dict.fromkeys(MESSAGE_FIELDS[name]))
+        query = select(*[MessageModel.__table__.c[name] for name in column_names])
+
+        if task_id:
+            query = query.where(MessageModel.task_id == task_id)
+        if sender:
+            query = query.where(MessageModel.sender == sender)
+        if role:
+            query = query.where(MessageModel.role == role)
+        if recipient:
+            query = query.where(MessageModel.id.in_(
+                select(MessageRecipientModel.message_id).where(MessageRecipientModel.recipient == recipient)
+            ))
+        if before_ts is not None:
+            query = query.where(MessageModel.timestamp < before_ts)
+        if since_ts is not None:
+            query = query.where(MessageModel.timestamp >= since_ts)
+        return fields, query
+
+    def export_messages(self,
+                        task_id: Optional[str] = None,
+                        sender: Optional[str] = None,
+                        role: Optional[str] = None,
+                        since_ts: Optional[float] = None,
+                        before_ts: Optional[float] = None,
+                        recipient: Optional[str] = None,
+                        fields: Optional[Iterable[str]] = None,
+                        batch_size: int = EXPORT_BATCH) -> Iterator[Dict[str, Any]]:
+        """
+        Stream matching messages oldest first, one decoded dict at a time.
+        
+        Filters run in SQL and rows are fetched `batch_size` at a time from
+        a single cursor, so memory stays flat however much history matches.
+        Only the hot database is read (archive segments are NDJSON already).
+        
+        Args:
+            since_ts: Only rows at or after this timestamp.
+            before_ts: Only rows older than this timestamp.
+            fields: Result keys to include (default: all).
+            batch_size: Rows fetched and decoded per round trip.
+        
+        Yields:
+            Plain dicts, as dict(MessageRecord).
+        """
+        fields, query = self._select_messages(fields, task_id, sender, role, recipient, since_ts, before_ts)
+        query = query.order_by(MessageModel.timestamp.asc(), MessageModel.id.asc())
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(query)
+            while True:
+                batch = result.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    yield dict(MessageRecord(row._mapping, fields))
+
+    def _merge_archived(self, rows: List[Mapping], ascending: bool, key: tuple,
+                        limit: Optional[int], filters: Dict[str, Any]) -> List[Mapping]:
+        """Merge a page of hot rows with the archived rows that belong on it."""
+        newest_archived = self.archive.max_timestamp
+        if newest_archived is None:
+            return rows
+        if not ascending and limit and len(rows) == limit and rows[-1]['timestamp'] > newest_archived:
+            return rows  # the page ends before the archive begins
+        archived = self.archive.query(key=key or None, ascending=ascending, limit=limit, **filters)
+        if not archived:
+            return rows
+        # A crash between export and delete leaves a row in both tiers: keep the hot copy
+        hot_ids = {row['id'] for row in rows}
+        merged = rows + [_archived_row(record) for record in archived if record['id'] not in hot_ids]
+        merged.sort(key=lambda row: (row['timestamp'], row['id']), reverse=not ascending)
+        return merged[:limit] if limit else merged
+
+    def delete_messages(self, message_ids: List[int]) -> int:
+        """
+        Delete messages by id.
+        
+        Returns:
+            Number of rows deleted.
+        """
+        if not message_ids:
+            return 0
+        return self._delete_where(MessageModel.id.in_(message_ids))
+
+    def _delete_where(self, condition) -> int:
+        """Delete matching messages, removing indexed ones from the FTS index first."""
+        with self._fts_lock, self.engine.begin() as conn:
+            deleted = self._delete_in(conn, condition)
+        if deleted:
+            self._invalidate_context()
+        return deleted
+
+    def _delete_in(self, conn, condition) -> int:
+        """_delete_where inside a caller's transaction (caller holds _fts_lock)."""
+        if self.fts_enabled:
+            # Contentless FTS5 deletes need the exact text that was indexed
+            indexed = conn.execute(
+                select(*_CONTENT_COLUMNS).where(condition, MessageModel.fts_indexed == True)  # noqa: E712
+            ).all()
+            if indexed:
+                conn.exec_driver_sql(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', ?, ?)",
+                    [(row.id, _row_text(row)) for row in indexed]
+                )
+        conn.execute(delete(MessageRecipientModel).where(
+            MessageRecipientModel.message_id.in_(select(MessageModel.id).where(condition))
+        ))
+        hashes = conn.execute(
+            select(MessageModel.content_hash).where(condition, MessageModel.content_hash.isnot(None)).distinct()
+        ).scalars().all()
+        deleted = conn.execute(delete(MessageModel).where(condition)).rowcount
+        # Counts of texts no remaining message has
+        for start in range(0, len(hashes), BULK_INSERT_CHUNK):
+            chunk = hashes[start:start + BULK_INSERT_CHUNK]
+            conn.execute(delete(MessageTokenCountModel).where(
+                MessageTokenCountModel.content_hash.in_(chunk),
+                ~select(MessageModel.id).where(MessageModel.content_hash == MessageTokenCountModel.content_hash).exists()
+            ))
+        return deleted
+
+    # ===========================
+    # Full-Text Search
+    # ===========================
+
+    def search_text(self,
+                    query: str,
+                    task_id: Optional[str] = None,
+                    limit: int = 20,
+                    cursor: Optional[str] = None,
+                    snippet_chars: int = 160) -> MessagePage:
+        """
+        Ranked full-text search over message content.
+        
+        Args:
+            query: Free text; words are ANDed, a trailing * matches a prefix.
+            task_id: Restrict to one task.
+            limit: Page size.
+            cursor: next_cursor from a previous page.
+            snippet_chars: Snippet window width.
+        
+        Returns:
+            MessagePage of message dicts with 'rank' and 'snippet', best match first.
+        """
+        terms = _query_terms(query)
+        if not terms:
+            return MessagePage()
+        if not self.fts_enabled:
+            return self._scan_text(terms, task_id, limit, snippet_chars)
+        
+        after_rank, after_id = None, None
+        if cursor:
+            try:
+                rank_part, id_part = cursor.rsplit(":", 1)
+                after_rank, after_id = float(rank_part), int(id_part)
+            except ValueError:
+                raise ValueError(f"Invalid search cursor: {cursor}")
+        
+        join = ""
+        params: Dict[str, Any] = {"match": _fts_match(terms), "limit": limit + 1,
+                                  "after_rank": after_rank, "after_id": after_id}
+        if task_id:
+            join = f"JOIN messages ON messages.id = {FTS_TABLE}.rowid AND messages.task_id = :task_id"
+            params["task_id"] = task_id
+        
+        sql = text(f"""
+            SELECT id, rank FROM (
+                SELECT {FTS_TABLE}.rowid AS id, bm25({FTS_TABLE}) AS rank
+                FROM {FTS_TABLE} {join}
+                WHERE {FTS_TABLE} MATCH :match
+            )
+            WHERE :after_rank IS NULL OR rank > :after_rank OR (rank = :after_rank AND id > :after_id)
+            ORDER BY rank, id
+            LIMIT :limit
+        """)
+        with self.engine.connect() as conn:
+            hits = conn.execute(sql, params).all()
+        
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = f"{hits[-1].rank!r}:{hits[-1].id}"
+        
+        with self.engine.connect() as conn:
+            rows = {
+                row.id: row for row in
+                conn.execute(select(MessageModel.__table__).where(MessageModel.id.in_([hit.id for hit in hits])))
+            }
+        fields = tuple(MESSAGE_FIELDS)
+        results = []
+        for hit in hits:
+            row = rows.get(hit.id)
+            if row is None:
+                continue
+            result = dict(MessageRecord(row._mapping, fields))
+            result['rank'] = hit.rank
+            result['snippet'] = make_snippet(result['content'], terms, snippet_chars)
+            results.append(result)
+        return MessagePage(results, next_cursor)
+
+    def _scan_text(self, terms: List[str], task_id: Optional[str], limit: int,
+                   snippet_chars: int) -> MessagePage:
+        """Fallback search without FTS5: decompress and match newest first."""
+        needles = [t.rstrip("*").lower() for t in terms]
+        results = []
+        for record in self.query_messages(task_id=task_id, limit=None):
+            content = record['content'].lower()
+            if all(needle in content for needle in needles):
+                msg = dict(record)
+                msg['rank'] = 0.0
+                msg['snippet'] = make_snippet(msg['content'], terms, snippet_chars)
+                results.append(msg)
+                if len(results) >= limit:
+                    break
+        return MessagePage(results)
+
+    def _fts_backlog(self) -> bool:
+        """True if some rows are not yet in the FTS index."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(MessageModel.id).where(MessageModel.fts_indexed == False).limit(1)  # noqa: E712
+            ).first() is not None
+
+    def backfill_fts(self, batch_size: int = 500) -> int:
+        """
+        Index the next chunk of rows missing from the FTS index.
+        
+        Returns:
+            Number of rows indexed (0 once the backlog is empty).
+        """
+        if not self.fts_enabled:
+            return 0
+        with self._fts_lock, self.engine.begin() as conn:
+            rows = conn.execute(
+                select(*_CONTENT_COLUMNS)
+                .where(MessageModel.fts_indexed == False)  # noqa: E712
+                .order_by(MessageModel.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return 0
+            conn.exec_driver_sql(
+                f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (?, ?)",
+                [(row.id, _row_text(row)) for row in rows]
+            )
+            conn.execute(
+                MessageModel.__table__.update()
+                .where(MessageModel.id.in_([row.id for row in rows]))
+                .values(fts_indexed=True)
+            )
+        return len(rows)
+
+    def start_fts_backfill(self, batch_size: int = 500, pause: float = 0.05) -> threading.Thread:
+        """Index the FTS backlog in the background, one chunk at a time."""
+        if self._backfill_thread and self._backfill_thread.is_alive():
+            return self._backfill_thread
+        
+        def run():
+            total = 0
+            while not self._backfill_stop.is_set():
+                try:
+                    indexed = self.backfill_fts(batch_size)
+                except Exception as e:
+                    logger.error(f"FTS backfill failed: {e}")
+                    return
+                if not indexed:
+                    break
+                total += indexed
+                self._backfill_stop.wait(pause)
+            logger.info(f"FTS backfill finished: {total} messages indexed")
+        
+        self._backfill_stop.clear()
+        self._backfill_thread = threading.Thread(target=run, name="memory-fts-backfill", daemon=True)
+        self._backfill_thread.start()
+        return self._backfill_thread
+
+    # ===========================
+    # Compression Maintenance
+    # ===========================
+
+    def train_dictionary(self,
+                         codec: Optional[str] = None,
+                         sample_limit: int = 2000,
+                         size: Optional[int] = None) -> int:
+        """
+        Train a compression dictionary from recent messages and use it for new ones.
+        
+        Args:
+            codec: zlib or zstd (default: the store's current codec, zlib if that is none).
+            sample_limit: Number of most recent messages to learn from.
+            size: Dictionary size in bytes (codec default when omitted).
+        
+        Returns:
+            Id of the new dictionary.
+        """
+        codec = codec or (self.codec.codec if self.codec.codec != CODEC_NONE else CODEC_ZLIB)
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(*_CONTENT_COLUMNS).order_by(MessageModel.id.desc()).limit(sample_limit)
+            ).all()
+        # Raw-stored messages never touch the dictionary; don't let them shape it
+        samples = [text.encode('utf-8') for text in map(_row_text, rows)
+                   if len(text.encode('utf-8')) >= self.raw_threshold]
+        if not samples:
+            raise ValueError(f"No recent messages of {self.raw_threshold}+ bytes to train a dictionary on")
+        
+        data = codecs.train_dictionary(samples, codec, size)
+        dict_id = codecs.register_dictionary(data)
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(CompressionDictModel).prefix_with("OR IGNORE").values(
+                    id=dict_id, codec=codec, data=data,
+                    created_at=datetime.now().timestamp(), sample_count=len(samples)
+                )
+            )
+        self.codec = ContentCodec(codec, dict_id, self.raw_threshold, self.codec.level)
+        logger.info(f"Trained {codec} dictionary {dict_id} ({len(data)} bytes) from {len(samples)} messages")
+        return dict_id
+
+    def reencode_archive(self, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Re-encode stored messages with the current codec and dictionary.
+        Runs in id-ordered chunks, one short transaction each, so live writes keep flowing.
+        
+        Returns:
+            Counts: scanned, reencoded, bytes_before, bytes_after.
+        """
+        target = (self.codec.codec, self.codec.dict_id)
+        stats = {"scanned": 0, "reencoded": 0, "bytes_before": 0, "bytes_after": 0}
+        last_id = 0
+        while True:
+            with self.engine.begin() as conn:
+                rows = conn.execute(
+                    select(*_CONTENT_COLUMNS)
+                    .where(MessageModel.id > last_id)
+                    .order_by(MessageModel.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                stats["scanned"] += len(rows)
                 
-            # Order by timestamp desc
-            query = query.order_by(MessageModel.timestamp.desc())
-            
-            if limit:
-                query = query.limit(limit)
+                updates = []
+                for row in rows:
+                    codec = _stored_codec(row.is_compressed, row.codec)
+                    if (codec, row.dict_id) == target:
+                        continue
+                    try:
+                        content = codecs.decode(row.content_blob or b"", codec, row.dict_id).decode('utf-8')
+                    except Exception as e:
+                        logger.error(f"Skipping undecodable message {row.id}: {e}")
+                        continue
+                    blob, new_codec, new_dict_id = self.codec.encode(content)
+                    if (new_codec, new_dict_id) == (codec, row.dict_id):
+                        continue  # e.g. short messages already stored raw
+                    updates.append({"b_id": row.id, "content_blob": blob, "is_compressed": new_codec != CODEC_NONE,
+                                    "codec": new_codec, "dict_id": new_dict_id})
+                    stats["bytes_before"] += len(row.content_blob or b"")
+                    stats["bytes_after"] += len(blob)
                 
-            results = query.all()
-            return [msg.to_dict() for msg in results]
-        finally:
-            session.close()
-
-    def get_recent_context(self, task_id: str, max_tokens: int = 8000) -> str:
-        """
-        Retrieve recent messages for a task formatted as context string.
-        (Simplified token estimation: 1 char ~= 0.25 tokens or just char limit)
-        """
-        # Get all msgs for task
-        msgs = self.query_messages(task_id=task_id, limit=100)
-        # Reverse to chronological
-        msgs.reverse()
-        
-        context_parts = []
-        current_len = 0
-        limit_char = max_tokens * 4  # rough approx
-        
-        # We want the MOST RECENT context that fits.
-        # So we iterate backwards from most recent? query_messages returns DESC.
-        # So msgs[0] is oldest after reverse(), msgs[-1] is newest.
-        # Actually query returns DESC (newest first). 
-        # msgs (reversed) is oldest -> newest.
-        
-        for msg in msgs:
-            formatted = f"[{msg['timestamp']}] {msg['sender']} ({msg['role']}): {msg['content']}\n"
-            if current_len + len(formatted) > limit_char:
-                # If we exceed, maybe we should stop? 
-                # Or if we want tail context, we should slice from end.
-                pass 
-            
-            context_parts.append(formatted)
-            current_len += len(formatted)
-            
-        return "".join(context_parts)
+                if updates:
+                    conn.execute(
+                        MessageModel.__table__.update()
+                        .where(MessageModel.id == bindparam("b_id"))
+                        .values(content_blob=bindparam("content_blob"), is_compressed=bindparam("is_compressed"),
+                                codec=bindparam("codec"), dict_id=bindparam("dict_id")),
+                        updates
+                    )
+                    stats["reencoded"] += len(updates)
+        logger.info(f"Re-encoded {stats['reencoded']}/{stats['scanned']} messages: "
+                    f"{stats['bytes_before']} -> {stats['bytes_after']} bytes")
+        return stats
 
-    def prune_archives(self, days_keep: int = 30) -> int:
+    def deduplicate_archive(self, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        One-off migration for strict dedup on an existing database.
+        
+        Walks rows without a dedup key in id-ordered chunks (one short
+        transaction each), deletes later copies of an already seen
+        content_hash and keys the survivors so retries collide with them.
+        
+        Returns:
+            Counts: scanned, removed.
+        """
+        stats = {"scanned": 0, "removed": 0}
+        last_id = 0
+        while True:
+            with self._fts_lock, self.engine.begin() as conn:
+                rows = conn.execute(
+                    select(MessageModel.id, MessageModel.content_hash)
+                    .where(MessageModel.id > last_id,
+                           MessageModel.dedup_key.is_(None),
+                           MessageModel.content_hash.isnot(None))
+                    .order_by(MessageModel.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                stats["scanned"] += len(rows)
+                
+                hashes = {row.content_hash for row in rows}
+                taken = set(conn.execute(
+                    select(MessageModel.dedup_key).where(MessageModel.dedup_key.in_(hashes))
+                ).scalars())
+                keep: Dict[str, int] = {}
+                duplicates: List[int] = []
+                for row in rows:
+                    if row.content_hash in taken or row.content_hash in keep:
+                        duplicates.append(row.id)
+                    else:
+                        keep[row.content_hash] = row.id
+                
+                if duplicates:
+                    stats["removed"] += self._delete_in(conn, MessageModel.id.in_(duplicates))
+                    self._invalidate_context()
+                if keep:
+                    conn.execute(
+                        MessageModel.__table__.update()
+                        .where(MessageModel.id == bindparam("b_id"))
+                        .values(dedup_key=bindparam("dedup_key")),
+                        [{"b_id": msg_id, "dedup_key": key} for key, msg_id in keep.items()]
+                    )
+        logger.info(f"Dedup migration: removed {stats['removed']} of {stats['scanned']} messages")
+        return stats
+
+    # ===========================
+    # Context Assembly
+    # ===========================
+
+    def get_recent_context(self, task_id: str, max_tokens: int = 8000,
+                           counter: Optional[TokenCounter] = None) -> str:
+        """
+        Most recent messages of a task that fit in `max_tokens`, oldest first.
+        
+        Walks backwards from the newest message using the stored content
+        length (or token count), stops once the budget is full and
+        decompresses only the rows it keeps. Results are cached per task
+        and extended with new messages on later calls; deletes invalidate
+        the cache.
+        
+        Args:
+            counter: Tokenizer to budget with (default: the store's token_counter).
+                     Without one, CHARS_PER_TOKEN characters count as a token.
+        """
+        return self._recent_context(task_id, max_tokens, counter).text
+
+    def _recent_context(self, task_id: str, max_tokens: int,
+                        counter: Optional[TokenCounter]) -> _ContextEntry:
+        """get_recent_context's cache entry (its `used` is in budget units: tokens, or chars without a counter)."""
+        counter = counter or self.token_counter
+        budget = max_tokens if counter is not None else max_tokens * CHARS_PER_TOKEN
+        key = (task_id, budget, counter)
+        with self._context_lock:
+            entry = self._context_cache.get(key)
+            if entry is not None:
+                self._context_cache.move_to_end(key)
+        
+        after_id = entry.last_id if entry is not None else 0
+        tail, full = self._context_tail(task_id, budget, after_id, counter)
+        if entry is not None and not tail:
+            return entry
+        
+        lines, sizes = self._context_lines(tail, budget, counter)
+        if entry is not None and not full:
+            # New messages fit: keep the newest cached lines that still do
+            room = budget - sum(sizes)
+            first = 0
+            used = entry.used
+            while first < len(entry.lines) and used > room:
+                used -= entry.sizes[first]
+                first += 1
+            lines = entry.lines[first:] + lines
+            sizes = entry.sizes[first:] + sizes
+        
+        last_id = tail[0]['id'] if tail else after_id
+        entry = _ContextEntry(lines, sizes, last_id)
+        with self._context_lock:
+            self._context_cache[key] = entry
+            self._context_cache.move_to_end(key)
+            while len(self._context_cache) > self.context_cache_size:
+                self._context_cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _header_cost(row: Mapping, counter: Optional[TokenCounter]) -> int:
+        header = _context_line(row['timestamp'], row['sender'], row['role'], "")
+        if counter is None:
+            return len(header)
+        return estimate_tokens(header, HEADER_CHARS_PER_TOKEN)
+
+    def _context_tail(self, task_id: str, budget: int, after_id: int,
+                      counter: Optional[TokenCounter]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Size a task's messages newest first (id > after_id) until `budget` is used.
+        
+        Returns:
+            (rows kept, newest first, with a 'cost' key; True if the budget stopped the walk)
+        """
+        table = MessageModel.__table__
+        source = table
+        if counter is None:
+            size_column = table.c.content_chars
+        elif counter.tokenizer_id is None:
+            size_column = null()  # unnamed tokenizer: nothing persisted to reuse
+        else:
+            # Only counts made by this tokenizer: another engine's model may tokenize differently
+            counts = MessageTokenCountModel.__table__
+            source = table.outerjoin(counts, (counts.c.content_hash == table.c.content_hash)
+                                     & (counts.c.tokenizer == counter.tokenizer_id))
+            size_column = counts.c.token_count
+        kept: List[Dict[str, Any]] = []
+        used = 0
+        before_id = None
+        with self.engine.connect() as conn:
+            while True:
+                query = (
+                    select(table.c.id, table.c.timestamp, table.c.sender, table.c.role,
+                           table.c.content_hash, size_column.label('size'))
+                    .select_from(source)
+                    .where(table.c.task_id == task_id, table.c.id > after_id)
+                    .order_by(table.c.id.desc())
+                    .limit(CONTEXT_PAGE)
+                )
+                if before_id is not None:
+                    query = query.where(table.c.id < before_id)
+                rows = [dict(row._mapping) for row in conn.execute(query)]
+                if not rows:
+                    return kept, False
+                before_id = rows[-1]['id']
+                
+                unsized = [row for row in rows if row['size'] is None]
+                if unsized:
+                    self._size_rows(conn, unsized, counter)
+                
+                for row in rows:
+                    row['cost'] = self._header_cost(row, counter) + row['size']
+                    if used + row['cost'] > budget:
+                        if not kept:
+                            kept.append(row)  # newest message alone is too big: keep its tail
+                        return kept, True
+                    kept.append(row)
+                    used += row['cost']
+                if len(rows) < CONTEXT_PAGE:
+                    return kept, False
+
+    def _size_rows(self, conn, rows: List[Dict[str, Any]], counter: Optional[TokenCounter]):
+        """
+        Fill in missing sizes by decoding the rows. Exact token counts are
+        saved per (content_hash, tokenizer_id), so each text is tokenized
+        once per tokenizer; content_chars is only missing on pre-1.8 rows.
+        """
+        texts = {
+            row.id: _row_text(row) for row in
+            conn.execute(select(*_CONTENT_COLUMNS).where(MessageModel.id.in_([row['id'] for row in rows])))
+        }
+        memo = []
+        for row in rows:
+            text = texts.get(row['id'], "")
+            if counter is None:
+                row['size'] = len(text)
+                continue
+            tokens = counter.count_exact(text, row['content_hash'])
+            if tokens is None:
+                row['size'] = counter.count(text)
+            else:
+                row['size'] = tokens
+                if row['content_hash'] and counter.tokenizer_id is not None:
+                    memo.append({"content_hash": row['content_hash'], "tokenizer": counter.tokenizer_id,
+                                 "token_count": tokens})
+        if memo:
+            with self.engine.begin() as write:
+                write.execute(insert(MessageTokenCountModel).prefix_with("OR IGNORE"), memo)
+
+    def _context_lines(self, tail: List[Dict[str, Any]], budget: int,
+                       counter: Optional[TokenCounter]) -> Tuple[List[str], List[int]]:
+        """Decode the kept rows and format them oldest first, with their costs."""
+        if not tail:
+            return [], []
+        with self.engine.connect() as conn:
+            contents = {
+                row.id: _row_text(row) for row in
+                conn.execute(select(*_CONTENT_COLUMNS).where(MessageModel.id.in_([row['id'] for row in tail])))
+            }
+        lines, sizes = [], []
+        for row in reversed(tail):
+            content = contents.get(row['id'], "")
+            cost = row['cost']
+            if cost > budget:
+                # Keep the end of an oversized message, marked with "..."
+                room = budget - self._header_cost(row, counter) - (3 if counter is None else 1)
+                if counter is None:
+                    content = "..." + (content[-room:] if room > 0 else "")
+                else:
+                    content = "..." + counter.fit_tail(content, room)
+                cost = budget
+            lines.append(_context_line(row['timestamp'], row['sender'], row['role'], content))
+            sizes.append(cost)
+        return lines, sizes
+
+    def reset_token_counts(self, tokenizer_id: Optional[str] = None):
         """
-        Delete messages older than N days.
+        Forget memoized token counts (e.g. after a model with another tokenizer
+        took over a tokenizer_id).
+
+        Args:
+            tokenizer_id: Only this tokenizer's counts (default: all)
+        """
+        with self.engine.begin() as conn:
+            statement = delete(MessageTokenCountModel)
+            if tokenizer_id is not None:
+                statement = statement.where(MessageTokenCountModel.tokenizer == tokenizer_id)
+            conn.execute(statement)
+        self._invalidate_context()
+
+    def _invalidate_context(self):
+        """Drop cached contexts (messages were deleted)."""
+        with self._context_lock:
+            self._context_cache.clear()
+
+    # ===========================
+    # Retention
+    # ===========================
+
+    def apply_retention(self,
+                        days_keep: float = 30,
+                        chunk_size: int = RETENTION_CHUNK,
+                        pause: float = 0.01,
+                        stop: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        Move messages older than N days out of the database, one short
+        transaction per chunk so ingest is never blocked for long.
+        
+        With an archive configured, each chunk is written (and fsynced) to
+        archive segments before it is deleted.
+        
+        Args:
+            days_keep: Age in days after which messages leave the database.
+            chunk_size: Messages per chunk.
+            pause: Seconds to yield to other writers between chunks.
+            stop: Event that ends the run after the current chunk.
+        
+        Returns:
+            Counts of messages archived and deleted, and chunks processed.
         """
         cutoff = datetime.now().timestamp() - (days_keep * 86400)
-        session = self.SessionLocal()
-        try:
-            affected = session.query(MessageModel).filter(MessageModel.timestamp < cutoff).delete()
-            session.commit()
-            return affected
-        finally:
-            session.close()
+        stats = {"archived": 0, "deleted": 0, "chunks": 0}
+        if self.archive is not None:
+            columns = [MessageModel.__table__.c[name] for name in ARCHIVE_COLUMNS if name != 'content']
+            columns += [MessageModel.content_blob, MessageModel.is_compressed, MessageModel.codec, MessageModel.dict_id]
+        else:
+            columns = [MessageModel.id]
+        
+        while stop is None or not stop.is_set():
+            # Oldest first via the timestamp index; deleted rows drop out of the next scan
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    select(*columns)
+                    .where(MessageModel.timestamp < cutoff)
+                    .order_by(MessageModel.timestamp, MessageModel.id)
+                    .limit(chunk_size)
+                ).all()
+            if not rows:
+                break
+            if self.archive is not None:
+                stats["archived"] += self.archive.write(
+                    dict(row._mapping, content=_row_text(row)) for row in rows
+                )
+            stats["deleted"] += self._delete_where(MessageModel.id.in_([row.id for row in rows]))
+            stats["chunks"] += 1
+            if pause:
+                time.sleep(pause)
+        
+        if stats["chunks"]:
+            logger.info(f"Retention ({days_keep}d): archived {stats['archived']}, "
+                        f"deleted {stats['deleted']} messages in {stats['chunks']} chunks")
+        return stats
+
+    def start_retention(self,
+                        days_keep: float = 30,
+                        interval: float = 3600.0,
+                        chunk_size: int = RETENTION_CHUNK,
+                        pause: float = 0.05) -> threading.Thread:
+        """Run apply_retention every `interval` seconds in the background until close()."""
+        if self._retention_thread and self._retention_thread.is_alive():
+            return self._retention_thread
+        
+        def run():
+            while not self._retention_stop.is_set():
+                try:
+                    self.apply_retention(days_keep, chunk_size, pause, stop=self._retention_stop)
+                except Exception as e:
+                    logger.error(f"Retention run failed: {e}")
+                self._retention_stop.wait(interval)
+        
+        self._retention_stop.clear()
+        self._retention_thread = threading.Thread(target=run, name="memory-retention", daemon=True)
+        self._retention_thread.start()
+        return self._retention_thread
+
+    def prune_archives(self, days_keep: int = 30) -> int:
+        """
+        Delete (archiving first, if configured) messages older than N days.
+        
+        Returns:
+            Number of messages deleted.
+        """
+        return self.apply_retention(days_keep, pause=0)["deleted"]
 
@@ -0,0 +1,296 @@
+"""
+The-Commander: Node Metrics History
+Fixed-memory time series of node metrics (tps, load, ...).
+
+Every (node, metric) pair gets preallocated ring buffers: one of raw
+samples and one per rollup resolution (10s / 1m / 10m buckets holding
+min, max, sum and count). A sample updates the open bucket of every
+resolution at once, so queries never aggregate raw data. Rings
+overwrite their oldest entry when full; memory is fixed per series
+regardless of uptime.
+
+With NumPy installed (optional) the rings are arrays and a sample
+updates all rollup levels in one vectorized step; without it they are
+preallocated Python lists with the same layout and results.
+
+Tuning (environment):
+- COMMANDER_METRICS_RAW      raw samples kept per series (default 720)
+- COMMANDER_METRICS_ROLLUP   buckets kept per resolution (default 1008:
+                             2.8h at 10s, 16.8h at 1m, 7 days at 10m)
+
+Version: 1.0.0
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+logger = logging.getLogger(__name__)
+
+RAW = "raw"
+AUTO = "auto"
+
+# Rollup resolutions: name -> bucket width (seconds), finest first
+ROLLUPS: Dict[str, int] = {"10s": 10, "1m": 60, "10m": 600}
+RESOLUTIONS = (RAW, *ROLLUPS)
+
+# Windows up to this long are served raw by AUTO
+AUTO_RAW_WINDOW = 300.0
+
+# AUTO picks the finest rollup returning at most this many buckets
+AUTO_MAX_POINTS = 360
+
+# Distinct metric names tracked per node (further names are ignored)
+MAX_SERIES_PER_NODE = 16
+
+# Rollup bucket columns
+_START, _MIN, _MAX, _SUM, _COUNT = range(5)
+
+
+def numpy_available() -> bool:
+    """True if the optional numpy package is installed."""
+    return np is not None
+
+
+def resolve_resolution(window: float, resolution: str = AUTO) -> str:
+    """
+    Concrete resolution for a query.
+
+    Args:
+        window: Seconds of history requested
+        resolution: One of RESOLUTIONS, or AUTO to pick by window length
+
+    Returns:
+        A member of RESOLUTIONS.
+    """
+    if resolution != AUTO:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r} (expected one of {', '.join(RESOLUTIONS)}, {AUTO})")
+        return resolution
+    if window <= AUTO_RAW_WINDOW:
+        return RAW
+    for name, width in ROLLUPS.items():
+        if window / width <= AUTO_MAX_POINTS:
+            return name
+    return list(ROLLUPS)[-1]
+
+
+class MetricSeries:
+    """Raw ring plus one rollup ring per resolution, for one metric of one node."""
+
+    __slots__ = ("raw_capacity", "rollup_capacity", "_widths", "_raw", "_raw_head", "_raw_size",
+                 "_rollups", "_heads", "_sizes", "_open", "_levels")
+
+    def __init__(self, raw_capacity: int, rollup_capacity: int):
+        """
+        Args:
+            raw_capacity: Raw samples kept
+            rollup_capacity: Buckets kept per rollup resolution
+        """
+        self.raw_capacity = raw_capacity
+        self.rollup_capacity = rollup_capacity
+        levels = len(ROLLUPS)
+        self._raw_head = -1
+        self._raw_size = 0
+        if np is not None:
+            self._widths = np.array(list(ROLLUPS.values()), dtype=np.float64)
+            self._levels = np.arange(levels)
+            self._raw = np.zeros((raw_capacity, 2), dtype=np.float64)
+            self._rollups = np.zeros((levels, rollup_capacity, 5), dtype=np.float64)
+            self._heads = np.full(levels, -1, dtype=np.int64)
+            self._sizes = np.zeros(levels, dtype=np.int64)
+            self._open = np.full(levels, -np.inf)
+        else:
+            self._widths = list(ROLLUPS.values())
+            self._levels = range(levels)
+            self._raw = [None] * raw_capacity
+            self._rollups = [[None] * rollup_capacity for _ in range(levels)]
+            self._heads = [-1] * levels
+            self._sizes = [0] * levels
+            self._open = [-math.inf] * levels
+
+    @property
+    def nbytes(self) -> int:
+        """Preallocated ring storage (numpy backend; 0 for the list fallback)."""
+        return int(self._raw.nbytes + self._rollups.nbytes) if np is not None else 0
+
+    def add(self, ts: float, value: float):
+        """
+        Append a sample and fold it into the open bucket of every resolution.
+        A sample older than a resolution's open bucket is folded into that bucket.
+        """
+        self._raw_head = (self._raw_head + 1) % self.raw_capacity
+        self._raw_size = min(self._raw_size + 1, self.raw_capacity)
+        self._raw[self._raw_head] = (ts, value)
+        if np is not None:
+            self._add_vectorized(ts, value)
+        else:
+            self._add_scalar(ts, value)
+
+    def _add_vectorized(self, ts: float, value: float):
+        starts = np.floor(ts / self._widths) * self._widths
+        new = starts > self._open
+        if new.any():
+            self._heads[new] = (self._heads[new] + 1) % self.rollup_capacity
+            self._sizes[new] = np.minimum(self._sizes[new] + 1, self.rollup_capacity)
+            self._open[new] = starts[new]
+        rows = self._rollups[self._levels, self._heads]
+        rows[new] = (0.0, np.inf, -np.inf, 0.0, 0.0)
+        rows[new, _START] = starts[new]
+        rows[:, _MIN] = np.minimum(rows[:, _MIN], value)
+        rows[:, _MAX] = np.maximum(rows[:, _MAX], value)
+        rows[:, _SUM] += value
+        rows[:, _COUNT] += 1
+        self._rollups[self._levels, self._heads] = rows
+
+    def _add_scalar(self, ts: float, value: float):
+        for level in self._levels:
+            width = self._widths[level]
+            start = math.floor(ts / width) * width
+            ring = self._rollups[level]
+            if start > self._open[level]:
+                head = self._heads[level] = (self._heads[level] + 1) % self.rollup_capacity
+                self._sizes[level] = min(self._sizes[level] + 1, self.rollup_capacity)
+                self._open[level] = start
+                ring[head] = [float(start), value, value, value, 1.0]
+            else:
+                row = ring[self._heads[level]]
+                row[_MIN] = min(row[_MIN], value)
+                row[_MAX] = max(row[_MAX], value)
+                row[_SUM] += value
+                row[_COUNT] += 1
+
+    def query(self, since: float, resolution: str) -> List[Dict[str, float]]:
+        """
+        Points at or after `since` (rollups: buckets overlapping it), oldest first.
+
+        Args:
+            since: Window start (epoch seconds)
+            resolution: A member of RESOLUTIONS
+
+        Returns:
+            Raw: [{"t", "value"}]; rollups: [{"t" (bucket start), "min", "max", "avg", "count"}].
+        """
+        if resolution == RAW:
+            rows = self._ordered(self._raw, self._raw_head, self._raw_size, self.raw_capacity)
+            if np is not None:
+                rows = rows[rows[:, 0] >= since].tolist()
+            else:
+                rows = [row for row in rows if row[0] >= since]
+            return [{"t": t, "value": v} for t, v in rows]
+
+        level = list(ROLLUPS).index(resolution)
+        width = ROLLUPS[resolution]
+        rows = self._ordered(self._rollups[level], int(self._heads[level]), int(self._sizes[level]),
+                             self.rollup_capacity)
+        if np is not None:
+            rows = rows[rows[:, _START] + width > since].tolist()
+        else:
+            rows = [row for row in rows if row[_START] + width > since]
+        return [{"t": start, "min": low, "max": high, "avg": total / count, "count": int(count)}
+                for start, low, high, total, count in rows]
+
+    @staticmethod
+    def _ordered(ring, head: int, size: int, capacity: int):
+        """Ring entries oldest first."""
+        if np is not None:
+            return ring[(np.arange(head - size + 1, head + 1)) % capacity]
+        return [ring[i % capacity] for i in range(head - size + 1, head + 1)]
+
+
+class MetricsStore:
+    """
+    Metric history for every node, one MetricSeries per (node, metric),
+    created on the first numeric sample.
+    """
+
+    def __init__(self, raw_capacity: Optional[int] = None, rollup_capacity: Optional[int] = None):
+        """
+        Args:
+            raw_capacity: Raw samples per series (default: COMMANDER_METRICS_RAW or 720)
+            rollup_capacity: Buckets per resolution (default: COMMANDER_METRICS_ROLLUP or 1008)
+        """
+        if raw_capacity is None:
+            raw_capacity = int(os.getenv("COMMANDER_METRICS_RAW", "720"))
+        if rollup_capacity is None:
+            rollup_capacity = int(os.getenv("COMMANDER_METRICS_ROLLUP", "1008"))
+        self.raw_capacity = max(1, raw_capacity)
+        self.rollup_capacity = max(1, rollup_capacity)
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[str, MetricSeries]] = {}
+
+    def record(self, node_id: str, metrics: Mapping[str, Any], ts: Optional[float] = None) -> None:
+        """
+        Append one sample per numeric metric (booleans and non-numbers are skipped).
+
+        Args:
+            node_id: Node the metrics belong to
+            metrics: Metric name -> value
+            ts: Sample time (default: now)
+        """
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            node = self._series.setdefault(node_id, {})
+            for name, value in metrics.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                series = node.get(name)
+                if series is None:
+                    if len(node) >= MAX_SERIES_PER_NODE:
+                        logger.debug(f"Metric {name!r} of {node_id} not tracked (series limit reached)")
+                        continue
+                    series = node[name] = MetricSeries(self.raw_capacity, self.rollup_capacity)
+                series.add(ts, float(value))
+
+    def query(self, node_id: str, window: float, resolution: str = AUTO,
+              names: Optional[Sequence[str]] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        History of a node's metrics over the last `window` seconds.
+
+        Args:
+            node_id: Node to read
+            window: Seconds of history
+            resolution: One of RESOLUTIONS, or AUTO (see resolve_resolution)
+            names: Metrics to return (default: all tracked)
+            now: Window end (default: now)
+
+        Returns:
+            {"resolution", "window", "series": {metric: points}}; metrics never
+            recorded are returned empty.
+        """
+        resolution = resolve_resolution(window, resolution)
+        since = (time.time() if now is None else now) - window
+        with self._lock:
+            node = self._series.get(node_id, {})
+            wanted = list(node) if names is None else names
+            series = {name: node[name].query(since, resolution) if name in node else [] for name in wanted}
+        return {"resolution": resolution, "window": window, "series": series}
+
+    def nodes(self) -> List[str]:
+        with self._lock:
+            return list(self._series)
+
+    def drop(self, node_id: str) -> None:
+        """Forget a node's history."""
+        with self._lock:
+            self._series.pop(node_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [s for node in self._series.values() for s in node.values()]
+        return {
+            "backend": "numpy" if np is not None else "python",
+            "nodes": len(self._series),
+            "series": len(series),
+            "raw_capacity": self.raw_capacity,
+            "rollup_capacity": self.rollup_capacity,
+            "bytes": sum(s.nbytes for s in series),
+        }
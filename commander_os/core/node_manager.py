@@ -8,7 +8,7 @@ Handles:
 - Heartbeat monitoring
 - Weighted routing (Load Balancing)
 
-Version: 1.2.0 (Protocol Integrated)
+Version: 1.2.1 (Protocol Integrated)
 """
 
 import logging
@@ -210,8 +210,7 @@ class NodeManager:
                 # Sync with Relay (Cluster Visibility)
                 self._sync_with_relay()
                 
-                time.sleep(5)
-                
             except Exception as e:
                 logger.error(f"Error in node monitoring loop: {e}")
-                time.sleep(5)
+            # Wakes immediately on stop instead of finishing a 5s sleep
+            self._stop_event.wait(5)
@@ -0,0 +1,474 @@
+"""
+The-Commander: Partitioned Memory
+MessageStore split across one SQLite file per month (or per N rows), so
+indexes stay the size of a partition and old history is dropped by
+deleting a file instead of running DELETE + VACUUM.
+
+- Writes go to the active shard
+- query_messages / search_text fan out to the relevant shards in parallel
+  and heap-merge the per-shard pages
+- get_recent_context walks shards newest first until the budget is full
+- export_messages streams shards oldest first, one cursor at a time
+- Message ids are global: (shard ordinal << SHARD_ID_BITS) | local id, so
+  they keep growing across shards and since-id polling still works
+
+Version: 1.2.1
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import func, select
+
+from commander_os.core.memory import (
+    EXPORT_BATCH, MessageModel, MessagePage, MessageStore, parse_message_cursor
+)
+from commander_os.core.tokens import CHARS_PER_TOKEN, TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# Low bits of a global message id hold the shard-local id
+SHARD_ID_BITS = 32
+LOCAL_ID_LIMIT = 1 << SHARD_ID_BITS
+
+_MONTH_FILE = re.compile(r"^messages-(\d{4})-(\d{2})\.db$")
+_ROWS_FILE = re.compile(r"^messages-(\d{6})\.db$")
+
+
+def global_id(ordinal: int, local_id: int) -> int:
+    return (ordinal << SHARD_ID_BITS) | local_id
+
+
+def split_id(message_id: int) -> Tuple[int, int]:
+    """Global message id -> (shard ordinal, local id)."""
+    return message_id >> SHARD_ID_BITS, message_id & (LOCAL_ID_LIMIT - 1)
+
+
+def _local_bound(ordinal: int, key_ordinal: int, key_local: int) -> int:
+    """
+    Shard-local id equivalent to a global keyset id.
+
+    Rows of earlier shards have smaller global ids than any key in a later
+    shard (and vice versa), which LOCAL_ID_LIMIT / 0 express as local ids.
+    """
+    if ordinal == key_ordinal:
+        return key_local
+    return LOCAL_ID_LIMIT if ordinal < key_ordinal else 0
+
+
+class _Shard:
+    """One partition file and its MessageStore."""
+
+    __slots__ = ("ordinal", "path", "store", "bounds")
+
+    def __init__(self, ordinal: int, path: Path, store: MessageStore):
+        self.ordinal = ordinal
+        self.path = path
+        self.store = store
+        self.bounds: Optional[Tuple[Optional[float], Optional[float]]] = None  # cached once sealed
+
+
+class PartitionedMessageStore:
+    """
+    Drop-in MessageStore replacement backed by time- or size-partitioned shards.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 rows_per_shard: Optional[int] = None,
+                 fan_out_workers: int = 4,
+                 **store_kwargs):
+        """
+        Initialize the partitioned store.
+
+        Args:
+            directory: Folder holding the shard files (created if missing).
+            rows_per_shard: Start a new shard after this many rows (default: one shard per UTC month).
+            fan_out_workers: Threads querying shards in parallel.
+            **store_kwargs: Passed to each shard's MessageStore (codec, dedup, token_counter, ...).
+                            Strict dedup applies within a shard.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rows_per_shard = rows_per_shard
+        self.store_kwargs = store_kwargs
+        self.dedup = store_kwargs.get("dedup", False)
+        self.archive = None
+        self._lock = threading.RLock()
+        self._shards: Dict[int, _Shard] = {}
+        self._pool = ThreadPoolExecutor(max_workers=fan_out_workers, thread_name_prefix="memory-fan-out")
+        self._retention_thread: Optional[threading.Thread] = None
+        self._retention_stop = threading.Event()
+        self._active_rows: Optional[int] = None  # rows in the newest shard (rows_per_shard mode)
+
+        pattern = _ROWS_FILE if rows_per_shard else _MONTH_FILE
+        for path in sorted(self.directory.iterdir()):
+            match = pattern.match(path.name)
+            if match:
+                ordinal = int(match.group(1)) if rows_per_shard else \
+                    int(match.group(1)) * 12 + int(match.group(2)) - 1
+                self._open(ordinal)
+        logger.info(f"PartitionedMessageStore at {directory}: {len(self._shards)} shards "
+                    f"({f'{rows_per_shard} rows' if rows_per_shard else 'monthly'})")
+
+    # ===========================
+    # Shards
+    # ===========================
+
+    def _shard_path(self, ordinal: int) -> Path:
+        if self.rows_per_shard:
+            return self.directory / f"messages-{ordinal:06d}.db"
+        year, month = divmod(ordinal, 12)
+        return self.directory / f"messages-{year:04d}-{month + 1:02d}.db"
+
+    def _open(self, ordinal: int) -> _Shard:
+        with self._lock:
+            shard = self._shards.get(ordinal)
+            if shard is None:
+                path = self._shard_path(ordinal)
+                shard = _Shard(ordinal, path, MessageStore(f"sqlite:///{path}", **self.store_kwargs))
+                self._shards[ordinal] = shard
+            return shard
+
+    def _active(self, rows: int = 0) -> _Shard:
+        """
+        Shard new messages are written to (opened on first use).
+
+        Args:
+            rows: Messages about to be written (counted toward rows_per_shard).
+        """
+        with self._lock:
+            if not self.rows_per_shard:
+                now = datetime.now(timezone.utc)
+                return self._open(now.year * 12 + now.month - 1)
+            ordinal = max(self._shards, default=1)
+            shard = self._open(ordinal)
+            if self._active_rows is None:
+                with shard.store.engine.connect() as conn:
+                    self._active_rows = conn.execute(select(func.max(MessageModel.id))).scalar() or 0
+            if self._active_rows >= self.rows_per_shard:
+                shard = self._open(ordinal + 1)
+                self._active_rows = 0
+            self._active_rows += rows
+            return shard
+
+    def _ordered(self, newest_first: bool = False) -> List[_Shard]:
+        with self._lock:
+            return sorted(self._shards.values(), key=lambda s: s.ordinal, reverse=newest_first)
+
+    def _bounds(self, shard: _Shard) -> Tuple[Optional[float], Optional[float]]:
+        """Oldest and newest timestamp in a shard (cached once a newer shard exists)."""
+        if shard.bounds is not None:
+            return shard.bounds
+        with shard.store.engine.connect() as conn:
+            bounds = tuple(conn.execute(
+                select(func.min(MessageModel.timestamp), func.max(MessageModel.timestamp))
+            ).one())
+        with self._lock:
+            if shard.ordinal < max(self._shards):
+                shard.bounds = bounds
+        return bounds
+
+    def _fan_out(self, shards: List[_Shard], call: Callable[[_Shard], Any]) -> List[Any]:
+        if len(shards) == 1:
+            return [call(shards[0])]
+        return list(self._pool.map(call, shards))
+
+    # ===========================
+    # Writes
+    # ===========================
+
+    def log_message(self, *args, wait: bool = True, **kwargs) -> Union[int, Future]:
+        """MessageStore.log_message on the active shard; returns the global id (or a Future of it)."""
+        shard = self._active(rows=1)
+        result = shard.store.log_message(*args, wait=wait, **kwargs)
+        if wait:
+            return global_id(shard.ordinal, result)
+
+        outer: Future = Future()
+
+        def resolve(inner: Future):
+            error = inner.exception()
+            if error is not None:
+                outer.set_exception(error)
+            else:
+                outer.set_result(global_id(shard.ordinal, inner.result()))
+        result.add_done_callback(resolve)
+        return outer
+
+    def log_messages_bulk(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """MessageStore.log_messages_bulk on the active shard; returns global ids."""
+        if not messages:
+            return []
+        shard = self._active(rows=len(messages))
+        return [global_id(shard.ordinal, msg_id) for msg_id in shard.store.log_messages_bulk(messages)]
+
+    def delete_messages(self, message_ids: List[int]) -> int:
+        by_shard: Dict[int, List[int]] = {}
+        for message_id in message_ids:
+            ordinal, local_id = split_id(message_id)
+            by_shard.setdefault(ordinal, []).append(local_id)
+        deleted = 0
+        for ordinal, local_ids in by_shard.items():
+            shard = self._shards.get(ordinal)
+            if shard is not None:
+                deleted += shard.store.delete_messages(local_ids)
+        return deleted
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return all(shard.store.flush(timeout) for shard in self._ordered())
+
+    def close(self):
+        self._retention_stop.set()
+        if self._retention_thread:
+            self._retention_thread.join(timeout=5.0)
+        self._pool.shutdown(wait=True)
+        for shard in self._ordered():
+            shard.store.close()
+
+    @property
+    def duplicates_ignored(self) -> int:
+        return sum(shard.store.duplicates_ignored for shard in self._ordered())
+
+    def reset_token_counts(self, tokenizer_id: Optional[str] = None):
+        for shard in self._ordered():
+            shard.store.reset_token_counts(tokenizer_id)
+
+    # ===========================
+    # Reads
+    # ===========================
+
+    def query_messages(self,
+                       task_id: Optional[str] = None,
+                       sender: Optional[str] = None,
+                       role: Optional[str] = None,
+                       limit: int = 50,
+                       ascending: bool = False,
+                       after_id: Optional[int] = None,
+                       before_ts: Optional[float] = None,
+                       cursor: Optional[str] = None,
+                       fields: Optional[Iterable[str]] = None,
+                       preview_chars: Optional[int] = None,
+                       since_ts: Optional[float] = None,
+                       recipient: Optional[str] = None) -> MessagePage:
+        """
+        MessageStore.query_messages across shards.
+
+        Shards outside the time range are skipped; the rest are queried in
+        parallel (each for at most `limit` rows) and merged by (timestamp, id).
+        """
+        mode = "i" if after_id is not None else ("a" if ascending else "d")
+        key: tuple = (after_id,) if after_id is not None else ()
+        if cursor:
+            mode, key = parse_message_cursor(cursor)
+
+        shards = []
+        for shard in self._ordered():
+            if mode == "i":
+                if shard.ordinal >= split_id(key[0])[0]:
+                    shards.append(shard)
+                continue
+            low, high = self._bounds(shard)
+            if low is None:
+                continue
+            if (since_ts is not None and high < since_ts) or (before_ts is not None and low >= before_ts):
+                continue
+            if key and (low > key[0] if mode == "d" else high < key[0]):
+                continue
+            shards.append(shard)
+
+        def query(shard: _Shard) -> List[Any]:
+            kwargs: Dict[str, Any] = dict(task_id=task_id, sender=sender, role=role, limit=limit,
+                                          fields=fields, preview_chars=preview_chars,
+                                          before_ts=before_ts, since_ts=since_ts, recipient=recipient)
+            if mode == "i":
+                key_ordinal, key_local = split_id(key[0])
+                kwargs["after_id"] = key_local if shard.ordinal == key_ordinal else 0
+            elif key:
+                key_ordinal, key_local = split_id(key[1])
+                kwargs["cursor"] = f"{mode}:{key[0]!r}:{_local_bound(shard.ordinal, key_ordinal, key_local)}"
+            else:
+                kwargs["ascending"] = mode == "a"
+            return [record._replace(id=global_id(shard.ordinal, record.position[1]))
+                    for record in shard.store.query_messages(**kwargs)]
+
+        pages = self._fan_out(shards, query)
+        if mode == "i":
+            merged: Iterable[Any] = itertools.chain.from_iterable(pages)  # shards are in id order
+        else:
+            merged = heapq.merge(*pages, key=lambda r: r.position, reverse=mode == "d")
+        records = list(itertools.islice(merged, limit)) if limit else list(merged)
+
+        next_cursor = None
+        if limit and len(records) == limit:
+            ts, last_id = records[-1].position
+            next_cursor = f"i:{last_id}" if mode == "i" else f"{mode}:{ts!r}:{last_id}"
+        return MessagePage(records, next_cursor)
+
+    def search_text(self,
+                    query: str,
+                    task_id: Optional[str] = None,
+                    limit: int = 20,
+                    cursor: Optional[str] = None,
+                    snippet_chars: int = 160) -> MessagePage:
+        """
+        MessageStore.search_text across all shards, merged by (rank, id).
+
+        Ranks are each shard's own bm25 scores.
+        """
+        after: Optional[Tuple[float, int, int]] = None
+        if cursor:
+            try:
+                rank_part, id_part = cursor.rsplit(":", 1)
+                after = (float(rank_part), *split_id(int(id_part)))
+            except ValueError:
+                raise ValueError(f"Invalid search cursor: {cursor}")
+
+        def search(shard: _Shard) -> MessagePage:
+            shard_cursor = None
+            if after is not None:
+                shard_cursor = f"{after[0]!r}:{_local_bound(shard.ordinal, after[1], after[2])}"
+            page = shard.store.search_text(query, task_id=task_id, limit=limit,
+                                           cursor=shard_cursor, snippet_chars=snippet_chars)
+            for result in page:
+                result['id'] = global_id(shard.ordinal, result['id'])
+            return page
+
+        pages = self._fan_out(self._ordered(), search)
+        merged = list(heapq.merge(*pages, key=lambda r: (r['rank'], r['id'])))
+        results = merged[:limit]
+
+        next_cursor = None
+        if results and (len(merged) > limit or any(page.next_cursor for page in pages)):
+            next_cursor = f"{results[-1]['rank']!r}:{results[-1]['id']}"
+        return MessagePage(results, next_cursor)
+
+    def export_messages(self,
+                        task_id: Optional[str] = None,
+                        sender: Optional[str] = None,
+                        role: Optional[str] = None,
+                        since_ts: Optional[float] = None,
+                        before_ts: Optional[float] = None,
+                        recipient: Optional[str] = None,
+                        fields: Optional[Iterable[str]] = None,
+                        batch_size: int = EXPORT_BATCH) -> Iterator[Dict[str, Any]]:
+        """
+        MessageStore.export_messages across shards, oldest shard first.
+
+        Shards are streamed one after another (not merged), so at most one
+        cursor is open; shards outside the time range are skipped.
+        """
+        for shard in self._ordered():
+            low, high = self._bounds(shard)
+            if low is None:
+                continue
+            if (since_ts is not None and high < since_ts) or (before_ts is not None and low >= before_ts):
+                continue
+            for message in shard.store.export_messages(task_id=task_id, sender=sender, role=role,
+                                                       since_ts=since_ts, before_ts=before_ts,
+                                                       recipient=recipient, fields=fields,
+                                                       batch_size=batch_size):
+                if 'id' in message:
+                    message['id'] = global_id(shard.ordinal, message['id'])
+                yield message
+
+    def get_recent_context(self, task_id: str, max_tokens: int = 8000,
+                           counter: Optional[TokenCounter] = None) -> str:
+        """
+        MessageStore.get_recent_context across shards.
+
+        Shards are read newest first, each with the budget the newer ones
+        left over, since how far back an older shard is read depends on them.
+        """
+        counter = counter or self.store_kwargs.get("token_counter")
+        unit = 1 if counter is not None else CHARS_PER_TOKEN
+        remaining = max_tokens
+        parts = []
+        for shard in self._ordered(newest_first=True):
+            if remaining <= 0:
+                break
+            entry = shard.store._recent_context(task_id, remaining, counter)
+            if entry.lines:
+                parts.append(entry.text)
+                remaining -= -(-entry.used // unit)  # round up
+        return "".join(reversed(parts))
+
+    # ===========================
+    # Retention
+    # ===========================
+
+    def drop_partitions(self, days_keep: float = 30) -> Dict[str, int]:
+        """
+        Delete whole shards whose newest message is older than N days.
+
+        The active shard is never dropped; a shard straddling the cutoff
+        is kept until all of its messages have aged out.
+
+        Returns:
+            Counts of shards and messages dropped.
+        """
+        cutoff = datetime.now().timestamp() - days_keep * 86400
+        stats = {"shards": 0, "deleted": 0}
+        active = self._active().ordinal
+        for shard in self._ordered():
+            if shard.ordinal >= active:
+                continue
+            low, high = self._bounds(shard)
+            if high is not None and high >= cutoff:
+                continue
+            with shard.store.engine.connect() as conn:
+                count = conn.execute(select(func.count(MessageModel.id))).scalar()
+            with self._lock:
+                self._shards.pop(shard.ordinal, None)
+            shard.store.close()
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                path = Path(f"{shard.path}{suffix}")
+                if path.exists():
+                    os.remove(path)
+            stats["shards"] += 1
+            stats["deleted"] += count
+            logger.info(f"Dropped partition {shard.path.name} ({count} messages)")
+        return stats
+
+    def apply_retention(self, days_keep: float = 30, **_) -> Dict[str, int]:
+        """MessageStore.apply_retention equivalent: drops aged-out shards (no per-row deletes)."""
+        stats = self.drop_partitions(days_keep)
+        return {"archived": 0, "deleted": stats["deleted"], "chunks": stats["shards"]}
+
+    def prune_archives(self, days_keep: int = 30) -> int:
+        return self.drop_partitions(days_keep)["deleted"]
+
+    def start_retention(self, days_keep: float = 30, interval: float = 3600.0, **_) -> threading.Thread:
+        """Drop aged-out shards every `interval` seconds in the background until close()."""
+        if self._retention_thread and self._retention_thread.is_alive():
+            return self._retention_thread
+
+        def run():
+            while not self._retention_stop.is_set():
+                try:
+                    self.drop_partitions(days_keep)
+                except Exception as e:
+                    logger.error(f"Partition retention failed: {e}")
+                self._retention_stop.wait(interval)
+
+        self._retention_stop.clear()
+        self._retention_thread = threading.Thread(target=run, name="memory-partition-retention", daemon=True)
+        self._retention_thread.start()
+        return self._retention_thread
+
+    def stats(self) -> Dict[str, Any]:
+        shards = self._ordered()
+        return {
+            "directory": str(self.directory),
+            "partitioning": f"{self.rows_per_shard} rows" if self.rows_per_shard else "monthly",
+            "shards": [shard.path.name for shard in shards],
+            "bytes": sum(shard.path.stat().st_size for shard in shards if shard.path.exists()),
+        }
@@ -7,17 +7,52 @@ Tracks:
 - Registered nodes and their status
 - Active agents, their roles, and status
 - Metrics and resource usage (basic)
+- Monotonic revision + bounded change journal (delta queries)
 
-Version: 1.1.0
+Every mutation that changes a value bumps the revision and appends one
+compact record (only the changed fields) to the journal.
+get_changes_since() coalesces the records after a revision into
+per-entity deltas. It falls back to a full snapshot when the journal
+has wrapped past that revision. Heartbeat-only touches are not journaled;
+last_heartbeat rides along with the next real change.
+
+Reads are lock-free: writers build a new immutable StateSnapshot
+(copy-on-write) and publish it by swapping one reference. Node and
+agent states handed to readers are frozen and cannot be aliased.
+Records are slotted and cache their JSON fragment (orjson when
+installed), so a full snapshot serializes as a concatenation of the
+fragments of unchanged records. Node metric history is kept in a
+fixed-memory MetricsStore (see metrics.py); node states hold only the
+latest values.
+
+Each change is also published on a topic ("system", "node:<id>",
+"agent:<id>") to thread callbacks (subscribe) and to asyncio consumers
+(subscribe_queue), which receive per-topic coalesced batches instead of
+polling.
+
+Version: 1.6.0
 """
 
+import asyncio
+import fnmatch
+import json
+import os
 import threading
 import time
+from collections import deque
 from enum import Enum
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, field, asdict
+from types import MappingProxyType
+from typing import Callable, Deque, Dict, Iterable, List, Mapping, Optional, Any, Tuple
+from dataclasses import dataclass, field, fields, replace
 import logging
 
+from commander_os.core.metrics import MetricsStore
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 class SystemStatus(Enum):
@@ -38,9 +73,68 @@ class ComponentStatus(Enum):
     ERROR = "error"
     OFFLINE = "offline"
 
-@dataclass
-class AgentState:
-    """Runtime state of a single agent."""
+def _freeze(value: Any) -> Any:
+    """Read-only deep copy: dicts become mapping proxies, lists tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """JSON-ready mutable copy of a frozen value."""
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def dumps_json(value: Any) -> bytes:
+    """Compact JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _table_json(table: Mapping[str, "_FrozenState"]) -> bytes:
+    """JSON object of id -> record, from each record's cached fragment."""
+    return b"{" + b",".join(dumps_json(key) + b":" + record.to_json() for key, record in table.items()) + b"}"
+
+
+class _FrozenState:
+    """
+    Immutable state record: container fields are frozen on construction.
+
+    Subclasses are slotted and declare a `_json` cache slot; since a
+    record never changes, its serialized form is computed at most once.
+    """
+
+    __slots__ = ()
+
+    def __post_init__(self):
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if isinstance(value, (Mapping, list, tuple)):
+                object.__setattr__(self, f.name, _freeze(value))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: _thaw(getattr(self, f.name)) for f in fields(self) if f.init}
+
+    def to_json(self) -> bytes:
+        """to_dict() as JSON bytes, encoded once per record."""
+        cached = self._json
+        if cached is None:
+            cached = dumps_json(self.to_dict())
+            object.__setattr__(self, "_json", cached)
+        return cached
+
+@dataclass(frozen=True, slots=True)
+class AgentState(_FrozenState):
+    """Runtime state of a single agent (immutable; updates publish a new copy)."""
     agent_id: str
     node_id: str
     role: str
@@ -48,50 +142,332 @@ class AgentState:
     model_loaded: bool = False
     current_task_id: Optional[str] = None
     last_heartbeat: float = field(default_factory=time.time)
-    metadata: Dict[str, Any] = field(default_factory=dict)
-
-    def to_dict(self) -> Dict[str, Any]:
-        data = asdict(self)
-        data['status'] = self.status.value
-        return data
+    metadata: Mapping[str, Any] = field(default_factory=dict)
+    _json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
 
-@dataclass
-class NodeState:
-    """Runtime state of a compute node."""
+@dataclass(frozen=True, slots=True)
+class NodeState(_FrozenState):
+    """Runtime state of a compute node (immutable; updates publish a new copy)."""
     node_id: str
     hostname: str
     port: int
     status: ComponentStatus = ComponentStatus.UNKNOWN
-    registered_agents: List[str] = field(default_factory=list)
+    registered_agents: Tuple[str, ...] = ()
     last_heartbeat: float = field(default_factory=time.time)
     registration_time: float = field(default_factory=time.time)
-    resources: Dict[str, Any] = field(default_factory=dict)  # cpu, ram, gpu
-    metrics: Dict[str, Any] = field(default_factory=lambda: {"tps": 0.0, "load": 0.0})
+    resources: Mapping[str, Any] = field(default_factory=dict)  # cpu, ram, gpu
+    metrics: Mapping[str, Any] = field(default_factory=lambda: {"tps": 0.0, "load": 0.0})
+    _json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+
+@dataclass(frozen=True, slots=True)
+class StateSnapshot:
+    """
+    One published version of the whole state.
+
+    Writers build a new snapshot and swap the reference; readers take the
+    current reference without locking and see a consistent, immutable view.
+    """
+    revision: int = 0
+    system_status: SystemStatus = SystemStatus.STOPPED
+    start_time: float = 0.0
+    nodes: Mapping[str, NodeState] = field(default_factory=lambda: MappingProxyType({}))
+    agents: Mapping[str, AgentState] = field(default_factory=lambda: MappingProxyType({}))
+    _nodes_json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    _agents_json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+
+    def nodes_json(self) -> bytes:
+        """The nodes table as a JSON object (cached per snapshot)."""
+        if self._nodes_json is None:
+            object.__setattr__(self, "_nodes_json", _table_json(self.nodes))
+        return self._nodes_json
+
+    def agents_json(self) -> bytes:
+        """The agents table as a JSON object (cached per snapshot)."""
+        if self._agents_json is None:
+            object.__setattr__(self, "_agents_json", _table_json(self.agents))
+        return self._agents_json
+
+    def system_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "status": self.system_status.value,
+            "uptime": now - self.start_time if self.start_time else 0.0,
+            "timestamp": now
+        }
+
+    def to_json(self) -> bytes:
+        """Same document as StateManager.get_full_snapshot(), as JSON bytes."""
+        return (b'{"revision":' + str(self.revision).encode() + b',"system":' + dumps_json(self.system_dict())
+                + b',"nodes":' + self.nodes_json() + b',"agents":' + self.agents_json() + b"}")
+
+# A published change: {"revision", "topic", "kind", "id", "changes"}
+StateEvent = Dict[str, Any]
+
+
+def _topic(kind: str, entity_id: Optional[str]) -> str:
+    """'system', 'node:<id>' or 'agent:<id>' for a journal kind ('system', 'nodes', 'agents')."""
+    return "system" if kind == "system" else f"{kind[:-1]}:{entity_id}"
+
+
+def _matches(topic: str, patterns: Optional[Tuple[str, ...]]) -> bool:
+    return patterns is None or any(fnmatch.fnmatchcase(topic, pattern) for pattern in patterns)
+
+
+def coalesce_events(events: Iterable[StateEvent], revision: int) -> Dict[str, Any]:
+    """
+    Merge change events into one delta (latest value per field).
+
+    Returns:
+        {"revision", "full": False, "system", "nodes", "agents"}
+    """
+    delta: Dict[str, Any] = {"revision": revision, "full": False, "system": {}, "nodes": {}, "agents": {}}
+    for event in events:
+        if event["kind"] == "system":
+            delta["system"].update(event["changes"])
+        else:
+            delta[event["kind"]].setdefault(event["id"], {}).update(event["changes"])
+    return delta
+
+
+class StateSubscription:
+    """
+    Asyncio-side state subscriber created by StateManager.subscribe_queue().
+
+    Events are buffered per topic: a slow consumer receives one merged
+    event per changed entity instead of a backlog. If more than `maxsize`
+    topics are pending, the buffer is dropped and the next batch is a
+    single {"topic": "*", "full": True} event (re-read a full snapshot).
+    """
+
+    def __init__(self, manager: "StateManager", topics: Optional[Tuple[str, ...]], maxsize: int,
+                 loop: asyncio.AbstractEventLoop):
+        self._manager = manager
+        self.topics = topics
+        self.maxsize = max(1, maxsize)
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending: Dict[str, StateEvent] = {}
+        self._resync = False
+        self._signalled = False
+        self._wakeup = asyncio.Event()
+        self.delivered = 0
+        self.coalesced = 0
+        self.overflows = 0
+
+    def _offer(self, event: StateEvent) -> None:
+        """Buffer an event (called on the mutating thread)."""
+        with self._lock:
+            pending = self._pending.get(event["topic"])
+            if self._resync:
+                pass  # everything is re-read on resync
+            elif pending is not None:
+                pending["changes"].update(event["changes"])
+                pending["revision"] = event["revision"]
+                self.coalesced += 1
+            elif len(self._pending) >= self.maxsize:
+                self._pending.clear()
+                self._resync = True
+                self.overflows += 1
+            else:
+                self._pending[event["topic"]] = {**event, "changes": dict(event["changes"])}
+            if self._signalled:
+                return
+            self._signalled = True
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # The consumer's loop is gone
+            self._manager.unsubscribe(self._offer)
+
+    async def get(self) -> List[StateEvent]:
+        """Wait for changes; returns the pending events (oldest topic first)."""
+        while True:
+            await self._wakeup.wait()
+            with self._lock:
+                self._wakeup.clear()
+                self._signalled = False
+                if self._resync:
+                    self._resync = False
+                    return [{"revision": self._manager.revision, "topic": "*", "full": True}]
+                events = list(self._pending.values())
+                self._pending.clear()
+            if events:
+                self.delivered += len(events)
+                return events
+
+    def close(self) -> None:
+        self._manager.unsubscribe(self._offer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "delivered": self.delivered,
+                "coalesced": self.coalesced, "overflows": self.overflows}
 
-    def to_dict(self) -> Dict[str, Any]:
-        data = asdict(self)
-        data['status'] = self.status.value
-        return data
 
 class StateManager:
     """
     Central in-memory state store for The-Commander.
-    Thread-safe access to system, node, and agent states.
+
+    Reads are lock-free: every getter reads the current StateSnapshot
+    reference, and the states it returns are immutable. Writers are
+    serialized by a lock, build a new snapshot (copy-on-write) and publish
+    it with one reference assignment.
     """
 
-    def __init__(self):
+    def __init__(self, journal_size: Optional[int] = None):
+        """
+        Args:
+            journal_size: Change records kept for delta queries (default: COMMANDER_STATE_JOURNAL or 4096)
+        """
+        # Serializes writers only; readers never take it
         self._lock = threading.RLock()
+        self._snapshot = StateSnapshot()
+
+        # Change journal: published events, oldest first
+        if journal_size is None:
+            journal_size = int(os.getenv("COMMANDER_STATE_JOURNAL", "4096"))
+        self._changes: Deque[StateEvent] = deque(maxlen=max(1, journal_size))
+
+        # Change subscribers: (topic patterns or None for all, callback)
+        self._subscribers: List[Tuple[Optional[Tuple[str, ...]], Callable[[StateEvent], None]]] = []
+
+        # Per-node metric history (ring buffers, bounded)
+        self.metrics = MetricsStore()
+
+    # ===========================
+    # Snapshots / Change Journal
+    # ===========================
+
+    def get_snapshot(self) -> StateSnapshot:
+        """Current immutable state (consistent across nodes, agents and system)."""
+        return self._snapshot
+
+    @property
+    def revision(self) -> int:
+        """Revision of the latest change (0 before any)."""
+        return self._snapshot.revision
+
+    def _commit(self, kind: str, entity_id: Optional[str], changes: Dict[str, Any], **state) -> None:
+        """
+        Publish a new snapshot, then journal and announce its change (caller holds the lock).
+
+        Args:
+            changes: Changed fields, JSON-ready (empty: publish without a new revision).
+            **state: StateSnapshot fields to replace (nodes/agents as plain dicts).
+        """
+        current = self._snapshot
+        revision = current.revision + 1 if changes else current.revision
+        for table in ("nodes", "agents"):
+            if table in state:
+                state[table] = MappingProxyType(state[table])
+        self._snapshot = replace(current, revision=revision, **state)
+        if not changes:
+            return
+
+        event = {"revision": revision, "topic": _topic(kind, entity_id),
+                 "kind": kind, "id": entity_id, "changes": changes}
+        self._changes.append(event)
+        for patterns, callback in self._subscribers:
+            if _matches(event["topic"], patterns):
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"State subscriber failed: {e}")
+
+    def _update(self, kind: str, entity_id: str, heartbeat: bool = True, **updates) -> None:
+        """
+        Publish a node/agent copy with some fields replaced (caller holds the lock).
+
+        Only values that differ are journaled; last_heartbeat rides along with
+        them. A heartbeat-only update is published without a new revision.
+        """
+        table = self._snapshot.nodes if kind == "nodes" else self._snapshot.agents
+        entity = table.get(entity_id)
+        if entity is None:
+            return
+        changed = {name: value for name, value in updates.items() if getattr(entity, name) != value}
+        if heartbeat:
+            changed_fields = dict(changed, last_heartbeat=time.time())
+        else:
+            changed_fields = changed
+        if not changed_fields:
+            return
+        updated = replace(entity, **changed_fields)
+        changes = {name: _thaw(getattr(updated, name)) for name in changed}
+        if changes:
+            changes['last_heartbeat'] = updated.last_heartbeat
+        self._commit(kind, entity_id, changes, **{kind: {**table, entity_id: updated}})
+
+    def get_changes_since(self, revision: int) -> Dict[str, Any]:
+        """
+        Changes after a revision, coalesced per entity.
         
-        # System-level state
-        self._system_status: SystemStatus = SystemStatus.STOPPED
-        self._start_time: float = 0.0
-        
-        # Component states
-        self._nodes: Dict[str, NodeState] = {}
-        self._agents: Dict[str, AgentState] = {}
+        Args:
+            revision: Revision the caller last saw (a previous result's "revision").
         
-        # Operation locks (optional, for finer granularity if needed later)
-        # For now, safe global lock is sufficient for this scale
+        Returns:
+            {"revision", "full": False, "system", "nodes", "agents"} holding only
+            changed fields (latest value per field), or a full snapshot with
+            "full": True when the journal no longer reaches back to `revision`.
+        """
+        with self._lock:
+            current = self._snapshot.revision
+            oldest = self._changes[0]["revision"] if self._changes else current + 1
+            if revision < 0 or revision > current or (revision < current and revision + 1 < oldest):
+                snapshot = self.get_full_snapshot()
+                snapshot["full"] = True
+                return snapshot
+
+            # Walk back from the newest record: cost scales with the delta, not the journal
+            events = []
+            for event in reversed(self._changes):
+                if event["revision"] <= revision:
+                    break
+                events.append(event)
+        return coalesce_events(reversed(events), current)
+
+    # ===========================
+    # Subscriptions
+    # ===========================
+
+    def subscribe(self, callback: Callable[[StateEvent], None],
+                  topics: Optional[Iterable[str]] = None) -> Callable[[StateEvent], None]:
+        """
+        Call `callback(event)` for every change on a matching topic.
+
+        Callbacks run on the mutating thread while the state lock is held
+        (so they see events in revision order): keep them short, don't
+        block, and treat the event as read-only.
+
+        Args:
+            callback: Receives {"revision", "topic", "kind", "id", "changes"}.
+            topics: fnmatch patterns such as "system", "node:*", "agent:coder-1" (default: all).
+
+        Returns:
+            The callback, for unsubscribe().
+        """
+        patterns = tuple(topics) if topics is not None else None
+        with self._lock:
+            self._subscribers.append((patterns, callback))
+        return callback
+
+    def unsubscribe(self, callback: Callable[[StateEvent], None]) -> None:
+        with self._lock:
+            self._subscribers = [entry for entry in self._subscribers if entry[1] != callback]
+
+    def subscribe_queue(self, topics: Optional[Iterable[str]] = None, maxsize: int = 256) -> StateSubscription:
+        """
+        Subscribe the running event loop; `await subscription.get()` yields batches.
+
+        Args:
+            topics: fnmatch topic patterns (default: all).
+            maxsize: Pending topics buffered before the subscriber is told to resync.
+        """
+        subscription = StateSubscription(self, tuple(topics) if topics is not None else None, maxsize,
+                                         asyncio.get_running_loop())
+        self.subscribe(subscription._offer, subscription.topics)
+        return subscription
         
     # ===========================
     # System State
@@ -100,24 +476,24 @@ class StateManager:
     @property
     def system_status(self) -> SystemStatus:
         """Get current system status."""
-        with self._lock:
-            return self._system_status
+        return self._snapshot.system_status
 
     def set_system_status(self, status: SystemStatus) -> None:
         """Update system status."""
         with self._lock:
-            if self._system_status != status:
-                logger.info(f"System status change: {self._system_status.value} -> {status.value}")
-                self._system_status = status
-                if status == SystemStatus.STARTING:
-                    self._start_time = time.time()
+            current = self._snapshot
+            if current.system_status != status:
+                logger.info(f"System status change: {current.system_status.value} -> {status.value}")
+                start_time = time.time() if status == SystemStatus.STARTING else current.start_time
+                self._commit("system", None, {"status": status.value},
+                             system_status=status, start_time=start_time)
 
     def get_uptime(self) -> float:
         """Get system uptime in seconds."""
-        with self._lock:
-            if self._start_time == 0.0:
-                return 0.0
-            return time.time() - self._start_time
+        start_time = self._snapshot.start_time
+        if start_time == 0.0:
+            return 0.0
+        return time.time() - start_time
 
     # ===========================
     # Node Management
@@ -126,53 +502,46 @@ class StateManager:
     def register_node(self, node_id: str, hostname: str, port: int) -> None:
         """Register or update a node in the state."""
         with self._lock:
-            if node_id not in self._nodes:
-                self._nodes[node_id] = NodeState(
+            nodes = self._snapshot.nodes
+            if node_id not in nodes:
+                node = NodeState(
                     node_id=node_id,
                     hostname=hostname,
                     port=port,
                     status=ComponentStatus.STARTING
                 )
+                self._commit("nodes", node_id, node.to_dict(), nodes={**nodes, node_id: node})
                 logger.info(f"Registered new node: {node_id}")
             else:
                 # Update existing connection info if needed
-                node = self._nodes[node_id]
-                node.hostname = hostname
-                node.port = port
-                node.last_heartbeat = time.time()
+                self._update("nodes", node_id, hostname=hostname, port=port)
 
     def update_node_status(self, node_id: str, status: ComponentStatus) -> None:
         """Update a node's status."""
         with self._lock:
-            if node_id in self._nodes:
-                self._nodes[node_id].status = status
-                self._nodes[node_id].last_heartbeat = time.time()
+            self._update("nodes", node_id, status=status)
 
     def update_node_heartbeat(self, node_id: str) -> None:
         """Update node heartbeat timestamp."""
         with self._lock:
-            if node_id in self._nodes:
-                self._nodes[node_id].last_heartbeat = time.time()
+            self._update("nodes", node_id)
 
     def update_node_metrics(self, node_id: str, metrics: Dict[str, Any]) -> None:
-        """Update a node's live metrics (TPS, load, etc)."""
+        """Update a node's live metrics (TPS, load, etc) and append them to its history."""
         with self._lock:
-            if node_id in self._nodes:
-                self._nodes[node_id].metrics.update(metrics)
-                self._nodes[node_id].last_heartbeat = time.time()
+            node = self._snapshot.nodes.get(node_id)
+            if node is None:
+                return
+            self._update("nodes", node_id, metrics=_freeze({**node.metrics, **metrics}))
+        self.metrics.record(node_id, metrics)
             
     def get_node(self, node_id: str) -> Optional[NodeState]:
-        """Get state copy of a specific node."""
-        with self._lock:
-            if node_id in self._nodes:
-                # Return a copy to prevent external mutation issues
-                return self._nodes[node_id]  # Dataclasses are mutable, callers should be careful or we use deepcopy
-            return None
+        """Get the (immutable) state of a specific node."""
+        return self._snapshot.nodes.get(node_id)
 
     def get_all_nodes(self) -> List[NodeState]:
         """Get list of all nodes."""
-        with self._lock:
-            return list(self._nodes.values())
+        return list(self._snapshot.nodes.values())
 
     # ===========================
     # Agent Management
@@ -181,79 +550,74 @@ class StateManager:
     def register_agent(self, agent_id: str, node_id: str, role: str) -> None:
         """Register or update an agent."""
         with self._lock:
-            if agent_id not in self._agents:
-                self._agents[agent_id] = AgentState(
+            agents = self._snapshot.agents
+            if agent_id not in agents:
+                agent = AgentState(
                     agent_id=agent_id,
                     node_id=node_id,
                     role=role,
                     status=ComponentStatus.STARTING
                 )
+                self._commit("agents", agent_id, agent.to_dict(), agents={**agents, agent_id: agent})
                 logger.info(f"Registered new agent: {agent_id} on {node_id}")
                 
                 # Link to node
-                if node_id in self._nodes:
-                    if agent_id not in self._nodes[node_id].registered_agents:
-                        self._nodes[node_id].registered_agents.append(agent_id)
+                node = self._snapshot.nodes.get(node_id)
+                if node is not None and agent_id not in node.registered_agents:
+                    self._update("nodes", node_id, heartbeat=False,
+                                 registered_agents=node.registered_agents + (agent_id,))
             else:
                 # Update static info
-                agent = self._agents[agent_id]
-                agent.node_id = node_id
-                agent.role = role
-                agent.last_heartbeat = time.time()
+                self._update("agents", agent_id, node_id=node_id, role=role)
 
     def update_agent_status(self, agent_id: str, status: ComponentStatus, task_id: Optional[str] = None) -> None:
         """Update agent status and current task."""
         with self._lock:
-            if agent_id in self._agents:
-                agent = self._agents[agent_id]
-                agent.status = status
-                agent.last_heartbeat = time.time()
-                if task_id is not None:
-                    agent.current_task_id = task_id
+            updates: Dict[str, Any] = {"status": status}
+            if task_id is not None:
+                updates["current_task_id"] = task_id
+            self._update("agents", agent_id, **updates)
 
     def update_agent_role(self, agent_id: str, role: str) -> None:
         """Dynamically change an agent's active role."""
         with self._lock:
-            if agent_id in self._agents:
-                self._agents[agent_id].role = role
+            if agent_id in self._snapshot.agents:
+                self._update("agents", agent_id, heartbeat=False, role=role)
                 logger.info(f"Agent {agent_id} role changed to {role}")
 
     def get_agent(self, agent_id: str) -> Optional[AgentState]:
-        """Get state of a specific agent."""
-        with self._lock:
-            return self._agents.get(agent_id)
+        """Get the (immutable) state of a specific agent."""
+        return self._snapshot.agents.get(agent_id)
 
     def get_all_agents(self) -> List[AgentState]:
         """Get list of all agents."""
-        with self._lock:
-            return list(self._agents.values())
+        return list(self._snapshot.agents.values())
 
     def get_agents_by_role(self, role: str) -> List[AgentState]:
         """Get all agents with a specific role."""
-        with self._lock:
-            return [a for a in self._agents.values() if a.role == role]
+        return [a for a in self._snapshot.agents.values() if a.role == role]
 
     def get_agents_on_node(self, node_id: str) -> List[AgentState]:
         """Get all agents on a specific node."""
-        with self._lock:
-            return [a for a in self._agents.values() if a.node_id == node_id]
+        return [a for a in self._snapshot.agents.values() if a.node_id == node_id]
 
     # ===========================
     # Export/Snapshot
     # ===========================
 
     def get_full_snapshot(self) -> Dict[str, Any]:
-        """Get a complete JSON-serializable snapshot of system state."""
-        with self._lock:
-            return {
-                "system": {
-                    "status": self._system_status.value,
-                    "uptime": self.get_uptime(),
-                    "timestamp": time.time()
-                },
-                "nodes": {nid: n.to_dict() for nid, n in self._nodes.items()},
-                "agents": {aid: a.to_dict() for aid, a in self._agents.items()}
-            }
+        """Get a complete JSON-serializable snapshot of system state (built without locking)."""
+        snapshot = self._snapshot
+        return {
+            "revision": snapshot.revision,
+            "system": snapshot.system_dict(),
+            "nodes": {nid: n.to_dict() for nid, n in snapshot.nodes.items()},
+            "agents": {aid: a.to_dict() for aid, a in snapshot.agents.items()}
+        }
+
+    def get_full_snapshot_json(self) -> bytes:
+        """get_full_snapshot() as JSON bytes, joined from cached per-record fragments."""
+        return self._snapshot.to_json()
 
     def prune_stale_components(self, timeout_seconds: float = 60.0) -> List[str]:
         """
@@ -263,19 +627,20 @@ class StateManager:
         changed = []
         now = time.time()
         with self._lock:
+            snapshot = self._snapshot
             # Check nodes
-            for node_id, node in self._nodes.items():
+            for node_id, node in snapshot.nodes.items():
                 if node.status != ComponentStatus.OFFLINE:
                     if (now - node.last_heartbeat) > timeout_seconds:
-                        node.status = ComponentStatus.OFFLINE
+                        self._update("nodes", node_id, heartbeat=False, status=ComponentStatus.OFFLINE)
                         changed.append(f"node:{node_id}")
                         logger.warning(f"Node {node_id} marked OFFLINE (timeout)")
                         
             # Check agents
-            for agent_id, agent in self._agents.items():
+            for agent_id, agent in snapshot.agents.items():
                 if agent.status != ComponentStatus.OFFLINE:
                     if (now - agent.last_heartbeat) > timeout_seconds:
-                        agent.status = ComponentStatus.OFFLINE
+                        self._update("agents", agent_id, heartbeat=False, status=ComponentStatus.OFFLINE)
                         changed.append(f"agent:{agent_id}")
                         logger.warning(f"Agent {agent_id} marked OFFLINE (timeout)")
         return changed
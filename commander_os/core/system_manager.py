@@ -8,7 +8,7 @@ Coordinating:
 - Node & Agent Managers
 - Relay Server
 
-Version: 1.3.1 (Unified Memory Protocol)
+Version: 1.3.3 (Unified Memory Protocol)
 """
 
 import logging
@@ -22,10 +22,11 @@ from pathlib import Path
 from typing import Dict, Any, Optional
 
 from commander_os.core.config_manager import ConfigManager
-from commander_os.core.state import StateManager, SystemStatus, ComponentStatus
+from commander_os.core.state import StateManager, SystemStatus, ComponentStatus, dumps_json
 from commander_os.core.node_manager import NodeManager
 from commander_os.core.agent_manager import AgentManager
 from commander_os.core.memory import MessageStore
+from commander_os.core.tokens import TokenCounter
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,10 @@ class SystemManager:
         db_path = os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
         self.memory_store = MessageStore(db_path)
         
+        # Per-node token counters (engine tokenizer), created on first use
+        self._token_counters: Dict[str, TokenCounter] = {}
+        self._token_counters_lock = threading.Lock()
+        
         self.relay_process: Optional[subprocess.Popen] = None
         self.engine_process: Optional[subprocess.Popen] = None
         
@@ -189,6 +194,9 @@ class SystemManager:
             # 4. Shutdown Hardware
             self._shutdown_hardware_engine()
             
+            # 5. Flush buffered memory writes
+            self.memory_store.flush(timeout=5.0)
+            
         except Exception as e:
             logger.error(f"Error during shutdown: {e}")
             self.state_manager.set_system_status(SystemStatus.ERROR)
@@ -203,10 +211,19 @@ class SystemManager:
         """
         logger.info(f"Re-igniting hardware engine on {self.local_node_id} with updates: {engine_updates}")
         
+        previous_tokenizer = self._tokenizer_id(self.local_node_id)
+
         # 1. Update Config (and persist to YAML)
         if not self.config_manager.update_node_engine(self.local_node_id, engine_updates):
             return False
             
+        # A new model may tokenize differently: drop the cached counter and its memoized counts
+        if 'model_file' in engine_updates or 'tokenizer' in engine_updates:
+            with self._token_counters_lock:
+                self._token_counters.pop(self.local_node_id, None)
+            if previous_tokenizer is not None:
+                self.memory_store.reset_token_counts(previous_tokenizer)
+            
         # 2. Shutdown existing engine if running
         self._shutdown_hardware_engine()
         
@@ -214,6 +231,36 @@ class SystemManager:
         self._ignite_hardware_engine()
         return True
 
+    def get_token_counter(self, node_id: str) -> TokenCounter:
+        """
+        Token counter for a node's engine: its local tokenizer if configured,
+        otherwise the engine's /tokenize endpoint.
+        """
+        with self._token_counters_lock:
+            counter = self._token_counters.get(node_id)
+            if counter is None:
+                config = self.config_manager.get_node(node_id)
+                if config is None:
+                    raise ValueError(f"Unknown node: {node_id}")
+                tokenizer = config.engine.tokenizer if config.engine and config.engine.tokenizer else None
+                counter = TokenCounter(endpoint=f"http://{config.host}:{config.port}", tokenizer=tokenizer,
+                                       tokenizer_id=self._tokenizer_id(node_id))
+                self._token_counters[node_id] = counter
+            return counter
+
+    def _tokenizer_id(self, node_id: str) -> Optional[str]:
+        """
+        Name under which a node's token counts are persisted: its tokenizer.json,
+        or its endpoint plus model file, so nodes serving different models never share counts.
+        """
+        config = self.config_manager.get_node(node_id)
+        if config is None:
+            return None
+        if config.engine and config.engine.tokenizer:
+            return config.engine.tokenizer
+        model = config.engine.model_file if config.engine else ""
+        return f"http://{config.host}:{config.port}#{model}"
+
     def get_status_report(self) -> Dict[str, Any]:
         """
         Get a comprehensive system health report.
@@ -227,20 +274,7 @@ class SystemManager:
         
         for node_id, config in configured_nodes.items():
             if node_id not in live_nodes:
-                 live_nodes[node_id] = {
-                    "node_id": node_id,
-                    "status": "offline",
-                    "role": "worker",
-                    "metrics": {"tps": 0.0, "load": 0.0},
-                    "name": config.name,
-                    # Add static config data needed for UI
-                    "tps_benchmark": config.tps_benchmark,
-                    "model_file": config.engine.model_file if config.engine else "",
-                    "ctx": config.engine.ctx if config.engine else 0,
-                    "ngl": config.engine.ngl if config.engine else 0,
-                    "fa": config.engine.fa if config.engine else False,
-                    "binary": config.engine.binary if config.engine else ""
-                 }
+                 live_nodes[node_id] = self._offline_node(node_id, config)
             else:
                 # Enrich live node with static config name if missing
                  if 'name' not in live_nodes[node_id]:
@@ -249,6 +283,48 @@ class SystemManager:
         snapshot['nodes'] = live_nodes
         return snapshot
 
+    def get_status_report_json(self) -> bytes:
+        """
+        get_status_report() as JSON bytes.
+        Spliced from the state's cached per-record fragments, so an
+        unchanged node or agent is not re-serialized on every call.
+        """
+        snapshot = self.state_manager.get_snapshot()
+        configured_nodes = self.config_manager.nodes
+
+        nodes = []
+        for node_id, node in snapshot.nodes.items():
+            fragment = node.to_json()
+            config = configured_nodes.get(node_id)
+            if config is not None:
+                # NodeState never carries a name: append it inside the object
+                fragment = fragment[:-1] + b',"name":' + dumps_json(config.name) + b'}'
+            nodes.append(dumps_json(node_id) + b':' + fragment)
+        for node_id, config in configured_nodes.items():
+            if node_id not in snapshot.nodes:
+                nodes.append(dumps_json(node_id) + b':' + dumps_json(self._offline_node(node_id, config)))
+
+        return (b'{"revision":' + str(snapshot.revision).encode() + b',"system":' + dumps_json(snapshot.system_dict())
+                + b',"nodes":{' + b','.join(nodes) + b'},"agents":' + snapshot.agents_json() + b'}')
+
+    @staticmethod
+    def _offline_node(node_id: str, config) -> Dict[str, Any]:
+        """Status entry for a configured node that has not registered (yet)."""
+        return {
+            "node_id": node_id,
+            "status": "offline",
+            "role": "worker",
+            "metrics": {"tps": 0.0, "load": 0.0},
+            "name": config.name,
+            # Add static config data needed for UI
+            "tps_benchmark": config.tps_benchmark,
+            "model_file": config.engine.model_file if config.engine else "",
+            "ctx": config.engine.ctx if config.engine else 0,
+            "ngl": config.engine.ngl if config.engine else 0,
+            "fa": config.engine.fa if config.engine else False,
+            "binary": config.engine.binary if config.engine else ""
+        }
+
     def _start_relay_server(self):
         """Internal: Launch the relay server process."""
         # For now, we simulate starting unless explicitly on HTPC or local
@@ -0,0 +1,188 @@
+"""
+The-Commander: Token Accounting
+Counts tokens with the node engine's tokenizer so prompts can be packed
+against EngineConfig.ctx instead of a characters-per-token guess.
+
+Sources, in order of preference:
+- A local tokenizer (callable, or a tokenizer.json via the optional `tokenizers` package)
+- The engine's llama.cpp `/tokenize` endpoint
+- A conservative character estimate when neither is reachable
+
+Counts persisted by MessageStore are keyed by the counter's tokenizer_id,
+so engines with different tokenizers never share them.
+
+Version: 1.1.0
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence, Union
+
+import requests
+
+try:
+    import tokenizers
+except ImportError:  # optional dependency
+    tokenizers = None
+
+logger = logging.getLogger(__name__)
+
+# Heuristic used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Seconds to stop calling an engine after a failed /tokenize request
+RETRY_AFTER = 30.0
+
+
+def estimate_tokens(text: str, chars_per_token: float = CHARS_PER_TOKEN) -> int:
+    """Character-based token estimate (rounded up)."""
+    return math.ceil(len(text) / chars_per_token) if text else 0
+
+
+def _load_tokenizer(path: str) -> Callable[[str], Sequence[int]]:
+    if tokenizers is None:
+        raise RuntimeError(f"Local tokenizer {path} requires the 'tokenizers' package")
+    tokenizer = tokenizers.Tokenizer.from_file(path)
+    return lambda text: tokenizer.encode(text, add_special_tokens=False).ids
+
+
+class TokenCounter:
+    """
+    Token counting service for one engine.
+
+    Counts are memoized in a bounded LRU keyed by text hash; MessageStore
+    additionally persists per-message counts in message_token_counts,
+    under this counter's tokenizer_id.
+    """
+
+    def __init__(self,
+                 endpoint: Optional[str] = None,
+                 tokenizer: Union[str, Callable[[str], Sequence[int]], None] = None,
+                 timeout: float = 5.0,
+                 cache_size: int = 4096,
+                 fallback_chars_per_token: float = 3.0,
+                 tokenizer_id: Optional[str] = None):
+        """
+        Initialize the counter.
+
+        Args:
+            endpoint: Engine base URL (e.g. http://10.0.0.42:8080); /tokenize is appended
+            tokenizer: Local tokenizer callable or tokenizer.json path (preferred over endpoint)
+            timeout: Seconds per /tokenize request
+            cache_size: Memoized counts kept in memory
+            fallback_chars_per_token: Estimate ratio when no tokenizer answers
+                (below the usual ~4 so estimates err on the long side)
+            tokenizer_id: Stable name of the tokenizer, under which MessageStore
+                persists counts (default: the tokenizer.json path, else the
+                endpoint; None for an unnamed callable, whose counts are not persisted)
+        """
+        self.endpoint = endpoint.rstrip("/") if endpoint else None
+        self._tokenize_local = _load_tokenizer(tokenizer) if isinstance(tokenizer, str) else tokenizer
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.fallback_chars_per_token = fallback_chars_per_token
+        if tokenizer_id is None:
+            tokenizer_id = tokenizer if isinstance(tokenizer, str) else (None if tokenizer else self.endpoint)
+        self.tokenizer_id = tokenizer_id
+
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._endpoint_down_until = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.estimated = 0
+
+    @property
+    def source(self) -> str:
+        if self._tokenize_local is not None:
+            return "local"
+        return "remote" if self.endpoint else "estimate"
+
+    @property
+    def exact(self) -> bool:
+        """True if counts come from a real tokenizer (not the fallback estimate)."""
+        return self.source != "estimate"
+
+    def count(self, text: str, key: Optional[str] = None) -> int:
+        """
+        Number of tokens in `text` (an estimate if no tokenizer answers).
+
+        Args:
+            text: Text to count
+            key: Memo key (e.g. a message content_hash); defaults to a hash of the text
+        """
+        tokens = self.count_exact(text, key)
+        if tokens is None:
+            with self._lock:
+                self.estimated += 1
+            return estimate_tokens(text, self.fallback_chars_per_token)
+        return tokens
+
+    def count_exact(self, text: str, key: Optional[str] = None) -> Optional[int]:
+        """Like count(), but None instead of an estimate; only exact counts are memoized."""
+        if not text:
+            return 0
+        key = key or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        tokens = self._tokenize(text)
+        if tokens is None:
+            return None
+        with self._lock:
+            self._cache[key] = tokens
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def _tokenize(self, text: str) -> Optional[int]:
+        """Exact count from the local tokenizer or the engine (None if unavailable)."""
+        if self._tokenize_local is not None:
+            return len(self._tokenize_local(text))
+        if not self.endpoint:
+            return None
+
+        now = time.monotonic()
+        if now < self._endpoint_down_until:
+            return None
+        try:
+            response = self._session.post(f"{self.endpoint}/tokenize", json={"content": text}, timeout=self.timeout)
+            response.raise_for_status()
+            return len(response.json()["tokens"])
+        except Exception as e:
+            logger.warning(f"Tokenize via {self.endpoint} failed, estimating for {RETRY_AFTER:.0f}s: {e}")
+            self._endpoint_down_until = now + RETRY_AFTER
+            return None
+
+    def fit_tail(self, text: str, max_tokens: int) -> str:
+        """Tail of `text` trimmed until it fits in `max_tokens`."""
+        if max_tokens <= 0:
+            return ""
+        tokens = self.count(text)
+        while tokens > max_tokens and text:
+            # Shrink proportionally (with a margin) until it fits
+            keep = int(len(text) * max_tokens / tokens * 0.9)
+            text = text[-keep:] if keep > 0 else ""
+            tokens = self.count(text)
+        return text
+
+    def stats(self) -> Dict[str, Union[int, str]]:
+        with self._lock:
+            return {
+                "source": self.source,
+                "cached": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "estimated": self.estimated
+            }
@@ -3,10 +3,18 @@ The-Commander: REST API Interface
 FastAPI implementation exposing control over System, Nodes, Agents, and Memory.
 
 Runs as the primary interface for external interaction (Web GUI, CLI tools).
-
-Version: 1.1.0
+Memory access goes through AsyncMessageStore so DB work never blocks the event loop.
+/memory/export streams NDJSON for bulk history exports.
+State is pushed as deltas against the StateManager revision (state_delta),
+driven by a StateManager subscription rather than a polling loop.
+Full status reports are spliced from cached JSON fragments and each
+broadcast frame is serialized once for all links.
+/nodes/{id}/metrics serves downsampled node metric history.
+
+Version: 1.7.0
 """
 
+import json
 import logging
 import os
 import requests
@@ -16,10 +24,15 @@ import asyncio
 
 from fastapi import FastAPI, HTTPException, Body, Query, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+from commander_os.core.async_memory import AsyncMessageStore
+from commander_os.core.memory import MESSAGE_FIELDS, ndjson_chunks
+from commander_os.core.metrics import AUTO, RESOLUTIONS
 from commander_os.core.system_manager import SystemManager
-from commander_os.core.state import SystemStatus, ComponentStatus
+from commander_os.core.state import SystemStatus, ComponentStatus, coalesce_events
+from commander_os.core.config_manager import EngineConfig
 
 # Configure Logging
 logger = logging.getLogger("commander_api")
@@ -27,6 +40,21 @@ logger = logging.getLogger("commander_api")
 # Global System Manager Instance
 system: Optional[SystemManager] = None
 
+# Async facade over system.memory_store (rebuilt if the store is replaced)
+_memory: Optional[AsyncMessageStore] = None
+
+def get_memory() -> Optional[AsyncMessageStore]:
+    """Awaitable view of the system's MessageStore (None if it has none)."""
+    global _memory
+    store = getattr(system, 'memory_store', None)
+    if store is None:
+        return None
+    if _memory is None or _memory.store is not store:
+        if _memory is not None:
+            _memory.close()
+        _memory = AsyncMessageStore(store, max_concurrency=int(os.getenv("COMMANDER_API_DB_CONCURRENCY", "4")))
+    return _memory
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -62,6 +90,8 @@ async def lifespan(app: FastAPI):
         pass
     if system and system.state_manager.system_status != SystemStatus.STOPPED:
         system.stop_system()
+    if _memory is not None:
+        _memory.close()
 
 # Initialize FastAPI
 app = FastAPI(
@@ -97,77 +127,138 @@ async def get_version():
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # New links wait here for their first full state before receiving deltas
+        self.joining: List[WebSocket] = []
+        # Set when a link joins, so the broadcaster can sleep while nobody is watching
+        self.link_joined = asyncio.Event()
 
     async def contract(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"New Strategic GUI tactical link established. Total: {len(self.active_connections)}")
+        self.joining.append(websocket)
+        self.link_joined.set()
+        logger.info(f"New Strategic GUI tactical link established. Total: {len(self.active_connections) + len(self.joining)}")
 
     def sever(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            logger.info(f"Tactical link severed. Active remaining: {len(self.active_connections)}")
-
-    async def broadcast(self, message: Dict[str, Any]):
-        """Broadcast intelligence packet to all active command consoles."""
-        for connection in self.active_connections:
+        for links in (self.active_connections, self.joining):
+            if websocket in links:
+                links.remove(websocket)
+                logger.info(f"Tactical link severed. Active remaining: {len(self.active_connections)}")
+
+    def admit(self) -> List[WebSocket]:
+        """Move joining links to the broadcast list; returns the links just admitted."""
+        joined, self.joining = self.joining, []
+        self.active_connections.extend(joined)
+        return joined
+
+    async def broadcast(self, message: Dict[str, Any], connections: Optional[List[WebSocket]] = None):
+        """Broadcast intelligence packet to all active command consoles (or the given ones)."""
+        await self.broadcast_text(json.dumps(message, separators=(",", ":")), connections)
+
+    async def broadcast_text(self, frame: str, connections: Optional[List[WebSocket]] = None):
+        """Send an already-serialized frame, encoded once, to every link."""
+        for connection in list(self.active_connections if connections is None else connections):
             try:
-                await connection.send_json(message)
+                await connection.send_text(frame)
             except Exception as e:
                 logger.error(f"Failed to broadcast to tactical link: {e}")
 
 manager = ConnectionManager()
 
+# Seconds between new-message polls while links are open (state changes are pushed)
+MEMORY_POLL_INTERVAL = float(os.getenv("COMMANDER_BROADCAST_POLL", "0.5"))
+
+def state_changes(since: int) -> Dict[str, Any]:
+    """
+    State deltas after a revision, or the full status report (with "full": True)
+    when the state journal no longer reaches back that far.
+    """
+    changes = system.state_manager.get_changes_since(since)
+    if changes["full"]:
+        return {**system.get_status_report(), "full": True}
+    return changes
+
+def state_update_frame(full: bool = False) -> str:
+    """state_update frame around the pre-serialized status report."""
+    report = system.get_status_report_json()
+    if full:
+        report = report[:-1] + b',"full":true}'
+    return (b'{"type":"state_update","data":' + report + b'}').decode("utf-8")
+
 async def tactical_broadcaster():
     """
     Background task to push real-time updates to focused command consoles.
-    Monitors state changes and new memory entries.
+    State changes arrive from a StateManager subscription and are pushed as
+    soon as they happen: a full state to each new link, then coalesced
+    deltas. New memory entries are polled only while links are open.
     """
     last_msg_id = 0
     logger.info("Tactical Broadcaster online.")
+    subscription = system.state_manager.subscribe_queue() if system else None
+    # Outstanding subscription.get(), kept across polls so a drained batch is never cancelled away
+    state_wait: Optional[asyncio.Future] = None
     
     # Initialize last_msg_id to current max to avoid flood on restart
-    if system and hasattr(system, 'memory_store'):
+    memory = get_memory()
+    if memory:
         try:
-            recent = system.memory_store.query_messages(limit=1)
+            recent = await memory.query_messages(limit=1, fields=['id'])
             if recent:
                 last_msg_id = recent[0]['id']
         except Exception as e:
             logger.warning(f"Tactical Broadcaster failed initial memory check: {e}")
 
-    while True:
-        try:
-            if not manager.active_connections:
-                await asyncio.sleep(2)  # Low power mode when no one is watching
-                continue
-
-            # 1. Broadast Full System State
-            if system:
-                snapshot = system.get_status_report()
-                await manager.broadcast({
-                    "type": "state_update",
-                    "data": snapshot
-                })
-
-            # 2. Broadcast New Memory entries
-            if system and hasattr(system, 'memory_store'):
-                recent = system.memory_store.query_messages(limit=10)
-                new_msgs = [m for m in recent if m['id'] > last_msg_id]
-                if new_msgs:
-                    # Sort chronological for the client
-                    new_msgs.sort(key=lambda x: x['id'])
-                    await manager.broadcast({
-                        "type": "new_messages",
-                        "data": new_msgs
-                    })
-                    last_msg_id = new_msgs[-1]['id']
-
-            await asyncio.sleep(0.5)  # Tactical refresh rate (500ms)
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            logger.error(f"Tactical Broadcaster encountered resistance: {e}")
-            await asyncio.sleep(5)
+    try:
+        while True:
+            try:
+                if not manager.active_connections and not manager.joining:
+                    # Idle until someone connects; state events keep coalescing meanwhile
+                    manager.link_joined.clear()
+                    await manager.link_joined.wait()
+
+                # 1. Push System State changes (wait at most one memory poll interval)
+                events = []
+                if subscription and not manager.joining:
+                    if state_wait is None:
+                        state_wait = asyncio.ensure_future(subscription.get())
+                    done, _ = await asyncio.wait({state_wait}, timeout=MEMORY_POLL_INTERVAL)
+                    if done:
+                        events, state_wait = state_wait.result(), None
+                elif not subscription:
+                    await asyncio.sleep(MEMORY_POLL_INTERVAL)
+
+                if system and events and manager.active_connections:
+                    if events[0].get("full"):
+                        await manager.broadcast_text(state_update_frame(full=True))
+                    else:
+                        delta = coalesce_events(events, max(event["revision"] for event in events))
+                        await manager.broadcast({"type": "state_delta", "data": delta})
+
+                # New links start from a full report taken after the events above, so later deltas apply on top
+                joined = manager.admit()
+                if joined and system:
+                    await manager.broadcast_text(state_update_frame(), joined)
+
+                # 2. Broadcast New Memory entries
+                memory = get_memory()
+                if memory:
+                    # Only rows newer than the last broadcast, already chronological
+                    new_msgs = await memory.query_messages(after_id=last_msg_id, limit=50)
+                    if new_msgs:
+                        await manager.broadcast({
+                            "type": "new_messages",
+                            "data": list(new_msgs)
+                        })
+                        last_msg_id = new_msgs[-1]['id']
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Tactical Broadcaster encountered resistance: {e}")
+                await asyncio.sleep(5)
+    finally:
+        if state_wait is not None:
+            state_wait.cancel()
+        if subscription:
+            subscription.close()
 
 # -------------------------------------------------------------------------
 # Data Models (Pydantic)
@@ -194,6 +285,7 @@ class EngineUpdate(BaseModel):
     fa: Optional[bool] = None
     model_file: Optional[str] = None
     binary: Optional[str] = None
+    tokenizer: Optional[str] = None
 
 # -------------------------------------------------------------------------
 # System Endpoints
@@ -202,6 +294,11 @@ class EngineUpdate(BaseModel):
 class CommandRequest(BaseModel):
     text: str
 
+# Completion tokens requested per command (capped at half the engine's context)
+COMMAND_MAX_PREDICT = 512
+# Tokens held back for BOS/special tokens the engine adds around the prompt
+PROMPT_MARGIN = 4
+
 @app.post("/command", response_model=ActionResponse)
 async def submit_command(cmd: CommandRequest):
     """
@@ -211,16 +308,6 @@ async def submit_command(cmd: CommandRequest):
     if not system:
         raise HTTPException(status_code=503, detail="System not initialized")
     
-    # Log the user message
-    if hasattr(system, 'memory_store'):
-        system.memory_store.log_message(
-            task_id="chat", 
-            sender="THE_COMMANDER",
-            recipient="system",
-            role="user", 
-            content=cmd.text
-        )
-    
     # Find highest-ranking active node (highest tps_benchmark)
     active_nodes = []
     for node_id, config in system.config_manager.nodes.items():
@@ -232,11 +319,28 @@ async def submit_command(cmd: CommandRequest):
                 'tps_benchmark': config.tps_benchmark
             })
     
+    # Sort by tps_benchmark descending (highest first)
+    active_nodes.sort(key=lambda x: x['tps_benchmark'], reverse=True)
+    
+    # Pack history before logging the command so it isn't included twice
+    memory = get_memory()
+    if active_nodes:
+        prompt, n_predict = await _pack_prompt(active_nodes[0], cmd.text)
+    
+    # Log the user message
+    if memory:
+        await memory.log_message(
+            task_id="chat", 
+            sender="THE_COMMANDER",
+            recipient="system",
+            role="user", 
+            content=cmd.text,
+            wait=False
+        )
+    
     if not active_nodes:
         return {"success": False, "message": "No active nodes available"}
     
-    # Sort by tps_benchmark descending (highest first)
-    active_nodes.sort(key=lambda x: x['tps_benchmark'], reverse=True)
     target_node = active_nodes[0]
     
     logger.info(f"Routing command to highest-ranking node: {target_node['node_id']} (TPS: {target_node['tps_benchmark']})")
@@ -245,28 +349,29 @@ async def submit_command(cmd: CommandRequest):
     try:
         node_url = f"http://{target_node['config'].host}:{target_node['config'].port}/completion"
         payload = {
-            "prompt": cmd.text,
-            "n_predict": 512,
+            "prompt": prompt,
+            "n_predict": n_predict,
             "temperature": 0.7,
             "stop": ["User:", "Commander:"],
             "stream": False
         }
         
         logger.info(f"Sending inference request to {node_url}")
-        response = requests.post(node_url, json=payload, timeout=30)
+        response = await asyncio.to_thread(requests.post, node_url, json=payload, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
             response_text = result.get('content', '').strip()
             
             # Log the assistant response
-            if hasattr(system, 'memory_store'):
-                system.memory_store.log_message(
+            if memory:
+                await memory.log_message(
                     task_id="chat",
                     sender=target_node['node_id'],
                     recipient="THE_COMMANDER",
                     role="assistant",
-                    content=response_text
+                    content=response_text,
+                    wait=False
                 )
             
             return {"success": True, "message": f"Response from {target_node['node_id']}", "response": response_text}
@@ -284,6 +389,32 @@ async def submit_command(cmd: CommandRequest):
         logger.error(error_msg)
         return {"success": False, "message": error_msg}
 
+async def _pack_prompt(target_node: Dict[str, Any], text: str):
+    """
+    Build the completion prompt for a node: as much recent chat history as
+    fits ahead of the command, counted with the node's own tokenizer.
+    
+    Returns:
+        (prompt, n_predict) with prompt tokens + n_predict <= the engine's ctx
+    """
+    engine = target_node['config'].engine
+    ctx = engine.ctx if engine else EngineConfig.ctx
+    n_predict = min(COMMAND_MAX_PREDICT, ctx // 2)
+    budget = ctx - n_predict - PROMPT_MARGIN
+    
+    counter = system.get_token_counter(target_node['node_id'])
+    # Counting may call the engine's /tokenize endpoint
+    command_tokens = await asyncio.to_thread(counter.count, text)
+    if command_tokens >= budget:
+        logger.warning(f"Command of {command_tokens} tokens exceeds {target_node['node_id']} budget; keeping its tail")
+        return await asyncio.to_thread(counter.fit_tail, text, budget), n_predict
+    
+    history = ""
+    memory = get_memory()
+    if memory:
+        history = await memory.get_recent_context("chat", max_tokens=budget - command_tokens, counter=counter)
+    return history + text, n_predict
+
 @app.post("/system/start", response_model=ActionResponse)
 async def start_system():
     """Start the entire Commander system."""
@@ -306,11 +437,17 @@ async def stop_system():
     return {"success": True, "message": "System stopped"}
 
 @app.get("/system/status")
-async def get_system_status():
-    """Get comprehensive system status report."""
+async def get_system_status(since: Optional[int] = Query(None, ge=0)):
+    """
+    Get comprehensive system status report.
+    With `since` (a previous response's "revision"), returns only the state
+    deltas after it, or the full report with "full": true if that is too old.
+    """
     if not system:
         raise HTTPException(status_code=503, detail="System not initialized")
-    return system.get_status_report()
+    if since is not None:
+        return state_changes(since)
+    return Response(content=system.get_status_report_json(), media_type="application/json")
 
 # -------------------------------------------------------------------------
 # Node Endpoints
@@ -371,6 +508,32 @@ async def get_node_status(node_id: str):
         raise HTTPException(status_code=404, detail="Node not found")
     return status
 
+@app.get("/nodes/{node_id}/metrics")
+async def get_node_metrics(
+    node_id: str,
+    window: float = Query(600.0, gt=0),
+    resolution: str = AUTO,
+    metrics: Optional[str] = None
+):
+    """
+    Metric history of a node over the last `window` seconds.
+    `resolution` is raw, 10s, 1m, 10m or auto (picked from the window);
+    rollup points carry min/max/avg/count per bucket. `metrics` is a
+    comma-separated subset (default: all tracked).
+    """
+    if not system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    if system.state_manager.get_node(node_id) is None and node_id not in system.config_manager.nodes:
+        raise HTTPException(status_code=404, detail="Node not found")
+    if resolution != AUTO and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown resolution: {resolution} (expected {', '.join(RESOLUTIONS)} or {AUTO})")
+
+    history = system.state_manager.metrics.query(
+        node_id, window, resolution, names=metrics.split(",") if metrics else None
+    )
+    return {"node_id": node_id, **history}
+
 @app.post("/nodes/{node_id}/start", response_model=ActionResponse)
 async def start_node(node_id: str):
     """Start a specific node."""
@@ -546,12 +709,35 @@ async def search_memory(
     task_id: Optional[str] = None,
     sender: Optional[str] = None,
     role: Optional[str] = None,
-    limit: int = 50
+    recipient: Optional[str] = None,
+    limit: int = 50,
+    q: Optional[str] = None,
+    cursor: Optional[str] = None,
+    after_id: Optional[int] = None,
+    before_ts: Optional[float] = None,
+    fields: Optional[str] = None,
+    preview_chars: Optional[int] = Query(None, ge=0)
 ):
-    """Search for messages in the memory store."""
+    """
+    Search for messages in the memory store.
+    With `q`, runs a ranked full-text search and returns snippets.
+    `after_id` polls for new rows, `before_ts` pages back through history.
+    `recipient` lists one agent's inbox (indexed, no JSON scan).
+    `fields` (comma-separated) and `preview_chars` trim what is decoded and returned.
+    The next page's cursor is sent in the X-Next-Cursor header.
+    """
     if not system:
         raise HTTPException(status_code=503, detail="System not initialized")
     
+    memory = get_memory()
+    if q is not None and memory:
+        try:
+            page = await memory.search_text(q, task_id=task_id, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"X-Next-Cursor": page.next_cursor} if page.next_cursor else {}
+        return JSONResponse(content=list(page), headers=headers)
+    
     # We haven't exposed Query directly in SystemManager, let's fix that or access directly
     # Accessing directly via property is cleaner than adding wrapper for every function
     # Assuming SystemManager exposes a way to get memory component or we add it to SystemManaager
@@ -565,12 +751,56 @@ async def search_memory(
     # Let's assume we will update SystemManager next.
     
     # Check if system has memory attribute (dynamic check)
-    if hasattr(system, 'memory_store'):
-         return system.memory_store.query_messages(task_id, sender, role, limit)
+    if memory:
+        try:
+            page = await memory.query_messages(
+                task_id, sender, role, limit,
+                after_id=after_id, before_ts=before_ts, cursor=cursor,
+                fields=fields.split(",") if fields else None,
+                preview_chars=preview_chars,
+                recipient=recipient
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        next_cursor = getattr(page, "next_cursor", None)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return JSONResponse(content=list(page), headers=headers)
     else:
         # Fallback if SystemManager update is pending
         raise HTTPException(status_code=501, detail="Memory subsystem not yet attached to SystemManager")
 
+@app.get("/memory/export")
+async def export_memory(
+    task_id: Optional[str] = None,
+    sender: Optional[str] = None,
+    role: Optional[str] = None,
+    recipient: Optional[str] = None,
+    since_ts: Optional[float] = None,
+    before_ts: Optional[float] = None,
+    fields: Optional[str] = None
+):
+    """
+    Stream matching messages as NDJSON (application/x-ndjson), oldest first.
+    Unlike /memory/search with a huge limit, rows are fetched, decoded and
+    sent in batches, so memory stays flat for any export size.
+    """
+    if not system:
+        raise HTTPException(status_code=503, detail="System not initialized")
+    store = getattr(system, 'memory_store', None)
+    if store is None:
+        raise HTTPException(status_code=501, detail="Memory subsystem not yet attached to SystemManager")
+
+    field_list = fields.split(",") if fields else None
+    unknown = [f for f in field_list or () if f not in MESSAGE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown message fields: {', '.join(unknown)}")
+    # Starlette iterates a sync generator on its threadpool, off the event loop
+    messages = store.export_messages(
+        task_id=task_id, sender=sender, role=role, recipient=recipient,
+        since_ts=since_ts, before_ts=before_ts, fields=field_list
+    )
+    return StreamingResponse(ndjson_chunks(messages), media_type="application/x-ndjson")
+
 # -------------------------------------------------------------------------
 # Strategic WebSocket Endpoint
 # -------------------------------------------------------------------------
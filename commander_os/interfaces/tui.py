@@ -3,17 +3,18 @@ The-Commander: TUI Dashboard
 Real-time terminal interface for monitoring the Gillsystems Cluster.
 
 Features:
-- Live node heartbeats and performance metrics
+- Live node heartbeats and performance metrics (TPS/load sparklines from metric history)
 - Agent process tracking
 - Real-time message/event log
+- Node/agent tables redrawn on StateManager change events (no table polling)
 
-Version: 1.0.0
+Version: 1.3.1
 """
 
-import time
 import os
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 from rich.console import Console
 from rich.layout import Layout
@@ -27,6 +28,21 @@ from commander_os.core.system_manager import SystemManager
 from commander_os.core.state import SystemStatus, ComponentStatus
 from commander_os.core.memory import MessageStore
 
+# Sparkline span and bucket size for the nodes table
+SPARK_WINDOW = 300.0
+SPARK_RESOLUTION = "10s"
+SPARK_BARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: List[float], width: int = 30) -> str:
+    """Last `width` values as block characters scaled to their own range."""
+    values = list(values)[-width:]
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+    return "".join(SPARK_BARS[int((v - low) / span * (len(SPARK_BARS) - 1))] for v in values)
+
 class CommanderTUI:
     """
     Rich-based Dashboard for The-Commander OS.
@@ -39,6 +55,9 @@ class CommanderTUI:
         
         # Initialize Memory Access if available
         self.store = None
+        # Rolling window of recent messages, extended by since-id polling
+        self._recent_msgs: List[Dict[str, Any]] = []
+        self._last_msg_id: Optional[int] = None
         db_path = os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
         try:
             self.store = MessageStore(db_path)
@@ -88,6 +107,8 @@ class CommanderTUI:
         table.add_column("Address", style="white")
         table.add_column("Benchmark", justify="right", style="magenta")
         table.add_column("Status", justify="center")
+        table.add_column("TPS", style="green", no_wrap=True)
+        table.add_column("Load", style="yellow", no_wrap=True)
         
         # Get data from config and state
         nodes_config = self.sm.config_manager.nodes
@@ -103,15 +124,25 @@ class CommanderTUI:
                 elif state.status == ComponentStatus.STARTING:
                     style = "yellow"
             
+            history = self._metric_history(node_id)
             table.add_row(
                 node_id,
                 f"{cfg.host}:{cfg.port}",
                 f"{cfg.tps_benchmark} t/s",
-                Text(status_str, style=style)
+                Text(status_str, style=style),
+                sparkline(history.get("tps", [])),
+                sparkline(history.get("load", []))
             )
             
         return Panel(table, title="[bold white]Cluster Nodes[/bold white]", border_style="blue")
 
+    def _metric_history(self, node_id: str) -> Dict[str, List[float]]:
+        """Bucket averages of a node's tps/load over the sparkline window."""
+        history = self.sm.state_manager.metrics.query(
+            node_id, SPARK_WINDOW, SPARK_RESOLUTION, names=("tps", "load")
+        )
+        return {name: [point["avg"] for point in points] for name, points in history["series"].items()}
+
     def generate_agents_table(self) -> Panel:
         """Create the agents tracking table."""
         table = Table(expand=True, box=box.SIMPLE)
@@ -147,7 +178,7 @@ class CommanderTUI:
             return Panel(Text("MessageStore Offline", style="dim red"), title="Recent Events")
             
         try:
-            msgs = self.store.query_messages(limit=20)
+            msgs = self._poll_recent_messages()
             table = Table.grid(expand=True)
             table.add_column(ratio=1)
             
@@ -166,6 +197,26 @@ class CommanderTUI:
         except Exception as e:
             return Panel(Text(f"Error: {e}", style="red"), title="Recent Events")
 
+    def _poll_recent_messages(self, window: int = 20) -> List[Dict[str, Any]]:
+        """Fetch only rows newer than the last refresh; newest first."""
+        # Only what the panel shows; content decoded just past the 100-char cut
+        projection = {
+            "fields": ("id", "timestamp", "sender", "role", "content"),
+            "preview_chars": 101
+        }
+        if self._last_msg_id is None:
+            self._recent_msgs = list(self.store.query_messages(limit=window, **projection))
+        else:
+            new_msgs = self.store.query_messages(after_id=self._last_msg_id, limit=window, **projection)
+            if new_msgs.next_cursor is not None:
+                # A full page is the oldest of the new rows: the newest window replaces the panel
+                self._recent_msgs = list(self.store.query_messages(limit=window, **projection))
+            else:
+                self._recent_msgs = (list(reversed(new_msgs)) + self._recent_msgs)[:window]
+        if self._recent_msgs:
+            self._last_msg_id = max(m['id'] for m in self._recent_msgs)
+        return self._recent_msgs
+
     def generate_footer(self) -> Panel:
         """Create the footer with instructions."""
         return Panel(
@@ -177,19 +228,31 @@ class CommanderTUI:
         """Run the live dashboard."""
         self.make_layout()
         
-        with Live(self.layout, refresh_per_second=refresh_rate, screen=True):
-            while True:
-                # Update Layout
-                self.layout["header"].update(self.generate_header())
-                self.layout["nodes"].update(self.generate_nodes_table())
-                self.layout["agents"].update(self.generate_agents_table())
-                self.layout["logs"].update(self.generate_logs_panel())
-                self.layout["footer"].update(self.generate_footer())
-                
-                time.sleep(1.0 / refresh_rate)
-                # Note: Input handling would go here, 
-                # but Rich Live is non-blocking for output. 
-                # Real interactivity usually requires 'textual' or manual input threads.
+        # Woken by state changes instead of polling the node/agent tables
+        state_changed = threading.Event()
+        callback = self.sm.state_manager.subscribe(lambda event: state_changed.set(), topics=("node:*", "agent:*"))
+        state_changed.set()
+        
+        try:
+            with Live(self.layout, auto_refresh=False, screen=True) as live:
+                while True:
+                    # Update Layout
+                    self.layout["header"].update(self.generate_header())
+                    if state_changed.is_set():
+                        state_changed.clear()
+                        self.layout["nodes"].update(self.generate_nodes_table())
+                        self.layout["agents"].update(self.generate_agents_table())
+                    self.layout["logs"].update(self.generate_logs_panel())
+                    self.layout["footer"].update(self.generate_footer())
+                    live.refresh()
+                    
+                    # Redraw at once on a state change, else at the clock/log refresh rate
+                    state_changed.wait(1.0 / refresh_rate)
+                    # Note: Input handling would go here, 
+                    # but Rich Live is non-blocking for output. 
+                    # Real interactivity usually requires 'textual' or manual input threads.
+        finally:
+            self.sm.state_manager.unsubscribe(callback)
 
 if __name__ == "__main__":
     # Smoke test initialization
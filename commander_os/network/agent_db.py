@@ -0,0 +1,278 @@
+"""
+The-Commander: Relay Agent Database Pool
+Long-lived per-agent SQLite engines for the relay's storage endpoints.
+
+Each agent database gets one SQLiteEngine (single writer thread with
+group commit + read-only pool), kept in a bounded LRU so the relay does
+not reconnect and re-issue PRAGMAs on every request. Tables already
+known to exist are cached so writes skip the sqlite_master lookup.
+
+Exports stream from their own read-only connection (fetchmany batches),
+so a long export never holds one of the engine's pooled readers.
+
+Opening an engine blocks (connect, PRAGMAs, table scan): it runs outside
+the pool lock, and async callers go through a thread. Evicted engines are drained and closed on a
+background thread, never on the caller's.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+from commander_os.storage.sqlite_engine import SQLiteEngine, open_connection
+
+logger = logging.getLogger(__name__)
+
+
+class AgentDBPool:
+    """
+    Bounded LRU of per-agent SQLite engines.
+
+    Writes for one agent are serialized through that agent's writer
+    thread, so pending immediate writes are merged into a single
+    transaction by the engine's commit window.
+    """
+
+    def __init__(
+        self,
+        storage_dir: Path,
+        max_open: int = 32,
+        read_pool_size: int = 1,
+        commit_window: float = 0.005
+    ):
+        """
+        Initialize the pool.
+
+        Args:
+            storage_dir: Directory holding <agent_id>.db files
+            max_open: Maximum engines kept open before evicting the LRU one
+            read_pool_size: Read-only connections per agent engine
+            commit_window: Seconds each writer waits to merge pending writes
+        """
+        self.storage_dir = Path(storage_dir)
+        self.max_open = max(1, max_open)
+        self.read_pool_size = read_pool_size
+        self.commit_window = commit_window
+
+        self._engines: "OrderedDict[str, Tuple[SQLiteEngine, Set[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        # agent_id -> thread closing its evicted engine (a reopen waits for it)
+        self._closing: Dict[str, threading.Thread] = {}
+        # agent_id -> Future resolved once the engine being opened is published
+        self._opening: Dict[str, Future] = {}
+
+    def _open(self, agent_id: str) -> Tuple[SQLiteEngine, Set[str]]:
+        """Open an engine for an agent and load its existing table names"""
+        engine = SQLiteEngine(
+            self.storage_dir / f"{agent_id}.db",
+            read_pool_size=self.read_pool_size,
+            commit_window=self.commit_window
+        )
+        known_tables = {
+            row[0] for row in engine.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'"
+            )
+        }
+        return engine, known_tables
+
+    def _submit(self, agent_id: str, submit: Callable[[SQLiteEngine, Set[str]], Future]) -> Future:
+        """
+        Look up (or open) an agent's engine and queue a job on it.
+
+        The lock only guards the table: engines are opened outside it, so
+        one slow open never stalls callers of other agents. Concurrent
+        callers for the agent being opened wait on its "opening" Future.
+        """
+        while True:
+            with self._lock:
+                entry = self._engines.get(agent_id)
+                if entry is not None:
+                    self._engines.move_to_end(agent_id)
+                    # Queue under the lock so an eviction can't close the engine first
+                    return submit(*entry)
+                closing = self._closing.get(agent_id)
+                pending = self._opening.get(agent_id)
+                if closing is None and pending is None:
+                    opening = self._opening[agent_id] = Future()
+            if closing is not None:
+                # Reopening an engine that is still draining: let its writes land first
+                closing.join()
+            elif pending is not None:
+                # Someone else is opening it; on failure the loop retries (and raises) here
+                pending.exception()
+            else:
+                return self._open_and_submit(agent_id, opening, submit)
+
+    def _open_and_submit(self, agent_id: str, opening: Future,
+                         submit: Callable[[SQLiteEngine, Set[str]], Future]) -> Future:
+        """Open an agent's engine (lock released), publish it and queue the job"""
+        try:
+            entry = self._open(agent_id)
+        except BaseException as e:
+            with self._lock:
+                del self._opening[agent_id]
+            opening.set_exception(e)
+            raise
+        try:
+            with self._lock:
+                del self._opening[agent_id]
+                self._engines[agent_id] = entry
+                if len(self._engines) > self.max_open:
+                    self._close_in_background(*self._engines.popitem(last=False))
+                    self.evictions += 1
+                return submit(*entry)
+        finally:
+            # Waiters find the published engine (their own submit reports any error)
+            opening.set_result(None)
+
+    def _close_in_background(self, agent_id: str, entry: Tuple[SQLiteEngine, Set[str]]):
+        """Close an evicted engine off the caller's thread (caller holds _lock)"""
+        def close():
+            try:
+                # Drains jobs queued before the eviction
+                entry[0].close()
+            finally:
+                with self._lock:
+                    if self._closing.get(agent_id) is closer:
+                        del self._closing[agent_id]
+
+        closer = threading.Thread(target=close, name=f"agent-db-close-{agent_id}", daemon=True)
+        self._closing[agent_id] = closer
+        closer.start()
+
+    def submit_write(self, agent_id: str, fn: Callable[[Any, Set[str]], Any]) -> Future:
+        """
+        Queue a write job for an agent's database.
+
+        Args:
+            agent_id: Target agent
+            fn: Callable receiving (writer connection, known table set)
+
+        Returns:
+            Future resolved once the job's group is committed
+        """
+        def submit(engine: SQLiteEngine, known_tables: Set[str]) -> Future:
+            future = engine.submit_write(lambda conn: fn(conn, known_tables))
+            # A failed commit may have rolled back CREATE TABLEs; re-check next time
+            future.add_done_callback(
+                lambda f: known_tables.clear() if f.exception() is not None else None
+            )
+            return future
+
+        return self._submit(agent_id, submit)
+
+    def submit_read(self, agent_id: str, fn: Callable[[Any], Any]) -> Future:
+        """Queue a read job on an agent's read-only pool"""
+        return self._submit(agent_id, lambda engine, _: engine.submit_read(fn))
+
+    def export_rows(
+        self,
+        agent_id: str,
+        table: str,
+        since_ts: Optional[float] = None,
+        before_ts: Optional[float] = None,
+        task_id: Optional[str] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream an agent table's rows, oldest first.
+
+        The database and table are checked before this returns, so callers
+        can report a bad request before streaming starts. Time filters apply
+        to updated_at and the task filter to data.task_id (the generic
+        relay table layout), all in SQL.
+
+        Args:
+            agent_id: Agent whose database is read
+            table: Table to export (must exist)
+            since_ts: Only rows updated at or after this Unix timestamp
+            before_ts: Only rows updated before this Unix timestamp
+            task_id: Only rows whose JSON data has this task_id
+            batch_size: Rows fetched per round trip
+
+        Returns:
+            Iterator of row dicts (closing it closes the connection)
+
+        Raises:
+            FileNotFoundError: No database for the agent
+            KeyError: No such table
+            ValueError: A filter needs a column the table lacks
+        """
+        db_path = self.storage_dir / f"{agent_id}.db"
+        if Path(agent_id).name != agent_id or not db_path.exists():
+            raise FileNotFoundError(f"No storage for agent {agent_id}")
+
+        conn = open_connection(db_path, read_only=True)
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)
+            ).fetchone()
+            if not exists:
+                raise KeyError(table)
+            quoted = '"' + table.replace('"', '""') + '"'
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({quoted})")}
+
+            clauses, params = [], []
+            if since_ts is not None or before_ts is not None:
+                if "updated_at" not in columns:
+                    raise ValueError(f"Table {table} has no updated_at column")
+                if since_ts is not None:
+                    clauses.append("updated_at >= datetime(?, 'unixepoch')")
+                    params.append(since_ts)
+                if before_ts is not None:
+                    clauses.append("updated_at < datetime(?, 'unixepoch')")
+                    params.append(before_ts)
+            if task_id is not None:
+                if "data" not in columns:
+                    raise ValueError(f"Table {table} has no data column")
+                clauses.append("json_extract(data, '$.task_id') = ?")
+                params.append(task_id)
+
+            sql = f"SELECT * FROM {quoted}"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            sql += " ORDER BY updated_at, rowid" if "updated_at" in columns else " ORDER BY rowid"
+            cursor = conn.execute(sql, params)
+        except Exception:
+            conn.close()
+            raise
+
+        def rows() -> Iterator[Dict[str, Any]]:
+            try:
+                names = [desc[0] for desc in cursor.description]
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    for row in batch:
+                        yield dict(zip(names, row))
+            finally:
+                conn.close()
+
+        return rows()
+
+    def stats(self) -> Dict[str, Any]:
+        """Open engine count and per-agent engine stats"""
+        with self._lock:
+            engines = {agent_id: entry[0] for agent_id, entry in self._engines.items()}
+        return {
+            "open": len(engines),
+            "max_open": self.max_open,
+            "evictions": self.evictions,
+            "agents": {agent_id: engine.stats() for agent_id, engine in engines.items()}
+        }
+
+    def close(self):
+        """Drain and close every open engine"""
+        with self._lock:
+            entries = list(self._engines.values())
+            self._engines.clear()
+            closers = list(self._closing.values())
+        for engine, _ in entries:
+            engine.close()
+        for closer in closers:
+            closer.join()
@@ -5,32 +5,43 @@ Central message hub for the cluster.
 Handles:
 - Receiving MessageEnvelopes from agents/commander
 - Persisting all traffic to MessageStore (HTPC local)
-- Routing messages to recipients
+- Routing messages to recipients (per-recipient priority queues, long-poll / WebSocket push)
 - Agent storage synchronization (immediate, batch, query)
+- Priority scheduling of routing, persistence and sync work (PriorityLevel + aging)
+- Background retention of the message store (chunked, with a cold-tier archive)
+- Optional time/size-partitioned message store (one SQLite file per shard)
+- Streaming NDJSON export of the message store and agent tables
 
-Version: 1.2.2 (Storage Endpoints Added)
+Version: 1.6.3 (Streaming Export)
 """
 
+import asyncio
 import logging
 import os
 import sqlite3
 import json
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from typing import Dict, Any, List, Optional, Set
+from fastapi import FastAPI, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
-from commander_os.core.protocol import MessageEnvelope, CommanderProtocol
-from commander_os.core.memory import MessageStore
+from commander_os.core.protocol import MessageEnvelope, CommanderProtocol, PriorityLevel
+from commander_os.core.memory import MESSAGE_FIELDS, MessageStore, ndjson_chunks
+from commander_os.core.partitioned import PartitionedMessageStore
 from commander_os.core.config_manager import ConfigManager
+from commander_os.network.agent_db import AgentDBPool
+from commander_os.network.router import MessageRouter, RoutedMessage
+from commander_os.network.spill import SpillQueue
+from commander_os.network.scheduler import PriorityScheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="The Commander: Relay Server")
-
 # Initialize Config & Store
 # In production, this would be on HTPC
 config = ConfigManager()
@@ -39,12 +50,62 @@ config.load_relay_config()
 # The database should be on the ZFS mountpoint on HTPC
 # For now, we utilize the current directory or a configured path
 db_url = os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
-store = MessageStore(db_url)
+# Strict dedup makes client retries idempotent (keyed by envelope id)
+strict_dedup = os.getenv("COMMANDER_STRICT_DEDUP", "0") == "1"
+partition_dir = os.getenv("COMMANDER_PARTITION_DIR")
+if partition_dir:
+    # One file per month (or per COMMANDER_PARTITION_ROWS rows); retention drops whole files
+    store = PartitionedMessageStore(
+        partition_dir,
+        rows_per_shard=int(os.getenv("COMMANDER_PARTITION_ROWS", "0")) or None,
+        dedup=strict_dedup
+    )
+else:
+    # Aged-out messages move to archive segments when COMMANDER_ARCHIVE_DIR is set
+    store = MessageStore(
+        db_url,
+        dedup=strict_dedup,
+        archive_dir=os.getenv("COMMANDER_ARCHIVE_DIR") or None
+    )
+retention_days = float(os.getenv("COMMANDER_RETENTION_DAYS", "0"))
+
+# In-memory routing table; offline recipients spill to relay_spill (not message history)
+spill_queue = SpillQueue(os.getenv("COMMANDER_SPILL_DB_URL", db_url))
+router = MessageRouter(
+    spill_queue,
+    max_queue=int(os.getenv("COMMANDER_RELAY_QUEUE_SIZE", "1000"))
+)
 
 # Storage sync directory (where agent databases are stored on HTPC)
 storage_dir = Path(os.getenv("COMMANDER_STORAGE_DIR", "./data/agent_storage"))
 storage_dir.mkdir(parents=True, exist_ok=True)
 
+# Long-lived per-agent engines (LRU bounded); one writer thread per agent DB
+agent_dbs = AgentDBPool(
+    storage_dir,
+    max_open=int(os.getenv("COMMANDER_RELAY_MAX_AGENT_DBS", "32"))
+)
+
+# All relay work is drained from one aged priority heap
+scheduler = PriorityScheduler(
+    workers=int(os.getenv("COMMANDER_RELAY_WORKERS", "4")),
+    aging_interval=float(os.getenv("COMMANDER_RELAY_AGING_MS", "250")) / 1000.0
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start retention; on shutdown drain scheduled work, then close agent databases and the router's spill thread."""
+    if retention_days > 0:
+        store.start_retention(retention_days, interval=float(os.getenv("COMMANDER_RETENTION_INTERVAL", "3600")))
+    yield
+    scheduler.close()
+    agent_dbs.close()
+    router.close()
+    spill_queue.close()
+    store.close()
+
+app = FastAPI(title="The Commander: Relay Server", lifespan=lifespan)
+
 # Pydantic models for storage endpoints
 class ImmediateWriteRequest(BaseModel):
     agent_id: str
@@ -67,8 +128,24 @@ class QueryRequest(BaseModel):
 async def health():
     return {"status": "ok", "service": "relay"}
 
+@app.get("/relay/metrics")
+async def metrics():
+    """Scheduler queue depth / wait-time per priority, plus routing counters"""
+    router_stats = router.stats()
+    return {
+        "scheduler": scheduler.stats(),
+        "router": {k: v for k, v in router_stats.items() if k != "recipients"},
+        "storage": {k: v for k, v in agent_dbs.stats().items() if k != "agents"},
+        "memory": {
+            "strict_dedup": store.dedup,
+            "duplicates_ignored": store.duplicates_ignored,
+            "retention_days": retention_days,
+            "archive": store.archive.stats() if store.archive else None
+        }
+    }
+
 @app.post("/relay/message")
-async def receive_message(envelope: MessageEnvelope, background_tasks: BackgroundTasks):
+async def receive_message(envelope: MessageEnvelope):
     """
     Standard endpoint for all cluster traffic.
     """
@@ -79,29 +156,98 @@ async def receive_message(envelope: MessageEnvelope, background_tasks: Backgroun
         logger.error(f"Invalid envelope received: {envelope.id}")
         raise HTTPException(status_code=400, detail="Invalid protocol envelope")
 
-    # 2. Persist to Message Store
-    background_tasks.add_task(persist_envelope, envelope)
+    # 2. Route at the envelope's priority; waiting recipients wake before the response is sent
+    routed = await asyncio.wrap_future(scheduler.submit(envelope.priority, _route_envelope, envelope))
     
-    # 3. TODO: Routing Logic 
-    # forward_to_recipient(envelope)
+    # 3. Persist to Message Store (same priority, not awaited)
+    scheduler.submit(envelope.priority, persist_envelope, envelope)
     
-    return {"status": "received", "id": envelope.id}
+    return {"status": "received", "id": envelope.id, "routed": routed}
+
+def _route_envelope(envelope: MessageEnvelope) -> int:
+    """Scheduler job: hand an envelope to the routing table."""
+    return router.route(envelope)
+
+def _envelope_list(messages: List[RoutedMessage]) -> Response:
+    """JSON array response built from each message's cached serialization."""
+    body = "[" + ",".join(message.json for message in messages) + "]"
+    return Response(content=body, media_type="application/json")
+
+@app.get("/relay/poll/{recipient_id}")
+async def poll_messages(
+    recipient_id: str,
+    timeout: float = Query(25.0, ge=0.0, le=120.0),
+    max_messages: int = Query(100, ge=1, le=1000)
+):
+    """
+    Long-poll delivery: returns queued envelopes for a recipient in
+    priority order, waiting up to `timeout` seconds if none are queued.
+    """
+    messages = await router.get(recipient_id, max_messages=max_messages, timeout=timeout)
+    return _envelope_list(messages)
+
+@app.websocket("/relay/ws/{recipient_id}")
+async def push_messages(websocket: WebSocket, recipient_id: str):
+    """
+    Push delivery: streams envelopes to a connected node or agent as
+    they are routed. Undelivered messages are requeued on disconnect.
+    """
+    await websocket.accept()
+    router.connect(recipient_id)
+    receiver = asyncio.create_task(_wait_for_disconnect(websocket))
+    
+    try:
+        while not receiver.done():
+            getter = asyncio.create_task(router.get(recipient_id, timeout=30.0))
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            
+            messages = getter.result()
+            for index, message in enumerate(messages):
+                try:
+                    await websocket.send_text(message.json)
+                except Exception:
+                    router.requeue(recipient_id, messages[index:])
+                    raise
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        router.disconnect(recipient_id)
+        logger.info(f"Push connection closed for {recipient_id}")
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Consume client frames (keepalives) until the socket closes."""
+    try:
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+@app.get("/relay/routes")
+async def route_stats():
+    """Routing counters and per-recipient queue depths"""
+    return router.stats()
 
 def persist_envelope(envelope: MessageEnvelope):
-    """Worker task to write envelope to SQL."""
+    """Worker task to buffer envelope for the store's batched writer."""
     try:
         # Determine role from metadata or task reference
         role = envelope.metadata.get("role", "unknown")
         
-        store.log_message(
+        future = store.log_message(
             task_id=envelope.task_id or "system",
             sender=envelope.sender_id,
             recipient=envelope.recipient_id,
             role=role,
             content=str(envelope.payload),
-            metadata=envelope.metadata
+            metadata=envelope.metadata,
+            wait=False,
+            dedup_id=envelope.id
         )
-        logger.debug(f"Persisted message {envelope.id}")
+        future.add_done_callback(lambda f: _log_write_failure(f, f"persist of message {envelope.id}"))
     except Exception as e:
         logger.error(f"Failed to persist message {envelope.id}: {e}")
 
@@ -109,34 +255,19 @@ def persist_envelope(envelope: MessageEnvelope):
 # STORAGE SYNCHRONIZATION ENDPOINTS
 # ============================================================
 
-def get_agent_db_connection(agent_id: str) -> sqlite3.Connection:
-    """Get or create SQLite connection for an agent's database"""
-    db_path = storage_dir / f"{agent_id}.db"
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    
-    # Enable WAL mode
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
-    
-    return conn
-
 @app.post("/relay/immediate")
-async def immediate_write(request: ImmediateWriteRequest, background_tasks: BackgroundTasks):
+async def immediate_write(request: ImmediateWriteRequest):
     """
     Immediate write endpoint for dual-write strategy.
     Writes single record to HTPC for network-wide visibility.
+    
+    Scheduled at NORMAL priority, then queued on the agent's writer
+    thread, which merges concurrent immediate writes into one transaction.
     """
     logger.info(f"Immediate write: {request.agent_id} -> {request.table}")
     
     try:
-        # Process write in background to avoid blocking
-        background_tasks.add_task(
-            _process_immediate_write,
-            request.agent_id,
-            request.table,
-            request.operation,
-            request.data
-        )
+        scheduler.submit(PriorityLevel.NORMAL, _process_immediate_write, request)
         
         return {"status": "accepted", "agent_id": request.agent_id}
         
@@ -144,77 +275,61 @@ async def immediate_write(request: ImmediateWriteRequest, background_tasks: Back
         logger.error(f"Immediate write failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def _process_immediate_write(agent_id: str, table: str, operation: str, data: Dict[str, Any]):
-    """Background task to process immediate write"""
-    try:
-        conn = get_agent_db_connection(agent_id)
-        
-        # Create table if it doesn't exist (generic structure)
-        _ensure_table_exists(conn, table)
-        
-        # Execute write operation
-        if operation == "insert":
-            _insert_record(conn, table, data)
-        elif operation == "update":
-            _update_record(conn, table, data)
-        elif operation == "delete":
-            _delete_record(conn, table, data)
-        
-        conn.commit()
-        conn.close()
-        
-        logger.debug(f"Processed immediate write for {agent_id}.{table}")
-        
-    except Exception as e:
-        logger.error(f"Failed to process immediate write: {e}")
-
 @app.post("/relay/batch")
-async def batch_write(request: BatchWriteRequest, background_tasks: BackgroundTasks):
+async def batch_write(request: BatchWriteRequest):
     """
     Batch write endpoint for efficient bulk operations.
     Writes multiple records to HTPC.
+    
+    Scheduled at BACKGROUND priority so sync drains never starve
+    commands. Responds once the batch is committed, so the returned
+    count is a durable acknowledgement the sender can delete its queue
+    rows on. The commit is awaited here, not on a scheduler worker.
     """
     logger.info(f"Batch write: {request.agent_id} -> {len(request.records)} records")
     
     try:
-        background_tasks.add_task(
-            _process_batch_write,
-            request.agent_id,
-            request.records
+        commit = await asyncio.wrap_future(
+            scheduler.submit(PriorityLevel.BACKGROUND, _queue_batch_write, request)
         )
+        await asyncio.wrap_future(commit)
         
+        logger.info(f"Processed batch write for {request.agent_id}: {len(request.records)} records")
         return {"status": "accepted", "agent_id": request.agent_id, "count": len(request.records)}
         
     except Exception as e:
         logger.error(f"Batch write failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def _process_batch_write(agent_id: str, records: List[Dict[str, Any]]):
-    """Background task to process batch write"""
-    try:
-        conn = get_agent_db_connection(agent_id)
-        
-        for record in records:
-            table = record.get('table')
-            operation = record.get('operation', 'insert')
-            data = record.get('data', {})
-            
-            _ensure_table_exists(conn, table)
-            
-            if operation == "insert":
-                _insert_record(conn, table, data)
-            elif operation == "update":
-                _update_record(conn, table, data)
-            elif operation == "delete":
-                _delete_record(conn, table, data)
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Processed batch write for {agent_id}: {len(records)} records")
-        
-    except Exception as e:
-        logger.error(f"Failed to process batch write: {e}")
+def _queue_batch_write(request: BatchWriteRequest) -> Future:
+    """Scheduler job: queue a batch on the agent's writer; returns the commit's Future"""
+    return agent_dbs.submit_write(
+        request.agent_id,
+        lambda conn, known_tables: _process_batch_write(conn, known_tables, request.records)
+    )
+
+def _process_immediate_write(request: ImmediateWriteRequest):
+    """Scheduler job: queue one record on the agent's writer (not awaited)"""
+    future = agent_dbs.submit_write(
+        request.agent_id,
+        lambda conn, known_tables: _apply_record(
+            conn, known_tables, request.table, request.operation, request.data
+        )
+    )
+    future.add_done_callback(
+        lambda f: _log_write_failure(f, f"immediate write for {request.agent_id}.{request.table}")
+    )
+
+def _process_batch_write(conn: sqlite3.Connection, known_tables: Set[str], records: List[Dict[str, Any]]):
+    """Writer-thread job applying a batch of records in one transaction"""
+    for record in records:
+        _apply_record(
+            conn,
+            known_tables,
+            record.get('table'),
+            record.get('operation', 'insert'),
+            record.get('data', {})
+        )
 
 @app.post("/relay/query")
 async def query_data(request: QueryRequest):
@@ -224,8 +339,7 @@ async def query_data(request: QueryRequest):
     """
     logger.info(f"Query: {request.agent_id}")
     
-    try:
-        conn = get_agent_db_connection(request.agent_id)
+    def run(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
         cursor = conn.cursor()
         
         # Execute query (basic support - could be enhanced)
@@ -237,47 +351,110 @@ async def query_data(request: QueryRequest):
         columns = [desc[0] for desc in cursor.description] if cursor.description else []
         
         # Convert to list of dicts
-        results = []
-        for row in rows:
-            results.append(dict(zip(columns, row)))
-        
-        conn.close()
-        
+        return [dict(zip(columns, row)) for row in rows]
+    
+    try:
+        # A cache miss opens the agent's engine (blocking): do the lookup off the loop
+        future = await asyncio.to_thread(agent_dbs.submit_read, request.agent_id, run)
+        results = await asyncio.wrap_future(future)
         return {"status": "success", "results": results}
         
     except Exception as e:
         logger.error(f"Query failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/relay/export/{agent_id}/{table}")
+async def export_agent_table(
+    agent_id: str,
+    table: str,
+    since_ts: Optional[float] = None,
+    before_ts: Optional[float] = None,
+    task_id: Optional[str] = None
+):
+    """
+    Stream one agent table as NDJSON (application/x-ndjson).
+    Rows are read in batches from a dedicated read-only connection.
+    """
+    try:
+        rows = await asyncio.to_thread(
+            agent_dbs.export_rows, agent_id, table,
+            since_ts=since_ts, before_ts=before_ts, task_id=task_id
+        )
+    except (FileNotFoundError, KeyError) as e:
+        raise HTTPException(status_code=404, detail=f"Not found: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Export: {agent_id}.{table}")
+    return StreamingResponse(ndjson_chunks(rows), media_type="application/x-ndjson")
+
+@app.get("/relay/export/messages")
+async def export_messages(
+    task_id: Optional[str] = None,
+    sender: Optional[str] = None,
+    recipient: Optional[str] = None,
+    since_ts: Optional[float] = None,
+    before_ts: Optional[float] = None,
+    fields: Optional[str] = None
+):
+    """Stream persisted relay traffic as NDJSON, oldest first."""
+    field_list = fields.split(",") if fields else None
+    unknown = [f for f in field_list or () if f not in MESSAGE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown message fields: {', '.join(unknown)}")
+    messages = store.export_messages(
+        task_id=task_id, sender=sender, recipient=recipient,
+        since_ts=since_ts, before_ts=before_ts, fields=field_list
+    )
+    return StreamingResponse(ndjson_chunks(messages), media_type="application/x-ndjson")
+
+@app.get("/relay/storage/stats")
+async def storage_stats():
+    """Open agent databases and their writer/reader queue stats"""
+    return agent_dbs.stats()
+
 # ============================================================
 # STORAGE HELPER FUNCTIONS
 # ============================================================
 
-def _ensure_table_exists(conn: sqlite3.Connection, table: str):
+def _log_write_failure(future, description: str):
+    """Done-callback logging a failed fire-and-forget write"""
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Failed to process {description}: {error}")
+
+def _apply_record(
+    conn: sqlite3.Connection,
+    known_tables: Set[str],
+    table: str,
+    operation: str,
+    data: Dict[str, Any]
+):
+    """Apply one insert/update/delete to an agent database"""
+    _ensure_table_exists(conn, known_tables, table)
+    
+    if operation == "insert":
+        _insert_record(conn, table, data)
+    elif operation == "update":
+        _update_record(conn, table, data)
+    elif operation == "delete":
+        _delete_record(conn, table, data)
+
+def _ensure_table_exists(conn: sqlite3.Connection, known_tables: Set[str], table: str):
     """Create table if it doesn't exist (generic structure)"""
-    try:
-        # Check if table exists
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-            (table,)
+    if table in known_tables:
+        return
+    
+    # Create generic table structure
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id TEXT PRIMARY KEY,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-        
-        if cursor.fetchone() is None:
-            # Create generic table structure
-            cursor.execute(f"""
-                CREATE TABLE {table} (
-                    id TEXT PRIMARY KEY,
-                    data TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            conn.commit()
-            logger.info(f"Created table {table}")
-            
-    except Exception as e:
-        logger.error(f"Failed to ensure table exists: {e}")
+    """)
+    known_tables.add(table)
+    logger.info(f"Created table {table}")
 
 def _insert_record(conn: sqlite3.Connection, table: str, data: Dict[str, Any]):
     """Insert record into table"""
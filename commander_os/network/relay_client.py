@@ -7,7 +7,7 @@ Version: 1.2.0 (FastAPI/HTTP-based)
 
 import logging
 import httpx
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 
 from commander_os.core.protocol import MessageEnvelope
 
@@ -45,6 +45,33 @@ class RelayClient:
             logger.error(f"Failed to connect to relay at {self.relay_url}: {e}")
             return False
 
+    def poll_messages(
+        self,
+        recipient_id: str,
+        timeout: float = 25.0,
+        max_messages: int = 100
+    ) -> List[MessageEnvelope]:
+        """
+        Long-poll the relay for envelopes addressed to recipient_id.
+        Returns them in priority order (empty list on timeout or error).
+        """
+        endpoint = f"{self.relay_url}/relay/poll/{recipient_id}"
+        
+        try:
+            response = self._client.get(
+                endpoint,
+                params={"timeout": timeout, "max_messages": max_messages},
+                timeout=timeout + 10.0
+            )
+            if response.status_code != 200:
+                logger.error(f"Relay poll failed for {recipient_id}: {response.status_code} - {response.text}")
+                return []
+            return [MessageEnvelope(**item) for item in response.json()]
+            
+        except Exception as e:
+            logger.error(f"Failed to poll relay at {self.relay_url}: {e}")
+            return []
+
     def check_health(self) -> bool:
         """Check if the relay is reachable."""
         try:
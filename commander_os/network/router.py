@@ -0,0 +1,337 @@
+"""
+The-Commander: Relay Message Router
+In-memory routing table delivering envelopes to recipients.
+
+Handles:
+- One bounded priority queue per recipient id (PriorityLevel order, FIFO within a level)
+- Fan-out of multi-recipient envelopes by reference (one payload, one cached JSON body)
+- Long-poll and WebSocket consumers waking as soon as a message is queued
+- Spilling to a SpillQueue (relay_spill table, outside message history)
+  while a recipient is offline or its queue is full
+
+Version: 1.1.0
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from commander_os.core.protocol import MessageEnvelope
+from commander_os.network.spill import SpillQueue
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class RoutedMessage:
+    """An envelope accepted by the router, shared by all of its recipients."""
+    envelope: MessageEnvelope
+    received_at: float = field(default_factory=time.time)
+    _json: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def priority(self) -> int:
+        return int(self.envelope.priority)
+
+    @property
+    def json(self) -> str:
+        """Serialized envelope, computed once and reused for every recipient."""
+        if self._json is None:
+            self._json = self.envelope.model_dump_json()
+        return self._json
+
+
+class _Mailbox:
+    """Per-recipient queue state. Guarded by the router lock."""
+
+    __slots__ = ("heap", "waiters", "connections", "last_seen", "spill_pending")
+
+    def __init__(self, spill_pending: bool):
+        self.heap: List[Tuple[int, float, int, RoutedMessage]] = []
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.connections = 0
+        self.last_seen = 0.0
+        # Messages for this recipient may be sitting in the spill queue
+        self.spill_pending = spill_pending
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class MessageRouter:
+    """
+    Routing table for relay traffic.
+
+    route() is thread-safe and never blocks on I/O: spill writes for
+    offline recipients run on a single spill thread, which also serves
+    reloads so a recipient never sees a reload overtake its own spill.
+    """
+
+    def __init__(
+        self,
+        spill: Optional[SpillQueue] = None,
+        max_queue: int = 1000,
+        presence_ttl: float = 30.0
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            spill: Queue for messages that cannot be held in memory (None keeps them in memory)
+            max_queue: Maximum in-memory messages per recipient
+            presence_ttl: Seconds a recipient counts as online after its last poll
+        """
+        self.spill = spill
+        self.max_queue = max(1, max_queue)
+        self.presence_ttl = presence_ttl
+
+        self._mailboxes: Dict[str, _Mailbox] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="relay-spill")
+
+        self.routed = 0
+        self.delivered = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    # ===========================
+    # Routing
+    # ===========================
+
+    def route(self, envelope: MessageEnvelope) -> int:
+        """
+        Queue an envelope for each of its recipients.
+
+        Returns:
+            Number of recipients the envelope was routed to
+        """
+        recipients = envelope.recipient_id
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        recipients = list(dict.fromkeys(recipients))
+
+        message = RoutedMessage(envelope)
+        now = time.time()
+        to_spill: List[Tuple[str, RoutedMessage]] = []
+
+        with self._lock:
+            for recipient in recipients:
+                mailbox = self._mailbox(recipient)
+                online = mailbox.connections > 0 or now - mailbox.last_seen < self.presence_ttl
+                if not online and self.spill is not None:
+                    to_spill.append((recipient, message))
+                    continue
+                overflow = self._push(mailbox, message)
+                if overflow is not None:
+                    to_spill.append((recipient, overflow))
+            self.routed += 1
+
+        for recipient, spilled in to_spill:
+            self._spill(recipient, spilled)
+        return len(recipients)
+
+    def requeue(self, recipient_id: str, messages: List[RoutedMessage]):
+        """Put undelivered messages back at their original queue position."""
+        to_spill = []
+        with self._lock:
+            mailbox = self._mailbox(recipient_id)
+            for message in messages:
+                overflow = self._push(mailbox, message)
+                if overflow is not None:
+                    to_spill.append(overflow)
+        for message in to_spill:
+            self._spill(recipient_id, message)
+
+    def _mailbox(self, recipient_id: str) -> _Mailbox:
+        mailbox = self._mailboxes.get(recipient_id)
+        if mailbox is None:
+            mailbox = _Mailbox(spill_pending=self.spill is not None)
+            self._mailboxes[recipient_id] = mailbox
+        return mailbox
+
+    def _push(self, mailbox: _Mailbox, message: RoutedMessage) -> Optional[RoutedMessage]:
+        """
+        Add a message to a mailbox (lock held) and wake its consumers.
+
+        Returns:
+            The message evicted to make room, if the queue was full
+        """
+        self._seq += 1
+        entry = (message.priority, message.received_at, self._seq, message)
+        evicted = None
+
+        if len(mailbox.heap) >= self.max_queue:
+            # Evict the least urgent message (rare path, O(n) on a bounded heap)
+            worst = max(mailbox.heap)
+            if entry[:3] >= worst[:3]:
+                return self._overflow(message)
+            mailbox.heap.remove(worst)
+            heapq.heapify(mailbox.heap)
+            evicted = self._overflow(worst[3])
+
+        heapq.heappush(mailbox.heap, entry)
+
+        waiters, mailbox.waiters = mailbox.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        return evicted
+
+    def _overflow(self, message: RoutedMessage) -> Optional[RoutedMessage]:
+        """Hand a message to the spill path, or drop it when there is no spill queue."""
+        if self.spill is not None:
+            return message
+        self.dropped += 1
+        logger.warning(f"Recipient queue full, dropped message {message.envelope.id}")
+        return None
+
+    # ===========================
+    # Spill / Reload
+    # ===========================
+
+    def _spill(self, recipient_id: str, message: RoutedMessage):
+        self._spill_executor.submit(self._spill_job, recipient_id, message)
+
+    def _spill_job(self, recipient_id: str, message: RoutedMessage):
+        """Persist one message for an offline recipient (spill thread)."""
+        envelope = message.envelope
+        try:
+            self.spill.push(recipient_id, envelope.id, message.json, message.received_at)
+        except Exception as e:
+            self.dropped += 1
+            logger.error(f"Failed to spill message {envelope.id} for {recipient_id}: {e}")
+            return
+        with self._lock:
+            self._mailbox(recipient_id).spill_pending = True
+            self.spilled += 1
+
+    def _reload_job(self, recipient_id: str, room: int) -> int:
+        """Move up to `room` spilled messages back into memory (spill thread)."""
+        rows = self.spill.oldest(recipient_id, room)
+        messages = []
+        for row in rows:
+            try:
+                envelope = MessageEnvelope.model_validate_json(row['body'])
+            except Exception as e:
+                logger.error(f"Discarding unreadable spilled message {row['id']}: {e}")
+                continue
+            messages.append(RoutedMessage(envelope, row['received_at'], row['body']))
+
+        self.spill.delete([row['id'] for row in rows])
+
+        overflow = []
+        with self._lock:
+            mailbox = self._mailbox(recipient_id)
+            mailbox.spill_pending = len(rows) >= room
+            for message in messages:
+                evicted = self._push(mailbox, message)
+                if evicted is not None:
+                    overflow.append(evicted)
+        # Queue filled up meanwhile: put the displaced messages back in the spill queue
+        for message in overflow:
+            self._spill_job(recipient_id, message)
+        return len(messages)
+
+    # ===========================
+    # Delivery
+    # ===========================
+
+    async def get(
+        self,
+        recipient_id: str,
+        max_messages: int = 100,
+        timeout: float = 25.0
+    ) -> List[RoutedMessage]:
+        """
+        Wait for messages addressed to a recipient (long-poll semantics).
+
+        Args:
+            recipient_id: Node or agent id
+            max_messages: Maximum messages to return
+            timeout: Seconds to wait when the queue is empty
+
+        Returns:
+            Messages in priority order (empty on timeout)
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            mailbox = self._mailbox(recipient_id)
+            mailbox.connections += 1
+            room = self.max_queue - len(mailbox.heap)
+            reload = mailbox.spill_pending and room > 0
+
+        try:
+            if reload:
+                await loop.run_in_executor(self._spill_executor, self._reload_job, recipient_id, room)
+
+            deadline = loop.time() + timeout
+            while True:
+                with self._lock:
+                    batch = []
+                    while mailbox.heap and len(batch) < max_messages:
+                        batch.append(heapq.heappop(mailbox.heap)[3])
+                    remaining = deadline - loop.time()
+                    if batch or remaining <= 0:
+                        self.delivered += len(batch)
+                        return batch
+                    waiter = loop.create_future()
+                    mailbox.waiters.append((loop, waiter))
+
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    return []
+                finally:
+                    with self._lock:
+                        if (loop, waiter) in mailbox.waiters:
+                            mailbox.waiters.remove((loop, waiter))
+        finally:
+            with self._lock:
+                mailbox.connections -= 1
+                mailbox.last_seen = time.time()
+
+    def connect(self, recipient_id: str):
+        """Mark a recipient online for the lifetime of a push connection."""
+        with self._lock:
+            self._mailbox(recipient_id).connections += 1
+
+    def disconnect(self, recipient_id: str):
+        """Release a push connection registered with connect()."""
+        with self._lock:
+            mailbox = self._mailbox(recipient_id)
+            mailbox.connections = max(0, mailbox.connections - 1)
+            mailbox.last_seen = time.time()
+
+    # ===========================
+    # Introspection / Lifecycle
+    # ===========================
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing counters and per-recipient queue depths."""
+        now = time.time()
+        with self._lock:
+            return {
+                "routed": self.routed,
+                "delivered": self.delivered,
+                "spilled": self.spilled,
+                "dropped": self.dropped,
+                "recipients": {
+                    recipient: {
+                        "depth": len(mailbox.heap),
+                        "online": mailbox.connections > 0 or now - mailbox.last_seen < self.presence_ttl,
+                        "spill_pending": mailbox.spill_pending
+                    }
+                    for recipient, mailbox in self._mailboxes.items()
+                }
+            }
+
+    def close(self):
+        """Finish pending spills and stop the spill thread."""
+        self._spill_executor.shutdown(wait=True)
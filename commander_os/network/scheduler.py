@@ -0,0 +1,172 @@
+"""
+The-Commander: Relay Priority Scheduler
+Drains relay work (routing, persistence, storage sync) in PriorityLevel order.
+
+Jobs are ordered by an aged deadline: submit time plus `aging_interval`
+per priority level. A CRITICAL job jumps ahead of everything queued
+less than four intervals before it, but a BACKGROUND job can never be
+overtaken by work submitted more than four intervals after it, so bulk
+sync batches are delayed, not starved.
+
+Version: 1.0.0
+"""
+
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+from commander_os.core.protocol import PriorityLevel
+
+logger = logging.getLogger(__name__)
+
+
+class _PriorityStats:
+    """Depth and wait-time counters for one priority level"""
+
+    def __init__(self):
+        self.depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        started = self.completed + self.failed
+        return {
+            "depth": self.depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": self.total_wait_ms / started if started else 0.0,
+            "max_wait_ms": self.max_wait_ms
+        }
+
+
+class PriorityScheduler:
+    """
+    Worker-thread pool fed from a single aged priority heap.
+    """
+
+    def __init__(self, workers: int = 4, aging_interval: float = 0.25):
+        """
+        Initialize the scheduler and start its workers.
+
+        Args:
+            workers: Number of worker threads
+            aging_interval: Seconds of head start each priority level is worth
+        """
+        self.aging_interval = aging_interval
+
+        self._heap: List[Tuple[float, int, int, Callable, Tuple, Future, float]] = []
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._active = 0
+        self._closed = False
+        self._stats = {level: _PriorityStats() for level in PriorityLevel}
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"relay-scheduler-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, priority: int, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        Queue a job.
+
+        Args:
+            priority: PriorityLevel (or its int value)
+            fn: Callable to run on a worker thread
+            *args: Arguments for fn
+
+        Returns:
+            Future resolved with fn's result
+        """
+        level = PriorityLevel(int(priority))
+        future: Future = Future()
+        now = time.monotonic()
+        deadline = now + int(level) * self.aging_interval
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, int(level), self._seq, fn, args, future, now))
+            stats = self._stats[level]
+            stats.depth += 1
+            stats.submitted += 1
+            self._cond.notify()
+        return future
+
+    def _worker_loop(self):
+        """Run jobs in aged-priority order until closed and drained"""
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, level, _, fn, args, future, submitted = heapq.heappop(self._heap)
+                self._active += 1
+                stats = self._stats[PriorityLevel(level)]
+                stats.depth -= 1
+                wait_ms = (time.monotonic() - submitted) * 1000.0
+                stats.total_wait_ms += wait_ms
+                if wait_ms > stats.max_wait_ms:
+                    stats.max_wait_ms = wait_ms
+
+            ok = False
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                    ok = True
+                except Exception as e:
+                    logger.error(f"Scheduled job {getattr(fn, '__name__', fn)} failed: {e}")
+                    future.set_exception(e)
+
+            with self._cond:
+                self._active -= 1
+                if ok:
+                    stats.completed += 1
+                else:
+                    stats.failed += 1
+                self._cond.notify_all()
+
+    def join(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every queued job has finished.
+
+        Returns:
+            True if the scheduler went idle within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._heap or self._active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-priority queue depth and wait-time metrics"""
+        with self._cond:
+            return {
+                "workers": len(self._workers),
+                "active": self._active,
+                "aging_interval_ms": self.aging_interval * 1000.0,
+                "priorities": {level.name: stats.to_dict() for level, stats in self._stats.items()}
+            }
+
+    def close(self, timeout: float = 5.0):
+        """Finish queued jobs and stop the workers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
@@ -0,0 +1,89 @@
+"""
+The-Commander: Relay Spill Queue
+Durable per-recipient FIFO for envelopes the router cannot hold in memory
+(recipient offline or its queue full).
+
+Spilled envelopes live in their own table (relay_spill), never in the
+messages table: they are transient delivery state, not conversation
+history, so they stay out of search, export, broadcasts, retention and
+the archive. The table may share the MessageStore database file (and
+its engine); the relay persists each envelope to history separately.
+
+Version: 1.0.0
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Column, Float, Index, Integer, MetaData, String, Table, Text, delete, func, insert, select
+
+from commander_os.core.database import get_engine, release_engine
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+
+spill_table = Table(
+    "relay_spill", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("recipient", String, nullable=False),
+    Column("envelope_id", String),
+    Column("received_at", Float, nullable=False),
+    Column("body", Text, nullable=False),  # Envelope JSON
+)
+
+# Oldest-first reads per recipient
+Index("ix_relay_spill_recipient", spill_table.c.recipient, spill_table.c.id)
+
+
+class SpillQueue:
+    """Spilled envelopes per recipient, oldest first."""
+
+    def __init__(self, db_url: str):
+        """
+        Args:
+            db_url: Database URL (shares the engine of a MessageStore on the same URL)
+        """
+        self.engine = get_engine(db_url)
+        _metadata.create_all(bind=self.engine)
+
+    def push(self, recipient_id: str, envelope_id: Optional[str], body: str, received_at: float) -> int:
+        """
+        Append one envelope for a recipient.
+
+        Returns:
+            Row id of the spilled entry.
+        """
+        with self.engine.begin() as conn:
+            result = conn.execute(insert(spill_table).values(
+                recipient=recipient_id, envelope_id=envelope_id, received_at=received_at, body=body
+            ))
+            return result.inserted_primary_key[0]
+
+    def oldest(self, recipient_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Up to `limit` entries for a recipient, oldest first (not removed)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(spill_table)
+                .where(spill_table.c.recipient == recipient_id)
+                .order_by(spill_table.c.id)
+                .limit(limit)
+            )
+            return [dict(row._mapping) for row in rows]
+
+    def delete(self, entry_ids: List[int]) -> int:
+        """Remove delivered entries; returns how many were deleted."""
+        if not entry_ids:
+            return 0
+        with self.engine.begin() as conn:
+            return conn.execute(delete(spill_table).where(spill_table.c.id.in_(entry_ids))).rowcount
+
+    def count(self, recipient_id: Optional[str] = None) -> int:
+        query = select(func.count()).select_from(spill_table)
+        if recipient_id is not None:
+            query = query.where(spill_table.c.recipient == recipient_id)
+        with self.engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    def close(self):
+        release_engine(self.engine)
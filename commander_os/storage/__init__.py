@@ -7,5 +7,6 @@ and network-wide visibility through dual-write strategies.
 
 from .base_storage import BaseStorage
 from .agent_storage import AgentStorage
+from .sqlite_engine import SQLiteEngine
 
-__all__ = ["BaseStorage", "AgentStorage"]
+__all__ = ["BaseStorage", "AgentStorage", "SQLiteEngine"]
@@ -60,7 +60,7 @@ class AgentStorage(BaseStorage):
         
         if operation == "insert":
             record_id = data.get('id') or str(uuid.uuid4())
-            self.conn.execute("""
+            self._execute("""
                 INSERT OR REPLACE INTO agent_data (id, key, value, data_type)
                 VALUES (?, ?, ?, ?)
             """, (
@@ -70,7 +70,7 @@ class AgentStorage(BaseStorage):
                 data.get('data_type', 'string')
             ))
         elif operation == "update":
-            self.conn.execute("""
+            self._execute("""
                 UPDATE agent_data 
                 SET value = ?, data_type = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE key = ?
@@ -80,23 +80,24 @@ class AgentStorage(BaseStorage):
                 data.get('key')
             ))
         elif operation == "delete":
-            self.conn.execute(
+            self._execute(
                 "DELETE FROM agent_data WHERE key = ?",
                 (data.get('key'),)
             )
-        
-        self.conn.commit()
     
     def get(self, key: str) -> Optional[Any]:
         """Get value by key"""
         import json
         
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT value FROM agent_data WHERE key = ?",
-            (key,)
-        )
-        row = cursor.fetchone()
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT value FROM agent_data WHERE key = ?",
+                (key,)
+            )
+            return cursor.fetchone()
+        
+        row = self.engine.submit_read(_query).result()
         
         if row:
             return json.loads(row[0])
@@ -122,7 +123,7 @@ class AgentStorage(BaseStorage):
                 loop.run_until_complete(self.write_data('agent_data', data, 'insert'))
         except RuntimeError:
             # No event loop, just write locally
-            self._write_local('agent_data', data, 'insert')
+            self._apply_local('agent_data', data, 'insert')
         
         return True
     
@@ -139,7 +140,7 @@ class AgentStorage(BaseStorage):
             else:
                 loop.run_until_complete(self.write_data('agent_data', data, 'delete'))
         except RuntimeError:
-            self._write_local('agent_data', data, 'delete')
+            self._apply_local('agent_data', data, 'delete')
         
         return True
     
@@ -147,11 +148,13 @@ class AgentStorage(BaseStorage):
         """List all stored key-value pairs"""
         import json
         
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT key, value FROM agent_data")
+        def _query(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT key, value FROM agent_data")
+            return cursor.fetchall()
         
         result = {}
-        for key, value_json in cursor.fetchall():
+        for key, value_json in self.engine.submit_read(_query).result():
             result[key] = json.loads(value_json)
         
         return result
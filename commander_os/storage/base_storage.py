@@ -2,29 +2,78 @@
 Base Storage Class for Commander OS Agents
 
 Provides core storage functionality with:
-- Local SQLite cache (WAL mode)
+- Local SQLite cache (WAL mode) behind a writer thread and reader pool
 - Dual-write strategy (local + HTPC)
 - Network-wide data visibility
 - Resilient error handling
+- Background sync queue drainer with backoff and dead-lettering
+- Group commit of concurrent local writes
 """
 
 import sqlite3
 import asyncio
 import json
 import time
+import random
+import threading
 import logging
+from functools import partial
+from itertools import groupby
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
+import yaml
+
 try:
     import httpx
 except ImportError:
     httpx = None
 
+from .sqlite_engine import SQLiteEngine
+
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_STORAGE_CONFIG_PATH = Path(__file__).parent.parent.parent / "config" / "storage_config.yaml"
+
+# Fallback settings when storage_config.yaml is missing or incomplete
+DEFAULT_STORAGE_SETTINGS: Dict[str, Any] = {
+    "sync_interval": 60,
+    "sync_batch_size": 100,
+    "max_retry_count": 5,
+    "sync_backoff_base": 1.0,
+    "sync_backoff_max": 300.0,
+    "group_commit_window_ms": 5,
+    "group_commit_max_rows": 256,
+    "read_pool_size": 2,
+}
+
+
+def load_storage_config(config_path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Load the shared `agent_storage` section of storage_config.yaml.
+    
+    Args:
+        config_path: Path to the storage config file (defaults to config/storage_config.yaml)
+        
+    Returns:
+        Storage settings merged over DEFAULT_STORAGE_SETTINGS
+    """
+    settings = dict(DEFAULT_STORAGE_SETTINGS)
+    path = Path(config_path) if config_path else DEFAULT_STORAGE_CONFIG_PATH
+    
+    try:
+        with open(path, 'r') as f:
+            data = yaml.safe_load(f) or {}
+        settings.update(data.get('agent_storage') or {})
+    except FileNotFoundError:
+        logger.debug(f"Storage config not found at {path}, using defaults")
+    except Exception as e:
+        logger.warning(f"Failed to load storage config {path}: {e}")
+    
+    return settings
+
 
 class BaseStorage:
     """
@@ -33,6 +82,10 @@ class BaseStorage:
     Implements local-first architecture with dual-write strategy for
     network-wide visibility. Uses SQLite with WAL mode for local cache
     and HTTP API for HTPC synchronization.
+    
+    All SQLite work runs on a SQLiteEngine: writes on its single writer
+    thread (group committed), queries on its read-only connection pool,
+    so the async API never blocks the event loop on sqlite3 calls.
     """
     
     def __init__(
@@ -40,7 +93,8 @@ class BaseStorage:
         agent_id: str,
         data_dir: Path,
         htpc_url: Optional[str] = None,
-        enable_htpc: bool = True
+        enable_htpc: bool = True,
+        settings: Optional[Dict[str, Any]] = None
     ):
         """
         Initialize base storage.
@@ -50,6 +104,7 @@ class BaseStorage:
             data_dir: Directory for local database storage
             htpc_url: URL of the HTPC relay service
             enable_htpc: Whether to enable HTPC synchronization
+            settings: Sync and commit settings (defaults to storage_config.yaml)
         """
         self.agent_id = agent_id
         self.data_dir = Path(data_dir)
@@ -62,6 +117,30 @@ class BaseStorage:
         
         # Sync queue tracking
         self.sync_queue_table = "sync_queue"
+        self.dead_letter_table = "sync_dead_letter"
+        
+        merged = load_storage_config()
+        merged.update(settings or {})
+        settings = merged
+        self.sync_interval = float(settings["sync_interval"])
+        self.sync_batch_size = int(settings["sync_batch_size"])
+        self.max_retry_count = int(settings["max_retry_count"])
+        self.sync_backoff_base = float(settings["sync_backoff_base"])
+        self.sync_backoff_max = float(settings["sync_backoff_max"])
+        
+        # Background drainer state
+        self._sync_task: Optional[asyncio.Task] = None
+        self._sync_failures = 0
+        
+        # Group commit: the engine's writer thread collects writes from
+        # concurrent callers for a short window and commits them together
+        self.commit_window = float(settings["group_commit_window_ms"]) / 1000.0
+        self.commit_max_rows = int(settings["group_commit_max_rows"])
+        self.read_pool_size = int(settings["read_pool_size"])
+        self.engine: Optional[SQLiteEngine] = None
+        
+        # Per-thread statement sink used by batch_write to collect SQL
+        self._batch_local = threading.local()
         
         self._initialize()
     
@@ -83,21 +162,16 @@ class BaseStorage:
         logger.info(f"Storage initialized for agent {self.agent_id}")
     
     def _init_sqlite(self):
-        """Initialize SQLite connection with WAL mode"""
-        self.conn = sqlite3.connect(
+        """Initialize the SQLite engine (WAL writer connection + reader pool)"""
+        self.engine = SQLiteEngine(
             self.db_path,
-            check_same_thread=False,
-            timeout=30.0
+            read_pool_size=self.read_pool_size,
+            commit_window=self.commit_window,
+            commit_max_rows=self.commit_max_rows
         )
         
-        # Enable WAL mode for better concurrency
-        self.conn.execute("PRAGMA journal_mode=WAL")
-        self.conn.execute("PRAGMA synchronous=NORMAL")
-        self.conn.execute("PRAGMA cache_size=-64000")  # 64MB cache
-        self.conn.execute("PRAGMA temp_store=MEMORY")
-        
-        # Enable foreign keys
-        self.conn.execute("PRAGMA foreign_keys=ON")
+        # Writer connection: schema setup runs on it before any writes are queued
+        self.conn = self.engine.conn
         
         logger.info(f"SQLite initialized at {self.db_path}")
     
@@ -129,6 +203,18 @@ class BaseStorage:
             CREATE INDEX IF NOT EXISTS idx_sync_queue_queued_at 
                 ON {self.sync_queue_table}(queued_at);
             
+            -- Rows that exhausted max_retry_count, kept for inspection
+            CREATE TABLE IF NOT EXISTS {self.dead_letter_table} (
+                id INTEGER PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                data TEXT NOT NULL,
+                queued_at TIMESTAMP,
+                retry_count INTEGER DEFAULT 0,
+                last_error TEXT,
+                failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            
             CREATE TABLE IF NOT EXISTS schema_version (
                 version INTEGER PRIMARY KEY,
                 applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -156,8 +242,8 @@ class BaseStorage:
             True if write succeeded (at least locally)
         """
         try:
-            # 1. Write to local cache first (fast, reliable)
-            self._write_local(table, data, operation)
+            # 1. Write to local cache first (group committed on the writer thread)
+            await self.engine.write(partial(self._local_write_job, table, data, operation))
             
             # 2. Write to HTPC (network visibility)
             if self.enable_htpc:
@@ -170,11 +256,35 @@ class BaseStorage:
             return False
     
     def _write_local(self, table: str, data: Dict[str, Any], operation: str):
-        """Write data to local SQLite database"""
-        # Subclasses implement specific SQL logic
-        # This method should be overridden
+        """
+        Write data to local SQLite database.
+        
+        Subclasses implement the table-specific SQL and issue it through
+        _execute(). Runs on the engine's writer thread; commits are handled
+        by the engine, never by the writer itself.
+        """
         raise NotImplementedError("Subclasses must implement _write_local")
     
+    def _local_write_job(self, table: str, data: Dict[str, Any], operation: str, conn: sqlite3.Connection):
+        """Engine write job wrapping _write_local"""
+        self._write_local(table, data, operation)
+    
+    def _execute(self, sql: str, params: Tuple = ()):
+        """Execute a write statement, or collect it when batching"""
+        sink = getattr(self._batch_local, "sink", None)
+        if sink is not None:
+            sink.append((sql, tuple(params)))
+        else:
+            self.conn.execute(sql, params)
+    
+    def _apply_local(self, table: str, data: Dict[str, Any], operation: str):
+        """Write a single record and wait for its commit (no event loop)"""
+        self.engine.submit_write(partial(self._local_write_job, table, data, operation)).result()
+    
+    async def _read(self, fn):
+        """Run a query callable on the engine's read-only pool"""
+        return await self.engine.read(fn)
+    
     async def _write_htpc(
         self,
         table: str,
@@ -209,55 +319,90 @@ class BaseStorage:
             
         except asyncio.TimeoutError:
             logger.warning(f"HTPC write timeout for {table}, queueing")
-            self._queue_for_sync(table, data, operation)
+            await self._queue_for_sync_async([(table, data, operation)])
             
         except Exception as e:
             logger.warning(f"HTPC write failed for {table}: {e}, queueing")
-            self._queue_for_sync(table, data, operation)
+            await self._queue_for_sync_async([(table, data, operation)])
+    
+    def _enqueue_sync_rows(self, rows: List[Tuple[str, Dict[str, Any], str]], conn: sqlite3.Connection):
+        """Engine write job inserting rows into the sync queue"""
+        conn.executemany(
+            f"""INSERT INTO {self.sync_queue_table} 
+                (table_name, operation, data) 
+                VALUES (?, ?, ?)""",
+            [(table, operation, json.dumps(data)) for table, data, operation in rows]
+        )
     
     def _queue_for_sync(self, table: str, data: Dict[str, Any], operation: str):
         """Queue data for later HTPC synchronization"""
         try:
-            self.conn.execute(
-                f"""INSERT INTO {self.sync_queue_table} 
-                    (table_name, operation, data) 
-                    VALUES (?, ?, ?)""",
-                (table, operation, json.dumps(data))
-            )
-            self.conn.commit()
+            self.engine.submit_write(
+                partial(self._enqueue_sync_rows, [(table, data, operation)])
+            ).result()
             logger.debug(f"Queued {operation} for {table}")
         except Exception as e:
             logger.error(f"Failed to queue for sync: {e}")
     
+    async def _queue_for_sync_async(self, rows: List[Tuple[str, Dict[str, Any], str]]):
+        """Queue rows for later HTPC synchronization without blocking the loop"""
+        try:
+            await self.engine.write(partial(self._enqueue_sync_rows, rows))
+            logger.debug(f"Queued {len(rows)} records for sync")
+        except Exception as e:
+            logger.error(f"Failed to queue for sync: {e}")
+    
     async def batch_write(self, records: List[Dict[str, Any]]) -> int:
         """
         Write multiple records efficiently.
         
+        All records are applied in a single transaction, with consecutive
+        records that share a statement (same table and operation) sent
+        through one executemany call.
+        
         Args:
             records: List of records, each with 'table', 'data', 'operation'
             
         Returns:
             Number of records successfully written locally
         """
-        success_count = 0
+        statements: List[Tuple[str, Tuple]] = []
+        written = []
         
-        # Write all to local first
-        for record in records:
-            try:
-                self._write_local(
-                    record['table'],
-                    record['data'],
-                    record.get('operation', 'insert')
-                )
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Batch local write failed: {e}")
+        # Collect statements instead of executing them one by one
+        self._batch_local.sink = statements
+        try:
+            for record in records:
+                mark = len(statements)
+                try:
+                    self._write_local(
+                        record['table'],
+                        record['data'],
+                        record.get('operation', 'insert')
+                    )
+                    written.append(record)
+                except Exception as e:
+                    del statements[mark:]
+                    logger.error(f"Batch local write failed: {e}")
+        finally:
+            self._batch_local.sink = None
+        
+        def apply_batch(conn: sqlite3.Connection):
+            for sql, group in groupby(statements, key=lambda stmt: stmt[0]):
+                conn.executemany(sql, [params for _, params in group])
+        
+        try:
+            # Runs as one engine job: its savepoint makes the batch atomic
+            await self.engine.write(apply_batch)
+        except Exception as e:
+            logger.error(f"Batch transaction of {len(written)} records failed: {e}")
+            return 0
         
         # Send batch to HTPC
-        if self.enable_htpc and success_count > 0:
-            await self._batch_write_htpc(records)
+        if self.enable_htpc and written:
+            await self._batch_write_htpc(written)
         
-        return success_count
+        return len(written)
     
     async def _batch_write_htpc(self, records: List[Dict[str, Any]]):
         """Send batch of records to HTPC"""
@@ -265,29 +410,43 @@ class BaseStorage:
             return
         
         try:
-            endpoint = f"{self.htpc_url}/relay/batch"
-            payload = {
-                "agent_id": self.agent_id,
-                "records": records,
-                "timestamp": time.time()
-            }
-            
-            response = await asyncio.wait_for(
-                self.http_client.post(endpoint, json=payload),
-                timeout=5.0
-            )
-            response.raise_for_status()
-            
+            await self._post_batch(records)
             logger.info(f"Batch write succeeded for {len(records)} records")
             
         except Exception as e:
             logger.warning(f"Batch HTPC write failed: {e}, queueing individually")
-            for record in records:
-                self._queue_for_sync(
-                    record['table'],
-                    record['data'],
-                    record.get('operation', 'insert')
-                )
+            await self._queue_for_sync_async([
+                (record['table'], record['data'], record.get('operation', 'insert'))
+                for record in records
+            ])
+    
+    async def _post_batch(self, records: List[Dict[str, Any]]):
+        """
+        Ship records to the HTPC /relay/batch endpoint in one request.
+        
+        Raises on timeout, HTTP error, or an ack that does not cover
+        every record, so callers can decide whether to retry.
+        """
+        endpoint = f"{self.htpc_url}/relay/batch"
+        payload = {
+            "agent_id": self.agent_id,
+            "records": records,
+            "timestamp": time.time()
+        }
+        
+        response = await asyncio.wait_for(
+            self.http_client.post(endpoint, json=payload),
+            timeout=5.0
+        )
+        response.raise_for_status()
+        
+        try:
+            ack = response.json()
+        except Exception:
+            ack = {}
+        acked = ack.get("count", len(records)) if isinstance(ack, dict) else len(records)
+        if acked != len(records):
+            raise RuntimeError(f"HTPC acknowledged {acked}/{len(records)} records")
     
     def query_local(
         self,
@@ -304,10 +463,11 @@ class BaseStorage:
         Returns:
             List of result tuples
         """
+        def run(conn: sqlite3.Connection) -> List[Tuple]:
+            return conn.execute(query, params or ()).fetchall()
+        
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
+            return self.engine.submit_read(run).result()
         except Exception as e:
             logger.error(f"Local query failed: {e}")
             return []
@@ -351,9 +511,14 @@ class BaseStorage:
             logger.error(f"Network query failed: {e}")
             return []
     
-    async def process_sync_queue(self, batch_size: int = 100) -> int:
+    async def process_sync_queue(self, batch_size: Optional[int] = None) -> int:
         """
-        Process queued sync operations.
+        Ship one page of queued sync operations to HTPC.
+        
+        The page is sent through /relay/batch in a single request and rows
+        are deleted only after the relay acknowledges them. On failure every
+        row in the page has its retry_count bumped; rows that reach
+        max_retry_count are moved to the dead-letter table.
         
         Args:
             batch_size: Maximum number of records to process
@@ -361,56 +526,171 @@ class BaseStorage:
         Returns:
             Number of records successfully synced
         """
-        if not self.enable_htpc:
+        if not self.enable_htpc or self.http_client is None:
             return 0
         
-        cursor = self.conn.cursor()
-        cursor.execute(f"""
-            SELECT id, table_name, operation, data 
-            FROM {self.sync_queue_table}
-            WHERE retry_count < 5
-            ORDER BY queued_at ASC
-            LIMIT ?
-        """, (batch_size,))
+        batch_size = batch_size or self.sync_batch_size
         
-        records = cursor.fetchall()
-        if not records:
-            return 0
+        def fetch_page(conn: sqlite3.Connection) -> List[Tuple]:
+            return conn.execute(f"""
+                SELECT id, table_name, operation, data 
+                FROM {self.sync_queue_table}
+                WHERE retry_count < ?
+                ORDER BY id ASC
+                LIMIT ?
+            """, (self.max_retry_count, batch_size)).fetchall()
         
-        success_count = 0
+        rows = await self.engine.read(fetch_page)
+        if not rows:
+            return 0
         
-        for record_id, table, operation, data_json in records:
+        ids = []
+        records = []
+        for record_id, table, operation, data_json in rows:
             try:
                 data = json.loads(data_json)
-                await self._write_htpc(table, data, operation)
-                
-                # Remove from queue on success
-                self.conn.execute(
-                    f"DELETE FROM {self.sync_queue_table} WHERE id = ?",
-                    (record_id,)
+            except ValueError as e:
+                # Unparseable rows can never succeed, skip straight to dead-letter
+                logger.error(f"Sync queue record {record_id} is corrupt: {e}")
+                await self.engine.write(
+                    partial(self._dead_letter_rows, [record_id], f"corrupt payload: {e}")
                 )
-                self.conn.commit()
-                success_count += 1
-                
-            except Exception as e:
-                logger.error(f"Sync queue processing failed for record {record_id}: {e}")
-                # Increment retry count
-                self.conn.execute(
+                continue
+            ids.append(record_id)
+            records.append({"table": table, "operation": operation, "data": data})
+        
+        if not records:
+            return 0
+        
+        placeholders = ",".join("?" * len(ids))
+        
+        try:
+            await self._post_batch(records)
+        except Exception as e:
+            self._sync_failures += 1
+            logger.warning(f"Sync queue batch of {len(ids)} failed (attempt streak {self._sync_failures}): {e}")
+            
+            def record_failure(conn: sqlite3.Connection) -> int:
+                conn.execute(
                     f"""UPDATE {self.sync_queue_table} 
                         SET retry_count = retry_count + 1 
-                        WHERE id = ?""",
-                    (record_id,)
+                        WHERE id IN ({placeholders})""",
+                    ids
                 )
-                self.conn.commit()
+                exhausted = [
+                    row[0] for row in conn.execute(
+                        f"""SELECT id FROM {self.sync_queue_table}
+                            WHERE id IN ({placeholders}) AND retry_count >= ?""",
+                        (*ids, self.max_retry_count)
+                    )
+                ]
+                if exhausted:
+                    self._dead_letter_rows(exhausted, str(e), conn)
+                return len(exhausted)
+            
+            try:
+                exhausted = await self.engine.write(record_failure)
+                if exhausted:
+                    logger.warning(f"Moved {exhausted} sync records to dead-letter: {e}")
+            except Exception as db_error:
+                logger.error(f"Failed to record sync failure: {db_error}")
+            return 0
+        
+        self._sync_failures = 0
+        
+        def delete_acked(conn: sqlite3.Connection):
+            conn.execute(
+                f"DELETE FROM {self.sync_queue_table} WHERE id IN ({placeholders})",
+                ids
+            )
+        
+        await self.engine.write(delete_acked)
         
-        logger.info(f"Processed {success_count}/{len(records)} queued records")
-        return success_count
+        logger.info(f"Synced {len(ids)} queued records to HTPC")
+        return len(ids)
+    
+    def _dead_letter_rows(self, ids: List[int], error: str, conn: sqlite3.Connection):
+        """Engine write job moving sync queue rows to the dead-letter table"""
+        placeholders = ",".join("?" * len(ids))
+        conn.execute(
+            f"""INSERT OR REPLACE INTO {self.dead_letter_table}
+                (id, table_name, operation, data, queued_at, retry_count, last_error)
+                SELECT id, table_name, operation, data, queued_at, retry_count, ?
+                FROM {self.sync_queue_table} WHERE id IN ({placeholders})""",
+            (error, *ids)
+        )
+        conn.execute(
+            f"DELETE FROM {self.sync_queue_table} WHERE id IN ({placeholders})",
+            ids
+        )
+    
+    def _next_sync_delay(self, synced: int, batch_size: int) -> float:
+        """Seconds to wait before the next drain pass"""
+        if self._sync_failures:
+            # Exponential backoff with full jitter
+            cap = min(
+                self.sync_backoff_max,
+                self.sync_backoff_base * (2 ** (self._sync_failures - 1))
+            )
+            return random.uniform(0, cap)
+        if synced >= batch_size:
+            # Full page shipped, there is probably more waiting
+            return 0.0
+        return self.sync_interval
+    
+    async def _sync_drain_loop(self):
+        """Drain the sync queue page by page until cancelled"""
+        logger.info(f"Sync drainer started for {self.agent_id}")
+        while True:
+            try:
+                synced = await self.process_sync_queue(self.sync_batch_size)
+                delay = self._next_sync_delay(synced, self.sync_batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Sync drainer error for {self.agent_id}: {e}")
+                self._sync_failures += 1
+                delay = self._next_sync_delay(0, self.sync_batch_size)
+            await asyncio.sleep(delay)
+    
+    def start_sync_drainer(self) -> Optional[asyncio.Task]:
+        """
+        Start the background sync queue drainer on the running event loop.
+        
+        Returns:
+            The drainer task, or None if HTPC sync is disabled
+        """
+        if not self.enable_htpc:
+            return None
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.get_running_loop().create_task(self._sync_drain_loop())
+        return self._sync_task
+    
+    async def stop_sync_drainer(self):
+        """Stop the background sync queue drainer"""
+        if self._sync_task is None:
+            return
+        self._sync_task.cancel()
+        try:
+            await self._sync_task
+        except asyncio.CancelledError:
+            pass
+        self._sync_task = None
+        logger.info(f"Sync drainer stopped for {self.agent_id}")
+    
+    def _count_rows(self, table: str) -> int:
+        """Count rows in a table through the reader pool"""
+        def run(conn: sqlite3.Connection) -> int:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return self.engine.submit_read(run).result()
     
     def get_sync_queue_size(self) -> int:
         """Get number of records waiting for sync"""
-        cursor = self.conn.cursor()
-        cursor.execute(f"SELECT COUNT(*) FROM {self.sync_queue_table}")
-        return cursor.fetchone()[0]
+        return self._count_rows(self.sync_queue_table)
+    
+    def get_dead_letter_size(self) -> int:
+        """Get number of records that exhausted their sync retries"""
+        return self._count_rows(self.dead_letter_table)
     
     def health_check(self) -> Dict[str, Any]:
         """
@@ -424,20 +704,23 @@ class BaseStorage:
             "local_db": False,
             "htpc_enabled": self.enable_htpc,
             "sync_queue_size": 0,
+            "dead_letter_size": 0,
+            "engine": {},
             "timestamp": datetime.utcnow().isoformat()
         }
         
         # Check local database
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT 1")
+            self.engine.submit_read(lambda conn: conn.execute("SELECT 1").fetchone()).result()
             health["local_db"] = True
+            health["engine"] = self.engine.stats()
         except Exception as e:
             logger.error(f"Local DB health check failed: {e}")
         
         # Check sync queue
         try:
             health["sync_queue_size"] = self.get_sync_queue_size()
+            health["dead_letter_size"] = self.get_dead_letter_size()
         except Exception as e:
             logger.error(f"Sync queue check failed: {e}")
         
@@ -445,8 +728,11 @@ class BaseStorage:
     
     async def close(self):
         """Close storage connections"""
-        if self.conn:
-            self.conn.close()
+        await self.stop_sync_drainer()
+        
+        if self.engine:
+            # Drains queued writes before closing the connections
+            self.engine.close()
             logger.info("Local database connection closed")
         
         if self.http_client:
@@ -459,5 +745,5 @@ class BaseStorage:
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit"""
-        if self.conn:
-            self.conn.close()
+        if self.engine:
+            self.engine.close()
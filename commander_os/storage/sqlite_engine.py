@@ -0,0 +1,298 @@
+"""
+SQLite Execution Engine for Commander OS Storage
+
+Keeps blocking sqlite3 calls off the asyncio event loop:
+- One writer thread owns the write connection and group-commits jobs
+- A small pool of read-only WAL connections serves queries
+- Queue-depth and latency counters expose saturation
+"""
+
+import sqlite3
+import asyncio
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on the write queue to stop the writer thread
+_STOP = object()
+
+
+def open_connection(db_path: Path, read_only: bool = False) -> sqlite3.Connection:
+    """
+    Open a SQLite connection with the storage PRAGMAs applied.
+
+    Args:
+        db_path: Path to the database file
+        read_only: Open through a read-only URI (for the reader pool)
+
+    Returns:
+        Configured sqlite3 connection
+    """
+    if read_only:
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30.0)
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30.0)
+        # Enable WAL mode for better concurrency
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+    conn.execute("PRAGMA cache_size=-64000")  # 64MB cache
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+class _LatencyCounter:
+    """Running count / average / max of operation latencies"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms
+        }
+
+
+class SQLiteEngine:
+    """
+    Single-writer, multi-reader executor for one SQLite database.
+
+    Write jobs are callables taking the writer connection. The writer
+    thread collects jobs for up to `commit_window` seconds (or
+    `commit_max_rows` jobs), runs each inside its own savepoint and
+    commits the group once, resolving every job's future when the
+    commit lands. Read jobs run on read-only connections, one per
+    pool thread.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        read_pool_size: int = 2,
+        commit_window: float = 0.005,
+        commit_max_rows: int = 256
+    ):
+        """
+        Initialize the engine and start its writer thread.
+
+        Args:
+            db_path: Path to the database file
+            read_pool_size: Number of read-only connections/threads
+            commit_window: Seconds to wait for more writes before committing
+            commit_max_rows: Maximum jobs per group commit
+        """
+        self.db_path = Path(db_path)
+        self.commit_window = commit_window
+        self.commit_max_rows = max(1, commit_max_rows)
+
+        # Writer connection, owned by the writer thread once started
+        self.conn = open_connection(self.db_path)
+
+        self._write_queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name=f"sqlite-writer-{self.db_path.stem}",
+            daemon=True
+        )
+
+        self._readers = ThreadPoolExecutor(
+            max_workers=max(1, read_pool_size),
+            thread_name_prefix=f"sqlite-reader-{self.db_path.stem}"
+        )
+        self._reader_local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+
+        self._stats_lock = threading.Lock()
+        self._pending_reads = 0
+        self._write_latency = _LatencyCounter()
+        self._read_latency = _LatencyCounter()
+        self._commits = 0
+        self._closed = False
+
+        self._writer.start()
+        logger.info(f"SQLite engine started for {self.db_path} ({read_pool_size} readers)")
+
+    # ===========================
+    # Writes
+    # ===========================
+
+    def submit_write(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """
+        Queue a write job for the writer thread.
+
+        Args:
+            fn: Callable receiving the writer connection; must not commit
+
+        Returns:
+            Future resolved with fn's result once its group is committed
+        """
+        if self._closed:
+            raise RuntimeError(f"SQLite engine for {self.db_path} is closed")
+        future: Future = Future()
+        self._write_queue.put((fn, future, time.perf_counter()))
+        return future
+
+    async def write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run a write job and await its commit"""
+        return await asyncio.wrap_future(self.submit_write(fn))
+
+    def _writer_loop(self):
+        """Collect write jobs into groups and commit each group once"""
+        stopping = False
+        while not stopping:
+            job = self._write_queue.get()
+            if job is _STOP:
+                break
+
+            batch = [job]
+            deadline = time.perf_counter() + self.commit_window
+            while len(batch) < self.commit_max_rows:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        job = self._write_queue.get(timeout=remaining)
+                    else:
+                        job = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stopping = True
+                    break
+                batch.append(job)
+
+            self._commit_group(batch)
+
+    def _commit_group(self, batch: List[Tuple[Callable, Future, float]]):
+        """Run a group of write jobs in one transaction"""
+        outcomes: List[Tuple[bool, Any]] = []
+        try:
+            if not self.conn.in_transaction:
+                self.conn.execute("BEGIN")
+            for fn, _, _ in batch:
+                # Savepoint per job so one failure doesn't sink the group
+                self.conn.execute("SAVEPOINT engine_job")
+                try:
+                    result = fn(self.conn)
+                    self.conn.execute("RELEASE engine_job")
+                    outcomes.append((True, result))
+                except Exception as e:
+                    self.conn.execute("ROLLBACK TO engine_job")
+                    self.conn.execute("RELEASE engine_job")
+                    outcomes.append((False, e))
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} writes failed: {e}")
+            try:
+                self.conn.rollback()
+            except Exception:
+                pass
+            outcomes = [(False, e)] * len(batch)
+
+        now = time.perf_counter()
+        with self._stats_lock:
+            self._commits += 1
+            for _, _, enqueued in batch:
+                self._write_latency.record((now - enqueued) * 1000.0)
+
+        for (_, future, _), (ok, value) in zip(batch, outcomes):
+            if future.set_running_or_notify_cancel():
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    # ===========================
+    # Reads
+    # ===========================
+
+    def submit_read(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """
+        Queue a read job on the reader pool.
+
+        Args:
+            fn: Callable receiving a read-only connection
+
+        Returns:
+            Future resolved with fn's result
+        """
+        if self._closed:
+            raise RuntimeError(f"SQLite engine for {self.db_path} is closed")
+        with self._stats_lock:
+            self._pending_reads += 1
+        return self._readers.submit(self._run_read, fn, time.perf_counter())
+
+    async def read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run a read job and await its result"""
+        return await asyncio.wrap_future(self.submit_read(fn))
+
+    def _run_read(self, fn: Callable[[sqlite3.Connection], Any], enqueued: float) -> Any:
+        """Execute a read job on this pool thread's connection"""
+        try:
+            conn = getattr(self._reader_local, "conn", None)
+            if conn is None:
+                conn = open_connection(self.db_path, read_only=True)
+                self._reader_local.conn = conn
+                with self._stats_lock:
+                    self._read_conns.append(conn)
+            return fn(conn)
+        finally:
+            with self._stats_lock:
+                self._pending_reads -= 1
+                self._read_latency.record((time.perf_counter() - enqueued) * 1000.0)
+
+    # ===========================
+    # Introspection / Lifecycle
+    # ===========================
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depths and latency counters for saturation monitoring"""
+        with self._stats_lock:
+            return {
+                "write_queue_depth": self._write_queue.qsize(),
+                "read_queue_depth": self._pending_reads,
+                "commits": self._commits,
+                "writes": self._write_latency.to_dict(),
+                "reads": self._read_latency.to_dict()
+            }
+
+    def close(self, timeout: float = 5.0):
+        """Drain pending writes, stop all threads and close connections"""
+        if self._closed:
+            return
+        self._closed = True
+
+        self._write_queue.put(_STOP)
+        self._writer.join(timeout=timeout)
+        self._readers.shutdown(wait=True)
+
+        with self._stats_lock:
+            read_conns, self._read_conns = self._read_conns, []
+        for conn in read_conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        logger.info(f"SQLite engine closed for {self.db_path}")
@@ -6,6 +6,10 @@ Usage:
   python main.py hub           # Start the Central Intelligence Relay (HTPC)
   python main.py engine        # Start the Local Compute Engine (Local Service)
   python main.py war-room      # Launch the Strategic Dashboard (TUI)
+  python main.py memory-compact  # Retrain the message codec and re-encode the archive
+  python main.py memory-dedup    # One-off removal of duplicate messages (strict dedup)
+  python main.py memory-prune    # Archive and delete messages past the retention window
+  python main.py memory-export   # Stream messages to an NDJSON file
 """
 
 import click
@@ -76,6 +80,88 @@ def war_room(node):
     except KeyboardInterrupt:
         sm.stop_system()
 
+@cli.command(name="memory-compact")
+@click.option('--db', default=None, help='Database URL (default: COMMANDER_DB_URL).')
+@click.option('--codec', type=click.Choice(['zlib', 'zstd']), default=None, help='Codec to train for.')
+@click.option('--samples', default=2000, help='Recent messages to train the dictionary on.')
+@click.option('--no-train', is_flag=True, help='Re-encode with the current dictionary only.')
+def memory_compact(db, codec, samples, no_train):
+    """(MAINTENANCE) Train a compression dictionary and re-encode stored messages."""
+    from commander_os.core.memory import MessageStore
+
+    db = db or os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
+    store = MessageStore(db, codec=codec)
+    try:
+        if not no_train:
+            dict_id = store.train_dictionary(codec=codec, sample_limit=samples)
+            click.echo(f"[MEMORY] Trained {store.codec.codec} dictionary {dict_id}")
+        stats = store.reencode_archive()
+        click.echo(
+            f"[MEMORY] Re-encoded {stats['reencoded']} of {stats['scanned']} messages: "
+            f"{stats['bytes_before']} -> {stats['bytes_after']} bytes"
+        )
+    except ValueError as e:
+        click.echo(f"[ERROR] {e}")
+    finally:
+        store.close()
+
+@cli.command(name="memory-dedup")
+@click.option('--db', default=None, help='Database URL (default: COMMANDER_DB_URL).')
+@click.option('--batch-size', default=1000, help='Rows per migration transaction.')
+def memory_dedup(db, batch_size):
+    """(MAINTENANCE) Remove duplicate messages and key the rest for strict dedup."""
+    from commander_os.core.memory import MessageStore
+
+    db = db or os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
+    store = MessageStore(db, dedup=True)
+    try:
+        stats = store.deduplicate_archive(batch_size=batch_size)
+        click.echo(f"[MEMORY] Removed {stats['removed']} duplicates from {stats['scanned']} messages")
+    finally:
+        store.close()
+
+@cli.command(name="memory-prune")
+@click.option('--db', default=None, help='Database URL (default: COMMANDER_DB_URL).')
+@click.option('--days', default=30.0, help='Keep messages newer than this many days.')
+@click.option('--archive-dir', default=None, help='Archive segment directory (default: COMMANDER_ARCHIVE_DIR; none = delete only).')
+@click.option('--chunk-size', default=500, help='Messages per retention transaction.')
+def memory_prune(db, days, archive_dir, chunk_size):
+    """(MAINTENANCE) Move aged-out messages to the archive in small chunks."""
+    from commander_os.core.memory import MessageStore
+
+    db = db or os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
+    archive_dir = archive_dir or os.getenv("COMMANDER_ARCHIVE_DIR") or None
+    store = MessageStore(db, archive_dir=archive_dir)
+    try:
+        stats = store.apply_retention(days, chunk_size=chunk_size)
+        click.echo(f"[MEMORY] Archived {stats['archived']}, deleted {stats['deleted']} messages "
+                   f"in {stats['chunks']} chunks")
+    finally:
+        store.close()
+
+@cli.command(name="memory-export")
+@click.option('--db', default=None, help='Database URL (default: COMMANDER_DB_URL).')
+@click.option('--out', required=True, type=click.Path(dir_okay=False), help='NDJSON file to write.')
+@click.option('--task', default=None, help='Only messages of this task.')
+@click.option('--since', default=None, type=float, help='Only messages at or after this Unix timestamp.')
+@click.option('--before', default=None, type=float, help='Only messages older than this Unix timestamp.')
+def memory_export(db, out, task, since, before):
+    """(MAINTENANCE) Stream messages, oldest first, to an NDJSON file."""
+    from commander_os.core.memory import MessageStore, ndjson_chunks
+
+    db = db or os.getenv("COMMANDER_DB_URL", "sqlite:///commander_memory.db")
+    store = MessageStore(db)
+    try:
+        count = 0
+        messages = store.export_messages(task_id=task, since_ts=since, before_ts=before)
+        with open(out, "wb") as f:
+            for chunk in ndjson_chunks(messages):
+                f.write(chunk)
+                count += chunk.count(b"\n")  # one line per message
+        click.echo(f"[MEMORY] Exported {count} messages to {out}")
+    finally:
+        store.close()
+
 @cli.command(name="commander-gui-dashboard")
 @click.option('--host', default='127.0.0.1', help='Host to bind API.')
 @click.option('--port', default=8000, help='Port to bind API.')
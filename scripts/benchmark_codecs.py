@@ -0,0 +1,137 @@
+"""
+The-Commander: Message Codec Benchmark
+Compares stored size and encode/decode CPU of the message codecs on a
+corpus shaped like real cluster traffic (relay envelopes, command
+responses, agent chatter and the occasional long model output).
+
+Usage:
+  python scripts/benchmark_codecs.py                  # synthetic corpus
+  python scripts/benchmark_codecs.py --db sqlite:///commander_memory.db
+  python scripts/benchmark_codecs.py --count 20000 --threshold 96
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commander_os.core import codecs  # noqa: E402
+from commander_os.core.protocol import CommanderProtocol, MessageType, MessageEnvelope, PriorityLevel  # noqa: E402
+
+NODES = ["Gillsystems-Main", "Gillsystems-HTPC", "Gillsystems-Laptop", "Gillsystems-Steam-Deck"]
+ROLES = ["commander", "coder", "reviewer", "researcher", "tester"]
+COMMANDS = ["node.status", "agent.spawn", "agent.stop", "task.assign", "model.load", "storage.sync"]
+WORDS = (
+    "relay node agent task model context token queue batch latency commit shard route "
+    "deploy review patch test failure retry timeout worker engine cluster memory index"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def build_corpus(count: int, seed: int = 7) -> List[bytes]:
+    """Synthetic traffic: mostly short JSON envelopes, some prose, a few long outputs."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        kind = rng.random()
+        sender, recipient = rng.sample(NODES, 2)
+        if kind < 0.45:
+            env = CommanderProtocol.create_command(
+                sender, recipient, rng.choice(COMMANDS),
+                {"agent_id": f"{rng.choice(ROLES)}-{rng.randint(1, 40)}", "retries": rng.randint(0, 3)},
+                task_id=f"task-{rng.randint(1, 500)}"
+            )
+            corpus.append(env.model_dump_json().encode())
+        elif kind < 0.75:
+            env = MessageEnvelope(
+                msg_type=MessageType.RESPONSE, sender_id=sender, recipient_id=recipient,
+                task_id=f"task-{rng.randint(1, 500)}", priority=rng.choice(list(PriorityLevel)),
+                payload={"status": rng.choice(["success", "error", "pending"]),
+                         "data": {"vram_used_mb": rng.randint(0, 24000), "tokens_per_sec": round(rng.uniform(5, 90), 1)}}
+            )
+            corpus.append(env.model_dump_json().encode())
+        elif kind < 0.97:
+            corpus.append(_sentence(rng, rng.randint(4, 40)).encode())
+        else:
+            body = "\n".join(_sentence(rng, rng.randint(8, 30)) for _ in range(rng.randint(20, 120)))
+            corpus.append(f"```python\n# generated by {rng.choice(ROLES)}\n{body}\n```".encode())
+    return corpus
+
+
+def load_corpus(db_url: str, count: int) -> List[bytes]:
+    """Most recent messages of an existing MessageStore."""
+    from commander_os.core.memory import MessageStore
+    store = MessageStore(db_url)
+    try:
+        return [record['content'].encode() for record in store.query_messages(limit=count, fields=['content'])]
+    finally:
+        store.close()
+
+
+def measure(corpus: List[bytes],
+            encoder: Callable[[bytes], Tuple[bytes, str, Optional[int]]]) -> Tuple[int, float, float]:
+    """Total stored bytes, encode and decode microseconds per message."""
+    start = time.perf_counter()
+    encoded = [encoder(data) for data in corpus]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for blob, codec, dict_id in encoded:
+        codecs.decode(blob, codec, dict_id)
+    decode_s = time.perf_counter() - start
+
+    total = sum(len(blob) for blob, _, _ in encoded)
+    return total, encode_s * 1e6 / len(corpus), decode_s * 1e6 / len(corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="MessageStore URL to sample instead of the synthetic corpus")
+    parser.add_argument("--count", type=int, default=10000, help="Messages in the corpus")
+    parser.add_argument("--threshold", type=int, default=codecs.DEFAULT_RAW_THRESHOLD,
+                        help="Raw-storage threshold in bytes")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.db, args.count) if args.db else build_corpus(args.count)
+    if not corpus:
+        sys.exit("Corpus is empty")
+    # Train on one half, measure on the other, like a dictionary trained last week
+    train, test = corpus[::2], corpus[1::2]
+    raw_total = sum(len(data) for data in test)
+
+    def policy(*codec_args, **codec_kwargs):
+        content_codec = codecs.ContentCodec(*codec_args, **codec_kwargs)
+        return lambda data: content_codec.encode(data.decode())
+
+    candidates = [
+        ("none", lambda data: (data, codecs.CODEC_NONE, None)),
+        ("gzip (legacy)", lambda data: (codecs.encode(data, codecs.CODEC_GZIP), codecs.CODEC_GZIP, None)),
+        ("zlib", policy(codecs.CODEC_ZLIB, raw_threshold=0)),
+    ]
+    zlib_dict = codecs.register_dictionary(codecs.train_dictionary(train, codecs.CODEC_ZLIB))
+    candidates.append(("zlib+dict", policy(codecs.CODEC_ZLIB, zlib_dict, raw_threshold=0)))
+    candidates.append((f"zlib+dict, raw<{args.threshold}", policy(codecs.CODEC_ZLIB, zlib_dict, args.threshold)))
+    if codecs.zstd_available():
+        zstd_dict = codecs.register_dictionary(codecs.train_dictionary(train, codecs.CODEC_ZSTD))
+        candidates.append(("zstd", policy(codecs.CODEC_ZSTD, raw_threshold=0)))
+        candidates.append(("zstd+dict", policy(codecs.CODEC_ZSTD, zstd_dict, raw_threshold=0)))
+        candidates.append((f"zstd+dict, raw<{args.threshold}", policy(codecs.CODEC_ZSTD, zstd_dict, args.threshold)))
+    else:
+        print("(zstandard not installed: zstd rows skipped)")
+
+    print(f"{len(test)} messages, {raw_total} bytes raw, median {sorted(map(len, test))[len(test) // 2]} bytes\n")
+    print(f"{'codec':<28}{'bytes':>12}{'ratio':>8}{'enc us/msg':>12}{'dec us/msg':>12}")
+    for name, encoder in candidates:
+        total, enc_us, dec_us = measure(test, encoder)
+        print(f"{name:<28}{total:>12}{total / raw_total:>8.3f}{enc_us:>12.2f}{dec_us:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+The-Commander: State Read Contention Benchmark
+Measures StateManager read throughput with many reader threads (FastAPI
+handlers, broadcaster, TUI) while telemetry-style writers update node
+metrics, and compares the lock-free snapshot read path with reads that
+go through the writer lock (the pre-snapshot behaviour). Also times
+full-snapshot serialization: json.dumps of get_full_snapshot() (what
+the broadcaster did per tick) against the cached-fragment bytes.
+
+Usage:
+  python scripts/benchmark_state.py
+  python scripts/benchmark_state.py --readers 32 --nodes 16 --agents 64 --seconds 3
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commander_os.core.state import StateManager, ComponentStatus  # noqa: E402
+
+
+def build_state(nodes: int, agents: int) -> StateManager:
+    sm = StateManager()
+    for n in range(nodes):
+        sm.register_node(f"node-{n}", f"10.0.0.{n + 1}", 8000 + n)
+        sm.update_node_status(f"node-{n}", ComponentStatus.READY)
+    for a in range(agents):
+        sm.register_agent(f"agent-{a}", f"node-{a % nodes}", random.choice(["coder", "reviewer", "tester"]))
+    return sm
+
+
+def run(sm: StateManager, read: Callable[[], object], readers: int, writers: int,
+        seconds: float) -> Dict[str, float]:
+    """Reads/s across all readers and writer latency while they run."""
+    stop = threading.Event()
+    reads: List[int] = [0] * readers
+    write_ms: List[float] = []
+    node_ids = [node.node_id for node in sm.get_all_nodes()]
+
+    def reader(slot: int):
+        count = 0
+        while not stop.is_set():
+            read()
+            count += 1
+        reads[slot] = count
+
+    def writer():
+        rng = random.Random()
+        while not stop.is_set():
+            start = time.perf_counter()
+            sm.update_node_metrics(rng.choice(node_ids), {"tps": rng.uniform(0, 130), "load": rng.uniform(0, 100)})
+            write_ms.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    write_ms.sort()
+    return {
+        "reads_per_s": sum(reads) / seconds,
+        "writes": len(write_ms),
+        "write_p50_ms": write_ms[len(write_ms) // 2] if write_ms else 0.0,
+        "write_p99_ms": write_ms[int(len(write_ms) * 0.99)] if write_ms else 0.0,
+    }
+
+
+def serialize(sm: StateManager, rounds: int = 200) -> Dict[str, float]:
+    """ms per full snapshot, one node metric update between snapshots (as telemetry does)."""
+    node_ids = [node.node_id for node in sm.get_all_nodes()]
+    results = {}
+    for name, encode in (("json.dumps", lambda: json.dumps(sm.get_full_snapshot()).encode()),
+                         ("fragments", sm.get_full_snapshot_json)):
+        start = time.perf_counter()
+        for i in range(rounds):
+            sm.update_node_metrics(node_ids[i % len(node_ids)], {"tps": float(i)})
+            encode()
+        results[name] = (time.perf_counter() - start) * 1000 / rounds
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--nodes", type=int, default=8)
+    parser.add_argument("--agents", type=int, default=40)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    sm = build_state(args.nodes, args.agents)
+    node_ids = [node.node_id for node in sm.get_all_nodes()]
+
+    def snapshot_reads():
+        sm.get_node(random.choice(node_ids))
+        sm.get_full_snapshot()
+
+    def locked_reads():
+        # Every getter holding the global lock, as before copy-on-write
+        with sm._lock:
+            sm.get_node(random.choice(node_ids))
+            sm.get_full_snapshot()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.nodes} nodes, "
+          f"{args.agents} agents, {args.seconds:.1f}s per run")
+    print(f"{'read path':<12} {'reads/s':>12} {'writes':>8} {'write p50':>10} {'write p99':>10}")
+    for name, read in (("locked", locked_reads), ("snapshot", snapshot_reads)):
+        stats = run(sm, read, args.readers, args.writers, args.seconds)
+        print(f"{name:<12} {stats['reads_per_s']:>12,.0f} {stats['writes']:>8} "
+              f"{stats['write_p50_ms']:>8.3f}ms {stats['write_p99_ms']:>8.3f}ms")
+
+    print(f"\n{'serialize':<12} {'ms/snapshot':>12}")
+    for name, ms in serialize(sm).items():
+        print(f"{name:<12} {ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -164,3 +164,59 @@ def complete_config_dir(temp_dir, sample_relay_config, sample_roles_config, samp
         yaml.dump(sample_agent_config, f)
     
     return config_dir
+
+
+class _StandInEngine:
+    """Minimal llama.cpp server double: /tokenize splits words and punctuation, /completion echoes."""
+
+    def __init__(self):
+        import json
+        import re
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        engine = self
+        self.tokenize_calls = 0
+        self.completions = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+                if self.path == "/tokenize":
+                    engine.tokenize_calls += 1
+                    tokens = list(range(len(re.findall(r"\w+|[^\w\s]", body["content"]))))
+                    reply = {"tokens": tokens}
+                elif self.path == "/completion":
+                    engine.completions.append(body)
+                    reply = {"content": "acknowledged"}
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stand_in_engine():
+    """Local HTTP server standing in for a node's llama.cpp engine."""
+    engine = _StandInEngine()
+    yield engine
+    engine.close()
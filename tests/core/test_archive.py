@@ -0,0 +1,110 @@
+"""
+Test Suite: Message Archive
+Tests for commander_os.core.archive and tiered retention in MessageStore
+
+Run with: pytest tests/core/test_archive.py -v
+"""
+
+import json
+import time
+
+import pytest
+
+from commander_os.core.archive import MessageArchive
+from commander_os.core.memory import MessageStore
+
+DAY = 86400.0
+
+
+def _record(i: int, timestamp: float, task_id: str = "t") -> dict:
+    return {
+        "id": i, "timestamp": timestamp, "task_id": task_id, "sender": f"s{i % 3}",
+        "recipient": json.dumps(["r"]), "role": "user", "iteration": 0,
+        "content": f"message {i}", "metadata_json": None, "content_hash": str(i)
+    }
+
+
+@pytest.fixture
+def archived_store(tmp_path):
+    """Store with 200 messages 40-60 days old and 20 from today, archived at 30 days."""
+    store = MessageStore(f"sqlite:///{tmp_path}/hot.db", archive_dir=str(tmp_path / "archive"))
+    now = time.time()
+    store.log_messages_bulk([
+        dict(task_id="t" if i % 2 else "u", sender="a", recipient="b", role="user", content=f"old {i}")
+        for i in range(200)
+    ])
+    # Backdate the bulk rows across 20 days, oldest first
+    with store.engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE messages SET timestamp = ? - (60 - (id - 1) / 10.0) * ?", (now, DAY))
+    for i in range(20):
+        store.log_message(task_id="t", sender="a", recipient="b", role="user", content=f"new {i}")
+    yield store
+    store.close()
+
+
+class TestMessageArchive:
+    """Tests for segment layout, sparse indexes and archive queries."""
+
+    def test_segments_are_date_partitioned_and_queried_by_block(self, tmp_path):
+        archive = MessageArchive(str(tmp_path), block_records=16)
+        assert archive.write(_record(i, 1_700_000_000 + i * 3600, "t" if i < 50 else "u") for i in range(100)) == 100
+        days = sorted(p.name for p in tmp_path.iterdir())
+        assert days[0] == "2023-11-14" and days[-1] == "2023-11-19"
+        index = json.loads(next(tmp_path.glob("*/*.idx")).read_text())
+        assert index["blocks"] and index["count"] == sum(b[2] for b in index["blocks"])
+
+        newest = archive.query(limit=5)
+        assert [r["id"] for r in newest] == [99, 98, 97, 96, 95]
+        page = archive.query(task_id="t", ascending=True, limit=10, key=(newest[0]["timestamp"], 0))
+        assert page == []
+        page = archive.query(task_id="t", ascending=True, limit=10, since_ts=1_700_000_000 + 10 * 3600)
+        assert [r["id"] for r in page] == list(range(10, 20))
+
+        # Indexes reload from disk; a segment without an index was never published
+        (tmp_path / days[0] / "seg-1-2-0.ndz").write_bytes(b"partial")
+        assert MessageArchive(str(tmp_path)).count == 100
+
+    def test_duplicate_export_is_read_once(self, tmp_path):
+        archive = MessageArchive(str(tmp_path))
+        records = [_record(i, 1_700_000_000 + i) for i in range(10)]
+        archive.write(records)
+        archive.write(records)
+        assert archive.count == 20
+        assert len(archive.query(limit=None)) == 10
+
+
+class TestTieredRetention:
+    """Tests for chunked retention and query fan-out across hot DB and archive."""
+
+    def test_retention_archives_in_chunks(self, archived_store):
+        stats = archived_store.apply_retention(days_keep=30, chunk_size=32, pause=0)
+        assert stats == {"archived": 200, "deleted": 200, "chunks": 7}
+        assert archived_store.archive.count == 200
+        with archived_store.engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT COUNT(*) FROM messages").scalar() == 20
+        assert archived_store.apply_retention(days_keep=30)["chunks"] == 0
+
+    def test_queries_fan_out_to_archive(self, archived_store):
+        archived_store.prune_archives(days_keep=30)
+
+        # The newest page is served from the hot DB alone
+        assert [m["content"] for m in archived_store.query_messages(limit=5)][0] == "new 19"
+
+        # Paging newest-first walks from the hot DB into the archive without gaps
+        seen, cursor = [], None
+        while True:
+            page = archived_store.query_messages(task_id="t", limit=30, cursor=cursor, fields=["content"])
+            seen += [m["content"] for m in page]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert len(seen) == 120 and seen[19] == "new 0" and seen[20] == "old 199" and seen[-1] == "old 1"
+
+        oldest = archived_store.query_messages(ascending=True, limit=3, preview_chars=3)
+        assert [m["content"] for m in oldest] == ["old", "old", "old"]
+        window = archived_store.query_messages(since_ts=time.time() - 55 * DAY, before_ts=time.time() - 50 * DAY,
+                                               limit=None)
+        assert len(window) == 50 and all(m["content"].startswith("old") for m in window)
+
+        # Polling for new rows never touches the archive
+        assert archived_store.query_messages(after_id=0, limit=None)[0]["content"] == "new 0"
@@ -0,0 +1,62 @@
+"""
+Test Suite: Async Memory Facade
+Tests for commander_os.core.async_memory
+
+Run with: pytest tests/core/test_async_memory.py -v
+"""
+
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from commander_os.core.async_memory import AsyncMessageStore
+from commander_os.core.memory import MessageStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    path = tmp_path / "async.db"
+    store = MessageStore(f"sqlite:///{path}")
+    memory = AsyncMessageStore(store, max_concurrency=2)
+    yield path, store, memory
+    memory.close()
+    store.close()
+
+
+class TestAsyncMessageStore:
+    """Tests for the awaitable MessageStore surface."""
+
+    @pytest.mark.asyncio
+    async def test_round_trip(self, stores):
+        _, _, memory = stores
+        msg_id = await memory.log_message(task_id="t", sender="a", recipient="b", role="user", content="hello")
+        await memory.log_messages_bulk([
+            dict(task_id="t", sender="b", recipient="a", role="assistant", content="hi there")
+        ])
+        page = await memory.query_messages(task_id="t", limit=1)
+        assert type(page[0]) is dict and page[0]["content"] == "hi there" and page.next_cursor
+        assert "a (user): hello" in await memory.get_recent_context("t")
+        assert await memory.delete_messages([msg_id]) == 1
+        assert memory.stats()["completed"] == 5 and memory.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_db_stall_does_not_block_loop(self, stores):
+        path, _, memory = stores
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute("BEGIN EXCLUSIVE")
+        try:
+            write = asyncio.create_task(
+                memory.log_message(task_id="t", sender="a", recipient="b", role="user", content="queued")
+            )
+            ticks = 0
+            deadline = time.monotonic() + 0.3
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+                ticks += 1
+            assert not write.done() and ticks >= 10
+        finally:
+            blocker.execute("ROLLBACK")
+            blocker.close()
+        assert await write > 0
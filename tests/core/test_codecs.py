@@ -0,0 +1,120 @@
+"""
+Test Suite: Message Codecs
+Tests for commander_os.core.codecs and codec handling in MessageStore
+
+Run with: pytest tests/core/test_codecs.py -v
+"""
+
+import gzip
+import json
+
+import pytest
+
+from commander_os.core import codecs
+from commander_os.core.codecs import CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD, ContentCodec
+from commander_os.core.memory import MessageStore, MessageModel
+
+
+def _envelope(i: int) -> str:
+    return json.dumps({
+        "msg_type": "command", "sender_id": "Gillsystems-Main", "recipient_id": "Gillsystems-HTPC",
+        "task_id": f"task-{i}", "priority": 2,
+        "payload": {"command": "node.status", "params": {"agent_id": f"coder-{i % 7}"}}
+    })
+
+
+@pytest.fixture
+def memory_store(tmp_path):
+    store = MessageStore(f"sqlite:///{tmp_path}/codecs.db")
+    yield store
+    store.close()
+
+
+class TestCodecs:
+    """Tests for the codec functions and ContentCodec policy."""
+
+    @pytest.mark.parametrize("codec", [CODEC_NONE, "gzip", CODEC_ZLIB])
+    def test_round_trip_and_prefix(self, codec):
+        data = ("é" + "status ok " * 200).encode()
+        blob = codecs.encode(data, codec)
+        assert codecs.decode(blob, codec) == data
+        assert codecs.decode_prefix(blob, codec, None, 12) == data[:12]
+
+    def test_small_messages_stored_raw(self):
+        policy = ContentCodec(CODEC_ZLIB, raw_threshold=64)
+        assert policy.encode("ack") == (b"ack", CODEC_NONE, None)
+        # Incompressible input never grows
+        blob, codec, _ = policy.encode("x9#Qz!" * 5 + "0123456789abcdef" * 2)
+        assert codec == CODEC_NONE or len(blob) < 62
+
+    def test_trained_zlib_dictionary(self):
+        samples = [_envelope(i).encode() for i in range(200)]
+        data = codecs.train_dictionary(samples, CODEC_ZLIB)
+        dict_id = codecs.register_dictionary(data)
+        assert dict_id == codecs.dictionary_id(data)
+
+        message = _envelope(999).encode()
+        plain = codecs.encode(message, CODEC_ZLIB)
+        primed = codecs.encode(message, CODEC_ZLIB, dict_id)
+        assert len(primed) < len(plain) < len(gzip.compress(message))
+        assert codecs.decode(primed, CODEC_ZLIB, dict_id) == message
+
+    def test_unknown_dictionary_and_codec(self):
+        with pytest.raises(KeyError):
+            ContentCodec(CODEC_ZLIB, dict_id=12345)
+        with pytest.raises(ValueError):
+            codecs.encode(b"x", "lz4")
+        with pytest.raises(ValueError):
+            codecs.train_dictionary([], CODEC_ZLIB)
+
+    @pytest.mark.skipif(not codecs.zstd_available(), reason="zstandard not installed")
+    def test_zstd_dictionary(self):
+        samples = [_envelope(i).encode() for i in range(500)]
+        dict_id = codecs.register_dictionary(codecs.train_dictionary(samples, CODEC_ZSTD))
+        message = _envelope(1234).encode()
+        blob = codecs.encode(message, CODEC_ZSTD, dict_id)
+        assert codecs.decode(blob, CODEC_ZSTD, dict_id) == message
+        assert codecs.decode_prefix(blob, CODEC_ZSTD, dict_id, 10) == message[:10]
+
+
+class TestStoreCodecs:
+    """Tests for codec columns, dictionary training and archive re-encoding."""
+
+    def test_rows_record_codec(self, memory_store):
+        short_id = memory_store.log_message(task_id="t", sender="a", recipient="b", role="r", content="ok")
+        long_id = memory_store.log_message(task_id="t", sender="a", recipient="b", role="r", content=_envelope(1) * 3)
+        with memory_store.engine.connect() as conn:
+            rows = dict(conn.exec_driver_sql("SELECT id, codec FROM messages").all())
+        assert rows == {short_id: CODEC_NONE, long_id: CODEC_ZLIB}
+        assert [m['content'] for m in memory_store.query_messages(ascending=True)] == ["ok", _envelope(1) * 3]
+
+    def test_train_and_reencode_archive(self, memory_store, tmp_path):
+        # A legacy gzip row written before codecs existed
+        session = memory_store.SessionLocal()
+        session.add(MessageModel(timestamp=1.0, task_id="old", sender="s", role="r",
+                                 content_blob=gzip.compress(_envelope(0).encode())))
+        session.commit()
+        session.close()
+        memory_store.log_messages_bulk([
+            dict(task_id="t", sender="a", recipient="b", role="r", content=_envelope(i)) for i in range(1, 300)
+        ])
+
+        dict_id = memory_store.train_dictionary(sample_limit=300)
+        assert memory_store.codec.dict_id == dict_id
+
+        stats = memory_store.reencode_archive(batch_size=64)
+        assert stats["scanned"] == 300 and stats["reencoded"] == 300
+        assert stats["bytes_after"] < stats["bytes_before"]
+        assert memory_store.reencode_archive()["reencoded"] == 0
+
+        contents = {m['id']: m['content'] for m in memory_store.query_messages(limit=None)}
+        assert _envelope(0) in contents.values() and _envelope(299) in contents.values()
+        assert len(memory_store.search_text("node")) == 20
+
+        # A new store on the same file picks the trained dictionary back up
+        reopened = MessageStore(f"sqlite:///{tmp_path}/codecs.db")
+        try:
+            assert reopened.codec.dict_id == dict_id
+            assert reopened.query_messages(task_id="old")[0]['content'] == _envelope(0)
+        finally:
+            reopened.close()
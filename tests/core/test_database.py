@@ -0,0 +1,85 @@
+"""
+Test Suite: Database Engines
+Tests for commander_os.core.database and MessageStore schema versioning
+
+Run with: pytest tests/core/test_database.py -v
+"""
+
+import os
+
+import pytest
+
+from commander_os.core import memory
+from commander_os.core.database import get_engine, open_engines, release_engine
+from commander_os.core.memory import SCHEMA_VERSION, MessageStore
+
+
+class TestEngineFactory:
+    """Tests for shared, tuned engines."""
+
+    def test_engine_shared_per_database(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        first = get_engine("sqlite:///shared.db")
+        second = get_engine(f"sqlite:///{tmp_path}/shared.db")
+        try:
+            assert first is second
+            assert open_engines()[f"sqlite:///{os.path.abspath('shared.db')}"] == 2
+            with first.connect() as conn:
+                pragmas = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                           for name in ("journal_mode", "synchronous", "busy_timeout", "mmap_size")}
+            assert pragmas == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000,
+                               "mmap_size": 256 * 1024 * 1024}
+        finally:
+            release_engine(second)
+        assert f"sqlite:///{os.path.abspath('shared.db')}" in open_engines()
+        release_engine(first)
+        assert f"sqlite:///{os.path.abspath('shared.db')}" not in open_engines()
+
+    def test_memory_databases_stay_private(self):
+        first, second = get_engine("sqlite://"), get_engine("sqlite://")
+        assert first is not second
+        with first.begin() as conn:
+            conn.exec_driver_sql("CREATE TABLE t (x)")
+        # StaticPool: later connections see the same in-memory database
+        with first.connect() as conn:
+            assert conn.exec_driver_sql("SELECT COUNT(*) FROM t").scalar() == 0
+        release_engine(first)
+        release_engine(second)
+
+
+class TestSchemaVersion:
+    """Tests for skipping schema DDL on current databases."""
+
+    def test_current_schema_skips_ddl(self, tmp_path, monkeypatch):
+        url = f"sqlite:///{tmp_path}/versioned.db"
+        store = MessageStore(url)
+        assert store._schema_version() == SCHEMA_VERSION
+
+        def fail(*args, **kwargs):
+            raise AssertionError("schema DDL ran on a current database")
+        monkeypatch.setattr(memory.Base.metadata, "create_all", fail)
+        reopened = MessageStore(url)
+        try:
+            assert reopened.engine is store.engine
+            reopened.log_message(task_id="t", sender="a", recipient="b", role="r", content="still works")
+            assert store.query_messages(task_id="t")[0]["content"] == "still works"
+        finally:
+            reopened.close()
+            store.close()
+
+    def test_newer_schema_is_not_downgraded(self, tmp_path, monkeypatch):
+        url = f"sqlite:///{tmp_path}/newer.db"
+        MessageStore(url).close()
+        store = MessageStore(url)
+        with store.engine.begin() as conn:
+            conn.exec_driver_sql(f"UPDATE store_meta SET value = '{SCHEMA_VERSION + 1}' WHERE key = 'schema_version'")
+        store.close()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("schema DDL ran on a newer database")
+        monkeypatch.setattr(memory.Base.metadata, "create_all", fail)
+        reopened = MessageStore(url)
+        try:
+            assert reopened._schema_version() == SCHEMA_VERSION + 1
+        finally:
+            reopened.close()
@@ -7,6 +7,7 @@ Run with: pytest tests/core/test_memory.py -v
 
 import pytest
 import os
+import threading
 from commander_os.core.memory import MessageStore
 
 @pytest.fixture
@@ -103,3 +104,334 @@ class TestMessageStore:
         
         left = memory_store.query_messages(task_id="old")
         assert len(left) == 0
+
+    def test_log_messages_bulk(self, memory_store):
+        """Test bulk logging returns ids in input order."""
+        ids = memory_store.log_messages_bulk([
+            {"task_id": "bulk", "sender": "a1", "recipient": "a2", "role": "r", "content": f"m{i}"}
+            for i in range(1200)
+        ])
+        assert len(ids) == 1200
+        assert ids == sorted(ids)
+
+        by_id = {m['id']: m['content'] for m in memory_store.query_messages(task_id="bulk", limit=None)}
+        assert by_id[ids[0]] == "m0"
+        assert by_id[ids[-1]] == "m1199"
+
+    def test_background_writer(self, memory_store):
+        """Test wait=False buffers rows and resolves id futures."""
+        futures = [
+            memory_store.log_message(task_id="bg", sender="a1", recipient="a2", role="r", content=f"m{i}", wait=False)
+            for i in range(20)
+        ]
+        assert memory_store.flush(timeout=5)
+
+        ids = [f.result(timeout=5) for f in futures]
+        assert len(set(ids)) == 20
+        assert len(memory_store.query_messages(task_id="bg", limit=None)) == 20
+        memory_store.close()
+
+
+class TestKeysetPagination:
+    """Tests for cursor-based query_messages paging."""
+
+    @pytest.fixture
+    def populated(self, memory_store):
+        ids = memory_store.log_messages_bulk([
+            {"task_id": "t", "sender": "a", "recipient": "b", "role": "r", "content": f"m{i}"}
+            for i in range(7)
+        ])
+        return memory_store, ids
+
+    def test_after_id_polling(self, populated):
+        """after_id returns only newer rows, oldest first."""
+        store, ids = populated
+        page = store.query_messages(after_id=ids[3])
+        assert [m['id'] for m in page] == ids[4:]
+        assert page.next_cursor is None
+        assert store.query_messages(after_id=ids[-1]) == []
+
+    def test_cursor_walks_history(self, populated):
+        """Following next_cursor visits every row once, newest first."""
+        store, ids = populated
+        seen, cursor = [], None
+        while True:
+            page = store.query_messages(task_id="t", limit=3, cursor=cursor)
+            seen.extend(m['id'] for m in page)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert seen == list(reversed(ids))
+
+    def test_before_ts_and_bad_cursor(self, populated):
+        """before_ts filters older rows; malformed cursors are rejected."""
+        store, ids = populated
+        assert store.query_messages(before_ts=0.0) == []
+        with pytest.raises(ValueError):
+            store.query_messages(cursor="garbage")
+
+
+class TestProjection:
+    """Tests for projected, lazily decoded query results."""
+
+    def test_fields_projection(self, memory_store):
+        """Only requested fields are exposed."""
+        memory_store.log_message(task_id="p", sender="a", recipient="b", role="r", content="hello")
+        (record,) = memory_store.query_messages(task_id="p", fields=["id", "sender"])
+        assert dict(record) == {"id": record["id"], "sender": "a"}
+        with pytest.raises(KeyError):
+            record["content"]
+        with pytest.raises(ValueError):
+            memory_store.query_messages(fields=["nope"])
+
+    def test_lazy_content_and_preview(self, memory_store):
+        """Content decodes on access; previews inflate only a prefix."""
+        from commander_os.core.memory import preview_content
+        import gzip
+        long_text = "é" + "x" * 50000
+        memory_store.log_message(task_id="p", sender="a", recipient="b", role="r", content=long_text)
+
+        (record,) = memory_store.query_messages(task_id="p")
+        assert record._cache == {}
+        assert record["content"] == long_text
+
+        (preview,) = memory_store.query_messages(task_id="p", preview_chars=10)
+        assert preview["content"] == long_text[:10]
+        assert preview_content(gzip.compress(long_text.encode()), True, 3) == "éxx"
+        assert preview_content(b"\xc3\xa9abc", False, 2) == "éa"
+
+
+class TestFullTextSearch:
+    """Tests for MessageStore.search_text and the FTS index."""
+
+    def test_ranked_search_with_snippets(self, memory_store):
+        """Matches are ranked, filtered by task and carry snippets."""
+        memory_store.log_message(task_id="t1", sender="a", recipient="b", role="r",
+                                 content="Deploy the relay to the HTPC node tonight")
+        memory_store.log_message(task_id="t1", sender="a", recipient="b", role="r",
+                                 content="Unrelated chatter about lunch")
+        memory_store.log_message(task_id="t2", sender="a", recipient="b", role="r",
+                                 content="relay relay relay deployment")
+
+        results = memory_store.search_text("relay", task_id="t1")
+        assert [r['task_id'] for r in results] == ["t1"]
+        assert "[relay]" in results[0]['snippet']
+
+        results = memory_store.search_text("deploy*")
+        assert len(results) == 2
+
+    def test_cursor_pagination(self, memory_store):
+        """Pages follow the cursor without repeats."""
+        for i in range(5):
+            memory_store.log_message(task_id="t", sender="a", recipient="b", role="r", content=f"alpha item {i}")
+
+        first = memory_store.search_text("alpha", limit=3)
+        assert len(first) == 3 and first.next_cursor
+        second = memory_store.search_text("alpha", limit=3, cursor=first.next_cursor)
+        assert len(second) == 2 and second.next_cursor is None
+        assert not {r['id'] for r in first} & {r['id'] for r in second}
+
+    def test_backfill_and_delete(self, memory_store):
+        """Rows inserted outside log_message are backfilled; deletes leave the index consistent."""
+        import gzip
+        from commander_os.core.memory import MessageModel
+        session = memory_store.SessionLocal()
+        session.add(MessageModel(timestamp=100.0, task_id="old", sender="s",
+                                 content_blob=gzip.compress(b"legacy beacon text")))
+        session.commit()
+        session.close()
+
+        assert memory_store.search_text("beacon") == []
+        assert memory_store.backfill_fts() == 1
+        assert memory_store.backfill_fts() == 0
+        assert len(memory_store.search_text("beacon")) == 1
+
+        assert memory_store.prune_archives(days_keep=1) == 1
+        assert memory_store.search_text("beacon") == []
+        with memory_store.engine.connect() as conn:
+            conn.exec_driver_sql("INSERT INTO messages_fts(messages_fts) VALUES ('integrity-check')")
+
+
+class TestStrictDedup:
+    """Tests for strict dedup mode and the dedup migration."""
+
+    def test_retries_return_existing_id(self, test_db_path):
+        store = MessageStore(test_db_path, dedup=True)
+        first = store.log_message(task_id="t", sender="a", recipient="b", role="r", content="status")
+        assert store.log_message(task_id="t", sender="a", recipient="b", role="r", content="status") == first
+
+        # Envelope ids keep distinct messages with identical content apart
+        env1 = store.log_message(task_id="t", sender="a", recipient="b", role="r", content="ping", dedup_id="e1")
+        env2 = store.log_message(task_id="t", sender="a", recipient="b", role="r", content="ping", dedup_id="e2")
+        assert env1 != env2
+
+        ids = store.log_messages_bulk([
+            dict(task_id="t", sender="a", recipient="b", role="r", content="new"),
+            dict(task_id="t", sender="a", recipient="b", role="r", content="status"),
+            dict(task_id="t", sender="a", recipient="b", role="r", content="new"),
+        ])
+        assert ids[0] == ids[2] and ids[1] == first
+        assert store.log_message(task_id="t", sender="a", recipient="b", role="r",
+                                 content="ping", dedup_id="e1", wait=False).result(timeout=5) == env1
+
+        assert len(store.query_messages(limit=None)) == 4
+        assert store.duplicates_ignored == 4
+        assert len(store.search_text("status")) == 1
+        store.close()
+
+    def test_duplicate_count_across_threads(self, test_db_path):
+        store = MessageStore(test_db_path, dedup=True)
+        batch = [dict(task_id="t", sender="a", recipient="b", role="r", content="same", dedup_id=f"e{i % 5}")
+                 for i in range(20)]
+
+        threads = [threading.Thread(target=store.log_messages_bulk, args=(batch,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(store.query_messages(limit=None)) == 5
+        assert store.duplicates_ignored == 4 * 20 - 5
+        store.close()
+
+    def test_dedup_migration(self, test_db_path):
+        loose = MessageStore(test_db_path)
+        for i in range(7):
+            loose.log_message(task_id="t", sender="a", recipient="b", role="r", content=f"retry {i % 3}")
+        loose.close()
+
+        store = MessageStore(test_db_path, dedup=True)
+        assert store.deduplicate_archive(batch_size=2) == {"scanned": 7, "removed": 4}
+        assert sorted(m['content'] for m in store.query_messages(limit=None)) == ["retry 0", "retry 1", "retry 2"]
+        # Migrated rows now catch retries
+        before = len(store.query_messages(limit=None))
+        store.log_message(task_id="t", sender="a", recipient="b", role="r", content="retry 1")
+        assert len(store.query_messages(limit=None)) == before
+        assert store.deduplicate_archive() == {"scanned": 0, "removed": 0}
+        with store.engine.connect() as conn:
+            conn.exec_driver_sql("INSERT INTO messages_fts(messages_fts) VALUES ('integrity-check')")
+        store.close()
+
+
+class TestRecentContext:
+    """Tests for the token-budgeted tail context and its cache."""
+
+    def _log(self, store, n, start=0, size=96, task="ctx"):
+        return [
+            store.log_message(task_id=task, sender="a", recipient="b", role="r",
+                              content=f"msg-{i:03d} " + "x" * size)
+            for i in range(start, start + n)
+        ]
+
+    def test_budget_is_enforced_tail_first(self, memory_store, monkeypatch):
+        import commander_os.core.memory as memory
+        self._log(memory_store, 40)
+        decoded = []
+        real_row_text = memory._row_text
+        monkeypatch.setattr(memory, "_row_text", lambda row: decoded.append(row.id) or real_row_text(row))
+
+        context = memory_store.get_recent_context("ctx", max_tokens=300)
+        lines = context.splitlines()
+        assert len(context) <= 300 * memory.CHARS_PER_TOKEN
+        assert "msg-039" in lines[-1] and "msg-000" not in context
+        assert [line.split()[3] for line in lines] == sorted(line.split()[3] for line in lines)
+        # Only the kept rows were decompressed
+        assert len(decoded) == len(lines)
+
+    def test_incremental_cache(self, memory_store, monkeypatch):
+        import commander_os.core.memory as memory
+        self._log(memory_store, 20)
+        first = memory_store.get_recent_context("ctx", max_tokens=300)
+        assert memory_store.get_recent_context("ctx", max_tokens=300) == first
+
+        self._log(memory_store, 2, start=20)
+        decoded = []
+        real_row_text = memory._row_text
+        monkeypatch.setattr(memory, "_row_text", lambda row: decoded.append(row.id) or real_row_text(row))
+        extended = memory_store.get_recent_context("ctx", max_tokens=300)
+        assert len(decoded) == 2
+        assert extended.splitlines()[-1].split()[3] == "msg-021"
+        assert len(extended) <= 1200
+
+        monkeypatch.setattr(memory, "_row_text", real_row_text)
+        memory_store._invalidate_context()
+        assert memory_store.get_recent_context("ctx", max_tokens=300) == extended
+
+    def test_delete_invalidates_and_oversize_is_truncated(self, memory_store):
+        ids = self._log(memory_store, 3)
+        assert "msg-002" in memory_store.get_recent_context("ctx")
+        memory_store.delete_messages([ids[-1]])
+        assert "msg-002" not in memory_store.get_recent_context("ctx")
+
+        self._log(memory_store, 1, start=3, size=5000)
+        context = memory_store.get_recent_context("ctx", max_tokens=100)
+        assert len(context) == 400 and context.rstrip().endswith("x")
+        assert "msg-001" not in context
+
+
+class TestRecipientIndex:
+    """Tests for message_recipients and recipient queries."""
+
+    def test_recipient_queries_use_index(self, memory_store):
+        to_both = memory_store.log_message(task_id="t", sender="a", recipient=["coder-1", "coder-2"],
+                                           role="r", content="to both")
+        memory_store.log_messages_bulk([
+            dict(task_id="t", sender="a", recipient="coder-2", role="r", content=f"to two {i}") for i in range(3)
+        ])
+        inbox = memory_store.query_messages(recipient="coder-1")
+        assert [m["id"] for m in inbox] == [to_both]
+        assert len(memory_store.query_messages(recipient="coder-2", limit=None)) == 4
+
+        with memory_store.engine.connect() as conn:
+            plan = " ".join(str(row[-1]) for row in conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id FROM messages WHERE id IN "
+                "(SELECT message_id FROM message_recipients WHERE recipient = 'coder-1')"
+            ))
+        assert "COVERING INDEX ix_message_recipients_recipient" in plan and "SCAN messages" not in plan
+
+        memory_store.delete_messages([to_both])
+        with memory_store.engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT COUNT(*) FROM message_recipients").scalar() == 3
+
+    def test_migration_backfills_recipients(self, test_db_path, memory_store):
+        memory_store.log_message(task_id="t", sender="a", recipient=["x", "y"], role="r", content="legacy")
+        # Roll the database back to its pre-index state
+        with memory_store.engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE message_recipients")
+            conn.exec_driver_sql("UPDATE store_meta SET value = '1' WHERE key = 'schema_version'")
+        memory_store.close()
+
+        reopened = MessageStore(test_db_path)
+        try:
+            assert [m["content"] for m in reopened.query_messages(recipient="y")] == ["legacy"]
+        finally:
+            reopened.close()
+
+
+class TestExport:
+    """Tests for streaming export."""
+
+    def test_export_streams_in_batches(self, memory_store):
+        import json
+        from commander_os.core.memory import ndjson_chunks
+        memory_store.log_messages_bulk([
+            dict(task_id="t" if i % 2 else "u", sender="a", recipient="b", role="user", content=f"m {i} " * 50)
+            for i in range(25)
+        ])
+        with memory_store.engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE messages SET timestamp = 1000 + id")
+
+        exported = memory_store.export_messages(task_id="t", since_ts=1004, before_ts=1020, batch_size=3)
+        assert not isinstance(exported, list)
+        rows = list(exported)
+        assert [m["id"] for m in rows] == [4, 6, 8, 10, 12, 14, 16, 18]
+        assert rows[0]["content"] == "m 3 " * 50 and rows[0]["recipient"] == ["b"]
+
+        chunks = list(ndjson_chunks(memory_store.export_messages(fields=["id", "task_id"]), rows_per_chunk=10))
+        assert len(chunks) == 3
+        lines = b"".join(chunks).splitlines()
+        assert len(lines) == 25 and json.loads(lines[-1]) == {"id": 25, "task_id": "u"}
+
+        with pytest.raises(ValueError):
+            next(memory_store.export_messages(fields=["bogus"]))
+
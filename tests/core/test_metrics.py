@@ -0,0 +1,95 @@
+"""
+Test Suite: Node Metrics History
+Tests for commander_os.core.metrics
+
+Run with: pytest tests/core/test_metrics.py -v
+"""
+
+import pytest
+
+from commander_os.core import metrics
+from commander_os.core.metrics import MetricSeries, MetricsStore, resolve_resolution
+from commander_os.core.state import StateManager
+
+# Bucket-aligned start so 10s/1m/10m boundaries are easy to reason about
+T0 = 1_700_000_400.0
+
+
+def fill(store: MetricsStore, seconds: int, node_id: str = "node-1"):
+    """One sample per second: tps = second index, load = 50."""
+    for i in range(seconds):
+        store.record(node_id, {"tps": float(i), "load": 50, "up": True, "model": "x"}, ts=T0 + i)
+
+
+class TestMetricSeries:
+    """Tests for the ring buffers and rollups."""
+
+    def test_raw_window_and_order(self):
+        store = MetricsStore(raw_capacity=100, rollup_capacity=10)
+        fill(store, 30)
+        points = store.query("node-1", 10, "raw", now=T0 + 29)["series"]["tps"]
+        assert [p["value"] for p in points] == [float(i) for i in range(19, 30)]
+        assert points[0]["t"] == T0 + 19
+
+    def test_rollups(self):
+        store = MetricsStore(raw_capacity=10, rollup_capacity=100)
+        fill(store, 120)
+        buckets = store.query("node-1", 120, "10s", now=T0 + 120)["series"]["tps"]
+        assert len(buckets) == 12
+        assert buckets[0] == {"t": T0, "min": 0.0, "max": 9.0, "avg": 4.5, "count": 10}
+        assert buckets[-1]["t"] == T0 + 110 and buckets[-1]["max"] == 119.0
+
+        minutes = store.query("node-1", 120, "1m", now=T0 + 120)["series"]["tps"]
+        assert [(b["min"], b["max"], b["count"]) for b in minutes] == [(0.0, 59.0, 60), (60.0, 119.0, 60)]
+        assert store.query("node-1", 600, "10m", now=T0 + 120)["series"]["load"][0]["avg"] == 50.0
+
+    def test_memory_is_bounded(self):
+        series = MetricSeries(raw_capacity=5, rollup_capacity=3)
+        for i in range(10_000):
+            series.add(T0 + i, float(i))
+        raw = series.query(0, "raw")
+        assert [p["value"] for p in raw] == [9995.0, 9996.0, 9997.0, 9998.0, 9999.0]
+        buckets = series.query(0, "10s")
+        assert len(buckets) == 3 and buckets[-1]["t"] == T0 + 9990
+
+    def test_non_numeric_values_skipped(self):
+        store = MetricsStore()
+        fill(store, 3)
+        assert sorted(store.query("node-1", 60, now=T0 + 3)["series"]) == ["load", "tps"]
+        assert store.query("node-2", 60, names=["tps"])["series"] == {"tps": []}
+
+    def test_resolution_selection(self):
+        assert resolve_resolution(60) == "raw"
+        assert resolve_resolution(3600) == "10s"
+        assert resolve_resolution(6 * 3600) == "1m"
+        assert resolve_resolution(7 * 86400) == "10m"
+        assert resolve_resolution(60, "1m") == "1m"
+        with pytest.raises(ValueError):
+            resolve_resolution(60, "5s")
+
+    @pytest.mark.skipif(not metrics.numpy_available(), reason="numpy not installed")
+    def test_numpy_matches_python_fallback(self, monkeypatch):
+        vectorized = MetricsStore(raw_capacity=50, rollup_capacity=20)
+        fill(vectorized, 700)
+        monkeypatch.setattr(metrics, "np", None)
+        fallback = MetricsStore(raw_capacity=50, rollup_capacity=20)
+        fill(fallback, 700)
+        for resolution in metrics.RESOLUTIONS:
+            assert (vectorized.query("node-1", 3600, resolution, now=T0 + 700)
+                    == fallback.query("node-1", 3600, resolution, now=T0 + 700))
+
+
+class TestStateMetricHistory:
+    """Tests for history recorded through StateManager."""
+
+    def test_update_node_metrics_records_history(self):
+        sm = StateManager()
+        sm.register_node("node-1", "localhost", 8000)
+        for tps in (10.0, 20.0, 30.0):
+            sm.update_node_metrics("node-1", {"tps": tps})
+        sm.update_node_metrics("ghost", {"tps": 1.0})
+
+        points = sm.metrics.query("node-1", 60, "raw")["series"]["tps"]
+        assert [p["value"] for p in points] == [10.0, 20.0, 30.0]
+        assert sm.get_node("node-1").metrics["tps"] == 30.0
+        assert sm.metrics.nodes() == ["node-1"]
@@ -0,0 +1,103 @@
+"""
+Test Suite: Partitioned Memory
+Tests for commander_os.core.partitioned
+
+Run with: pytest tests/core/test_partitioned.py -v
+"""
+
+import time
+
+import pytest
+
+from commander_os.core.memory import MessageModel
+from commander_os.core.partitioned import PartitionedMessageStore, split_id
+
+DAY = 86400.0
+
+
+def _log(store, count, task_id="t", prefix="m"):
+    return store.log_messages_bulk([
+        dict(task_id=task_id, sender="a", recipient="b", role="user", content=f"{prefix} {i} relay status")
+        for i in range(count)
+    ])
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    """Three 10-row shards with increasing timestamps."""
+    store = PartitionedMessageStore(str(tmp_path / "shards"), rows_per_shard=10)
+    _log(store, 10, prefix="a")
+    _log(store, 10, prefix="b")
+    _log(store, 5, prefix="c")
+    yield store
+    store.close()
+
+
+class TestPartitionedMessageStore:
+    """Tests for shard rotation, global ids and fan-out reads."""
+
+    def test_rotation_and_global_ids(self, sharded, tmp_path):
+        assert sharded.stats()["shards"] == ["messages-000001.db", "messages-000002.db", "messages-000003.db"]
+        msg_id = sharded.log_message(task_id="t", sender="a", recipient="b", role="user", content="d 0")
+        assert split_id(msg_id) == (3, 6)
+        future = sharded.log_message(task_id="t", sender="a", recipient="b", role="user", content="d 1", wait=False)
+        assert split_id(future.result(timeout=5)) == (3, 7)
+
+        # Polling by id walks the shards in order
+        page = sharded.query_messages(after_id=0, limit=12)
+        assert [m["content"].split()[0] for m in page] == ["a"] * 10 + ["b"] * 2
+        rest = sharded.query_messages(cursor=page.next_cursor, limit=None)
+        assert len(rest) == 15 and rest[-1]["id"] == msg_id + 1
+
+        sharded.close()
+        reopened = PartitionedMessageStore(str(tmp_path / "shards"), rows_per_shard=10)
+        try:
+            assert len(reopened.query_messages(limit=None)) == 27
+        finally:
+            reopened.close()
+
+    def test_paging_merges_shards(self, sharded):
+        seen, cursor = [], None
+        while True:
+            page = sharded.query_messages(task_id="t", limit=4, cursor=cursor, fields=["content"])
+            seen += [m["content"] for m in page]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert seen[0] == "c 4 relay status" and seen[-1] == "a 0 relay status" and len(seen) == 25
+
+        ascending = sharded.query_messages(ascending=True, limit=12)
+        assert [m["id"] for m in ascending] == sorted(m["id"] for m in ascending)
+        assert sharded.delete_messages([m["id"] for m in ascending]) == 12
+        assert len(sharded.query_messages(limit=None)) == 13
+
+    def test_search_and_context_fan_out(self, sharded):
+        hits, cursor = [], None
+        while True:
+            page = sharded.search_text("relay", limit=7, cursor=cursor)
+            hits += [h["id"] for h in page]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert len(hits) == len(set(hits)) == 25
+
+        context = sharded.get_recent_context("t", max_tokens=150)
+        lines = context.splitlines()
+        assert lines[-1].endswith("c 4 relay status") and any(" b " in line for line in lines)
+        assert len(context) <= 150 * 4
+
+    def test_export_streams_shards_in_order(self, sharded):
+        exported = list(sharded.export_messages(fields=["id", "content"], batch_size=4))
+        assert [m["content"].split()[0] for m in exported] == ["a"] * 10 + ["b"] * 10 + ["c"] * 5
+        assert [split_id(m["id"]) for m in exported[9:11]] == [(1, 10), (2, 1)]
+
+    def test_drop_partitions(self, sharded):
+        old = sharded._ordered()[0]
+        with old.store.engine.begin() as conn:
+            conn.execute(MessageModel.__table__.update().values(timestamp=time.time() - 90 * DAY))
+        old.bounds = None
+
+        assert sharded.drop_partitions(days_keep=30) == {"shards": 1, "deleted": 10}
+        assert not old.path.exists()
+        assert len(sharded.query_messages(limit=None)) == 15
+        assert sharded.prune_archives(days_keep=30) == 0
@@ -120,10 +120,10 @@ class TestStateManager:
         state_manager.register_node("node-old", "localhost", 5556)
         state_manager.register_agent("agent-old", "node-old", "coder")
         
-        # Manually backdate heartbeats
+        # Manually backdate heartbeats (states are immutable: publish backdated copies)
         with state_manager._lock:
-            state_manager._nodes["node-old"].last_heartbeat = time.time() - 100
-            state_manager._agents["agent-old"].last_heartbeat = time.time() - 100
+            state_manager._update("nodes", "node-old", heartbeat=False, last_heartbeat=time.time() - 100)
+            state_manager._update("agents", "agent-old", heartbeat=False, last_heartbeat=time.time() - 100)
             
         # Register fresh ones
         state_manager.register_node("node-new", "localhost", 5556)
@@ -174,3 +174,163 @@ class TestStateManager:
             
         # Verify consistency
         assert len(state_manager.get_all_agents()) == 10
+
+
+class TestStateJournal:
+    """Tests for the revision counter and delta queries."""
+
+    def test_changes_since_returns_coalesced_deltas(self):
+        sm = StateManager()
+        sm.set_system_status(SystemStatus.RUNNING)
+        sm.register_node("node-1", "localhost", 8000)
+        sm.register_agent("agent-1", "node-1", "coder")
+        rev = sm.revision
+        assert sm.get_full_snapshot()["revision"] == rev
+
+        sm.update_node_metrics("node-1", {"tps": 10.0})
+        sm.update_node_metrics("node-1", {"tps": 12.5})
+        sm.update_agent_status("agent-1", ComponentStatus.BUSY, task_id="task-9")
+        delta = sm.get_changes_since(rev)
+        assert delta["full"] is False and delta["revision"] == rev + 3
+        assert delta["system"] == {}
+        assert delta["nodes"]["node-1"]["metrics"] == {"tps": 12.5, "load": 0.0}
+        assert set(delta["nodes"]["node-1"]) == {"metrics", "last_heartbeat"}
+        assert delta["agents"]["agent-1"]["status"] == "busy"
+        assert delta["agents"]["agent-1"]["current_task_id"] == "task-9"
+
+        # Unchanged values and heartbeat-only touches don't bump the revision
+        sm.update_node_metrics("node-1", {"tps": 12.5})
+        sm.update_node_heartbeat("node-1")
+        sm.update_agent_role("agent-1", "coder")
+        assert sm.revision == rev + 3
+        assert sm.get_changes_since(sm.revision)["nodes"] == {}
+
+    def test_wrapped_journal_falls_back_to_snapshot(self):
+        sm = StateManager(journal_size=4)
+        sm.register_node("node-1", "localhost", 8000)
+        for i in range(1, 11):
+            sm.update_node_metrics("node-1", {"load": float(i)})
+        assert sm.revision == 11
+
+        assert sm.get_changes_since(7)["full"] is False
+        full = sm.get_changes_since(6)
+        assert full["full"] is True and full["revision"] == 11
+        assert full["nodes"]["node-1"]["metrics"]["load"] == 10.0
+        assert sm.get_changes_since(99)["full"] is True
+
+
+class TestStateSubscriptions:
+    """Tests for change callbacks and coalescing asyncio subscribers."""
+
+    def test_callbacks_filter_by_topic(self):
+        sm = StateManager()
+        node_events, agent_events = [], []
+        sm.subscribe(node_events.append, topics=["node:*"])
+        callback = sm.subscribe(agent_events.append, topics=["agent:agent-2", "system"])
+
+        sm.register_node("node-1", "localhost", 8000)
+        sm.register_agent("agent-1", "node-1", "coder")
+        sm.register_agent("agent-2", "node-1", "tester")
+        sm.set_system_status(SystemStatus.RUNNING)
+        assert [e["topic"] for e in node_events] == ["node:node-1"] * 3
+        assert [e["topic"] for e in agent_events] == ["agent:agent-2", "system"]
+        assert agent_events[-1]["changes"] == {"status": "running"}
+
+        sm.unsubscribe(callback)
+        sm.set_system_status(SystemStatus.STOPPING)
+        assert len(agent_events) == 2
+
+    @pytest.mark.asyncio
+    async def test_queue_subscriber_coalesces_and_resyncs(self):
+        import asyncio
+        sm = StateManager()
+        sm.register_node("node-1", "localhost", 8000)
+        subscription = sm.subscribe_queue(topics=["node:*"], maxsize=2)
+
+        # Changes made on another thread wake the loop; a slow consumer sees one merged event
+        def mutate():
+            for i in range(1, 6):
+                sm.update_node_metrics("node-1", {"load": float(i)})
+        await asyncio.to_thread(mutate)
+        events = await asyncio.wait_for(subscription.get(), timeout=2)
+        assert len(events) == 1 and events[0]["revision"] == sm.revision
+        assert events[0]["changes"]["metrics"]["load"] == 5.0
+        assert subscription.stats()["coalesced"] == 4
+
+        # More pending topics than maxsize: the buffer is dropped for a resync marker
+        for node_id in ("node-2", "node-3", "node-4"):
+            sm.register_node(node_id, "localhost", 8000)
+        events = await asyncio.wait_for(subscription.get(), timeout=2)
+        assert events == [{"revision": sm.revision, "topic": "*", "full": True}]
+
+        subscription.close()
+        sm.update_node_status("node-1", ComponentStatus.BUSY)
+        assert subscription.stats()["pending"] == 0
+
+
+class TestStateSnapshots:
+    """Tests for copy-on-write snapshots and immutable state views."""
+
+    def test_readers_get_immutable_views(self):
+        import dataclasses
+        sm = StateManager()
+        sm.register_node("node-1", "localhost", 8000)
+        sm.register_agent("agent-1", "node-1", "coder")
+        node = sm.get_node("node-1")
+
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            node.status = ComponentStatus.ERROR
+        with pytest.raises(TypeError):
+            node.metrics["tps"] = 99.0
+        assert node.registered_agents == ("agent-1",)
+
+        # Updates publish new objects; references already handed out are unchanged
+        snapshot = sm.get_snapshot()
+        sm.update_node_metrics("node-1", {"tps": 42.0})
+        assert node.metrics["tps"] == 0.0 and sm.get_node("node-1").metrics["tps"] == 42.0
+        assert snapshot.nodes["node-1"] is node and snapshot.revision == sm.revision - 1
+
+        data = node.to_dict()
+        data["metrics"]["tps"] = 1.0
+        assert data["status"] == "starting" and node.metrics["tps"] == 0.0
+
+    def test_reads_do_not_take_the_writer_lock(self):
+        sm = StateManager()
+        sm.register_node("node-1", "localhost", 8000)
+        result = {}
+
+        def read():
+            result["node"] = sm.get_node("node-1")
+            result["snapshot"] = sm.get_full_snapshot()
+
+        with sm._lock:
+            reader = threading.Thread(target=read)
+            reader.start()
+            reader.join(timeout=2)
+            assert not reader.is_alive()
+        assert result["snapshot"]["nodes"]["node-1"]["status"] == "starting"
+
+
+    def test_cached_json_fragments(self):
+        import json
+        sm = StateManager()
+        sm.register_node("node-1", "localhost", 8000)
+        sm.register_node("node-2", "localhost", 8001)
+        sm.register_agent("agent-1", "node-1", "coder")
+
+        node = sm.get_node("node-2")
+        assert not hasattr(node, "__dict__")
+        assert node.to_json() is node.to_json()
+        assert "_json" not in node.to_dict()
+
+        # Only the changed record is re-encoded; the others reuse their fragment
+        fragment = node.to_json()
+        sm.update_node_metrics("node-1", {"tps": 7.5})
+        assert sm.get_node("node-2").to_json() is fragment
+
+        doc = json.loads(sm.get_full_snapshot_json())
+        expected = sm.get_full_snapshot()
+        for d in (doc, expected):
+            del d["system"]["uptime"], d["system"]["timestamp"]
+        assert doc == expected
+        assert doc["nodes"]["node-1"]["metrics"]["tps"] == 7.5
@@ -114,3 +114,25 @@ class TestSystemManager:
         
         assert "system" in report
         assert report["system"]["status"] == "running"
+
+    def test_status_report_json(self, system_manager, mock_config_manager):
+        """Test the pre-serialized report matches get_status_report()."""
+        import json
+        from types import SimpleNamespace
+        from commander_os.core.state import ComponentStatus
+        mock_config_manager.nodes = {
+            "node-1": SimpleNamespace(name="Main", tps_benchmark=100.0, engine=None),
+            "node-2": SimpleNamespace(name="Spare", tps_benchmark=20.0, engine=None),
+        }
+        state = system_manager.state_manager
+        state.register_node("node-1", "localhost", 8000)
+        state.update_node_status("node-1", ComponentStatus.READY)
+        state.register_agent("agent-1", "node-1", "coder")
+
+        report = json.loads(system_manager.get_status_report_json())
+        expected = system_manager.get_status_report()
+        for doc in (report, expected):
+            del doc["system"]["uptime"], doc["system"]["timestamp"]
+        assert report == expected
+        assert report["nodes"]["node-1"]["name"] == "Main"
+        assert report["nodes"]["node-2"]["status"] == "offline"
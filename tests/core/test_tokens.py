@@ -0,0 +1,101 @@
+"""
+Test Suite: Token Accounting
+Tests for commander_os.core.tokens and token-budgeted context in MessageStore
+
+Run with: pytest tests/core/test_tokens.py -v
+"""
+
+import re
+
+import pytest
+
+from commander_os.core.memory import MessageStore
+from commander_os.core.tokens import TokenCounter, estimate_tokens
+
+
+def _words(text):
+    return re.findall(r"\w+|[^\w\s]", text)
+
+
+class TestTokenCounter:
+    """Tests for TokenCounter sources, memoization and fallback."""
+
+    def test_remote_counts_are_memoized(self, stand_in_engine):
+        counter = TokenCounter(endpoint=stand_in_engine.url)
+        assert counter.count("deploy the relay, now!") == 6
+        assert counter.count("deploy the relay, now!") == 6
+        assert stand_in_engine.tokenize_calls == 1
+        assert counter.stats()["hits"] == 1 and counter.source == "remote"
+
+    def test_unreachable_engine_falls_back_to_estimate(self, stand_in_engine):
+        url = stand_in_engine.url
+        stand_in_engine.close()
+        counter = TokenCounter(endpoint=url, timeout=0.5)
+        assert counter.count_exact("hello there") is None
+        assert counter.count("hello there") == estimate_tokens("hello there", 3.0)
+        assert counter.stats()["cached"] == 0
+
+    def test_local_tokenizer_and_fit_tail(self):
+        counter = TokenCounter(endpoint="http://127.0.0.1:9", tokenizer=_words)
+        assert counter.source == "local"
+        text = " ".join(f"w{i}" for i in range(100))
+        tail = counter.fit_tail(text, 10)
+        assert counter.count(tail) <= 10 and text.endswith(tail)
+
+
+class TestTokenBudgetedContext:
+    """Tests for get_recent_context with an engine tokenizer."""
+
+    def test_context_fits_token_budget_and_counts_persist(self, tmp_path, stand_in_engine):
+        db = f"sqlite:///{tmp_path}/tokens.db"
+        store = MessageStore(db)
+        for i in range(30):
+            store.log_message(task_id="chat", sender="a", recipient="b", role="user",
+                              content=f"message {i}: " + "alpha beta gamma " * 5)
+        counter = TokenCounter(endpoint=stand_in_engine.url)
+
+        context = store.get_recent_context("chat", max_tokens=200, counter=counter)
+        assert len(_words(context)) <= 200
+        assert "message 29:" in context and "message 0:" not in context
+        calls = stand_in_engine.tokenize_calls
+        store.close()
+
+        # Counts were memoized in token_count: a fresh store and counter don't re-tokenize
+        store = MessageStore(db, token_counter=TokenCounter(endpoint=stand_in_engine.url))
+        assert store.get_recent_context("chat", max_tokens=200) == context
+        assert stand_in_engine.tokenize_calls == calls
+
+        store.reset_token_counts()
+        store.get_recent_context("chat", max_tokens=200)
+        assert stand_in_engine.tokenize_calls > calls
+        store.close()
+
+    def test_counts_are_kept_per_tokenizer(self, tmp_path):
+        from sqlalchemy import func, select
+        from commander_os.core.memory import MessageTokenCountModel
+        store = MessageStore(f"sqlite:///{tmp_path}/per_tokenizer.db")
+        ids = [store.log_message(task_id="chat", sender="a", recipient="b", role="user",
+                                 content=f"message {i}: " + "alpha beta gamma " * 5) for i in range(20)]
+        words = TokenCounter(tokenizer=_words, tokenizer_id="words")
+        chars = TokenCounter(tokenizer=lambda text: list(text), tokenizer_id="chars")
+
+        store.get_recent_context("chat", max_tokens=400, counter=words)
+        # A tokenizer with ~5x more tokens per message must not budget with the word counts
+        context = store.get_recent_context("chat", max_tokens=400, counter=chars)
+        assert 0 < len(context) <= 400
+
+        def counts(tokenizer):
+            with store.engine.connect() as conn:
+                return conn.execute(select(func.count()).select_from(MessageTokenCountModel)
+                                    .where(MessageTokenCountModel.tokenizer == tokenizer)).scalar()
+
+        assert counts("words") == 20 and counts("chars") > 0
+        # Unnamed tokenizers are counted but never persisted
+        store.get_recent_context("chat", max_tokens=50, counter=TokenCounter(tokenizer=_words))
+        assert counts(None) == 0
+
+        store.reset_token_counts("chars")
+        assert counts("chars") == 0 and counts("words") == 20
+        store.delete_messages(ids[:5])
+        assert counts("words") == 15
+        store.close()
@@ -55,7 +55,7 @@ class TestRestApi:
     def test_system_endpoints(self, mock_system):
         """Test system start/stop/status."""
         # Status
-        mock_system.get_status_report.return_value = {'system': {'status': 'stopped'}}
+        mock_system.get_status_report_json.return_value = b'{"system":{"status":"stopped"}}'
         r = client.get("/system/status")
         assert r.status_code == 200
         assert r.json()['system']['status'] == 'stopped'
@@ -141,6 +141,115 @@ class TestRestApi:
         assert r.status_code == 200
         mock_system.memory_store.query_messages.assert_called()
 
+    def test_memory_cursor(self, mock_system):
+        """Test since-id polling passes through and exposes the next cursor."""
+        from commander_os.core.memory import MessagePage
+        mock_system.memory_store.query_messages.return_value = MessagePage([{"id": 5}], next_cursor="i:5")
+        r = client.get("/memory/search?after_id=4&limit=1")
+        assert r.status_code == 200
+        assert r.headers["X-Next-Cursor"] == "i:5"
+        _, kwargs = mock_system.memory_store.query_messages.call_args
+        assert kwargs["after_id"] == 4
+
+    def test_memory_text_search(self, mock_system):
+        """Test full-text search returns ranked snippets and a next cursor."""
+        from commander_os.core.memory import MessagePage
+        mock_system.memory_store.search_text.return_value = MessagePage(
+            [{"id": 7, "content": "deploy the relay", "snippet": "[deploy] the relay", "rank": -1.5}],
+            next_cursor="-1.5:7"
+        )
+        r = client.get("/memory/search?q=deploy&task_id=task-1")
+        assert r.status_code == 200
+        assert r.json()[0]["snippet"] == "[deploy] the relay"
+        assert r.headers["X-Next-Cursor"] == "-1.5:7"
+        mock_system.memory_store.search_text.assert_called_with("deploy", task_id="task-1", limit=50, cursor=None)
+
+    def test_status_deltas(self, mock_system):
+        """Test /system/status?since returns deltas, or the full report when too old."""
+        from commander_os.core.state import StateManager
+        state = StateManager(journal_size=8)
+        state.register_node("node-1", "localhost", 8000)
+        mock_system.state_manager = state
+        mock_system.get_status_report.return_value = {"revision": 1, "nodes": {}}
+
+        state.update_node_status("node-1", ComponentStatus.READY)
+        r = client.get("/system/status?since=1")
+        assert r.status_code == 200
+        assert r.json()["revision"] == 2 and r.json()["nodes"]["node-1"]["status"] == "ready"
+
+        for i in range(10):
+            state.update_node_metrics("node-1", {"load": float(i)})
+        assert client.get("/system/status?since=1").json()["full"] is True
+
+    def test_node_metrics_history(self, mock_system):
+        """Test /nodes/{id}/metrics returns downsampled history."""
+        from commander_os.core.state import StateManager
+        state = StateManager()
+        state.register_node("node-1", "localhost", 8000)
+        for tps in (10.0, 30.0):
+            state.update_node_metrics("node-1", {"tps": tps, "load": 5.0})
+        mock_system.state_manager = state
+
+        r = client.get("/nodes/node-1/metrics?window=60&resolution=10s&metrics=tps")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["resolution"] == "10s" and list(body["series"]) == ["tps"]
+        assert sum(b["count"] for b in body["series"]["tps"]) == 2
+
+        assert client.get("/nodes/node-1/metrics").json()["resolution"] == "10s"
+        assert client.get("/nodes/node-1/metrics?resolution=5s").status_code == 400
+        assert client.get("/nodes/missing/metrics").status_code == 404
+
+    def test_memory_export_streams_ndjson(self, mock_system, tmp_path):
+        """Test /memory/export streams filtered messages as NDJSON."""
+        import json
+        from commander_os.core.memory import MessageStore
+        store = MessageStore(f"sqlite:///{tmp_path}/export.db")
+        try:
+            store.log_messages_bulk([
+                dict(task_id=f"task-{i % 2}", sender="a", recipient="b", role="user", content=f"m {i}")
+                for i in range(1200)
+            ])
+            mock_system.memory_store = store
+            r = client.get("/memory/export?task_id=task-1&fields=id,content")
+            assert r.status_code == 200
+            assert r.headers["content-type"].startswith("application/x-ndjson")
+            lines = [json.loads(line) for line in r.text.splitlines()]
+            assert len(lines) == 600 and lines[0] == {"id": 2, "content": "m 1"}
+
+            assert client.get("/memory/export?fields=bogus").status_code == 400
+        finally:
+            store.close()
+
+    def test_command_prompt_fits_engine_context(self, mock_system, stand_in_engine, tmp_path):
+        """Test /command packs history against the node's ctx using its tokenizer."""
+        from commander_os.core.config_manager import NodeConfig, EngineConfig
+        from commander_os.core.memory import MessageStore
+        from commander_os.core.tokens import TokenCounter
+        store = MessageStore(f"sqlite:///{tmp_path}/chat.db")
+        try:
+            for i in range(40):
+                store.log_message(task_id="chat", sender="THE_COMMANDER", recipient="system",
+                                  role="user", content=f"earlier order {i} " + "status report " * 10)
+            mock_system.memory_store = store
+            mock_system.config_manager.nodes = {"node-1": NodeConfig(
+                id="node-1", name="Node 1", host="127.0.0.1", port=stand_in_engine.port,
+                engine=EngineConfig(ctx=256)
+            )}
+            mock_system.state_manager.get_node.return_value = MagicMock(status='ready')
+            mock_system.get_token_counter.return_value = TokenCounter(endpoint=stand_in_engine.url)
+
+            r = client.post("/command", json={"text": "report fleet status"})
+            assert r.status_code == 200 and r.json()["success"] is True
+
+            payload = stand_in_engine.completions[0]
+            counter = TokenCounter(endpoint=stand_in_engine.url)
+            assert counter.count(payload["prompt"]) + payload["n_predict"] <= 256
+            assert "earlier order 39" in payload["prompt"]
+            assert payload["prompt"].endswith("report fleet status")
+        finally:
+            store.close()
+
     def test_uninitialized_system(self):
         """Test behavior when system is None."""
         with patch('commander_os.interfaces.rest_api.system', None):
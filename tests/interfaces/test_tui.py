@@ -9,7 +9,7 @@ import pytest
 from unittest.mock import MagicMock
 from io import StringIO
 from rich.console import Console
-from commander_os.interfaces.tui import CommanderTUI
+from commander_os.interfaces.tui import CommanderTUI, sparkline
 from commander_os.core.state import SystemStatus, ComponentStatus
 
 class TestTUI:
@@ -95,3 +95,37 @@ class TestTUI:
         assert tui.generate_header() is not None
         assert tui.generate_nodes_table() is not None
         assert tui.generate_agents_table() is not None
+
+    def test_sparkline(self):
+        """Verify sparklines scale to their range and keep the newest values."""
+        assert sparkline([]) == ""
+        assert sparkline([0.0, 5.0, 10.0]) == "▁▄█"
+        assert sparkline([3.0, 3.0]) == "▁▁"
+        assert sparkline(list(range(100)), width=4) == "▁▃▅█"
+
+    def test_recent_messages_keep_up_with_bursts(self, tmp_path):
+        """Verify a burst larger than the panel shows the newest messages, not the oldest new ones."""
+        from commander_os.core.memory import MessageStore
+        sm = MagicMock()
+        tui = CommanderTUI(sm)
+        tui.store = MessageStore(f"sqlite:///{tmp_path}/tui.db")
+
+        def log(start, count):
+            tui.store.log_messages_bulk([
+                dict(task_id="t", sender="a", recipient="b", role="user", content=f"m {i}")
+                for i in range(start, start + count)
+            ])
+
+        log(0, 5)
+        assert [m["content"] for m in tui._poll_recent_messages()] == [f"m {i}" for i in range(4, -1, -1)]
+
+        log(5, 3)
+        assert tui._poll_recent_messages()[0]["content"] == "m 7"
+
+        log(8, 50)
+        msgs = tui._poll_recent_messages()
+        assert [m["content"] for m in msgs] == [f"m {i}" for i in range(57, 37, -1)]
+
+        log(58, 1)
+        msgs = tui._poll_recent_messages()
+        assert msgs[0]["content"] == "m 58" and len(msgs) == 20
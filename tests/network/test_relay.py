@@ -9,7 +9,7 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, patch
 
-from commander_os.network.relay import app
+from commander_os.network.relay import app, scheduler
 from commander_os.core.protocol import CommanderProtocol, MessageEnvelope, MessageType
 
 client = TestClient(app)
@@ -41,8 +41,8 @@ class TestRelay:
             assert response.json()["status"] == "received"
             assert response.json()["id"] == envelope.id
             
-            # Since it's a background task, we might need a small wait or just verify it was added
-            # In TestClient, background tasks run synchronously by default unless configured otherwise
+            # Persistence runs on the priority scheduler; wait for it to drain
+            assert scheduler.join()
             mock_persist.assert_called_once()
 
     def test_receive_invalid_protocol(self):
@@ -76,3 +76,212 @@ class TestRelay:
             assert kwargs["task_id"] == "task-123"
             assert kwargs["sender"] == "commander"
             assert kwargs["recipient"] == "agent-1"
+
+
+class TestRelayStorage:
+    """Tests for the pooled agent storage endpoints."""
+
+    @pytest.fixture
+    def agent_dbs(self, temp_dir):
+        """Swap the relay's agent DB pool for one on a temp directory."""
+        from commander_os.network.agent_db import AgentDBPool
+        pool = AgentDBPool(temp_dir, max_open=2)
+        with patch('commander_os.network.relay.agent_dbs', pool):
+            yield pool
+        pool.close()
+
+    def test_batch_ack_after_commit(self, agent_dbs):
+        """Batch writes are committed before the count is acknowledged."""
+        records = [
+            {"table": "metrics", "operation": "insert", "data": {"id": f"m{i}", "value": i}}
+            for i in range(5)
+        ]
+        response = client.post("/relay/batch", json={
+            "agent_id": "agent-1", "records": records, "timestamp": 0.0
+        })
+        assert response.status_code == 200
+        assert response.json()["count"] == 5
+
+        response = client.post("/relay/query", json={
+            "agent_id": "agent-1", "query": "SELECT COUNT(*) AS n FROM metrics"
+        })
+        assert response.json()["results"] == [{"n": 5}]
+
+    def test_immediate_writes_reuse_engine(self, agent_dbs):
+        """Immediate writes share one cached engine per agent."""
+        for i in range(10):
+            response = client.post("/relay/immediate", json={
+                "agent_id": "agent-1", "table": "tasks", "operation": "insert",
+                "data": {"id": f"t{i}"}, "timestamp": 0.0
+            })
+            assert response.status_code == 200
+
+        # Immediate writes reach the writer via the scheduler; then barrier on the writer
+        assert scheduler.join()
+        agent_dbs.submit_write("agent-1", lambda conn, known: None).result()
+        stats = agent_dbs.stats()
+        assert stats["open"] == 1
+        assert stats["agents"]["agent-1"]["writes"]["count"] == 11
+        rows = agent_dbs.submit_read("agent-1", lambda conn: conn.execute("SELECT COUNT(*) FROM tasks").fetchone()).result()
+        assert rows == (10,)
+
+    def test_lru_eviction_keeps_writes(self, agent_dbs):
+        """Evicting an engine drains its pending writes."""
+        for agent_id in ("a", "b", "c"):
+            agent_dbs.submit_write(
+                agent_id,
+                lambda conn, known: conn.execute("CREATE TABLE IF NOT EXISTS t (x)")
+            )
+
+        stats = agent_dbs.stats()
+        assert stats["open"] == 2
+        assert stats["evictions"] == 1
+        rows = agent_dbs.submit_read("a", lambda conn: conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 't'"
+        ).fetchall()).result()
+        assert rows == [("t",)]
+
+    def test_eviction_closes_off_the_caller_thread(self, agent_dbs):
+        """Evicting a busy engine neither blocks the caller nor loses its writes on reopen."""
+        import threading
+        import time
+        release = threading.Event()
+        agent_dbs.submit_write("a", lambda conn, known: conn.execute("CREATE TABLE t (x)"))
+        agent_dbs.submit_write("a", lambda conn, known: release.wait(5))
+
+        start = time.monotonic()
+        agent_dbs.submit_write("b", lambda conn, known: None)
+        agent_dbs.submit_write("c", lambda conn, known: None).result()
+        assert time.monotonic() - start < 1
+        assert agent_dbs.stats()["evictions"] == 1
+
+        threading.Timer(0.2, release.set).start()
+        rows = agent_dbs.submit_read("a", lambda conn: conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 't'"
+        ).fetchall()).result()
+        assert rows == [("t",)]
+
+    def test_slow_open_does_not_block_other_agents(self, agent_dbs):
+        """Engines open outside the pool lock; callers for the same agent share one open."""
+        import threading
+        import time
+        agent_dbs.submit_write("fast", lambda conn, known: None).result()
+        opened = []
+        release = threading.Event()
+        real_open = agent_dbs._open
+
+        def slow_open(agent_id):
+            opened.append(agent_id)
+            release.wait(5)
+            return real_open(agent_id)
+
+        agent_dbs._open = slow_open
+        callers = [threading.Thread(target=lambda: agent_dbs.submit_read("slow", lambda conn: None).result())
+                   for _ in range(3)]
+        for caller in callers:
+            caller.start()
+        time.sleep(0.1)
+
+        start = time.monotonic()
+        agent_dbs.submit_read("fast", lambda conn: None).result()
+        assert time.monotonic() - start < 1
+
+        release.set()
+        for caller in callers:
+            caller.join(timeout=5)
+        assert opened == ["slow"]
+
+    def test_pending_batch_commits_do_not_hold_scheduler_workers(self, agent_dbs):
+        """Batch jobs hand back the commit Future instead of blocking a worker on it."""
+        import threading
+        from commander_os.core.protocol import PriorityLevel
+        from commander_os.network.relay import BatchWriteRequest, _queue_batch_write
+        release = threading.Event()
+        agent_dbs.submit_write("agent-1", lambda conn, known: release.wait(5))
+        request = BatchWriteRequest(agent_id="agent-1", timestamp=0.0, records=[
+            {"table": "metrics", "operation": "insert", "data": {"id": "m1"}}
+        ])
+
+        workers = scheduler.stats()["workers"]
+        commits = [scheduler.submit(PriorityLevel.BACKGROUND, _queue_batch_write, request).result(timeout=2)
+                   for _ in range(workers + 1)]
+        assert not any(commit.done() for commit in commits)
+        # Every worker is still free for urgent work while the commits are pending
+        assert scheduler.submit(PriorityLevel.CRITICAL, lambda: "ran").result(timeout=2) == "ran"
+
+        release.set()
+        for commit in commits:
+            commit.result(timeout=5)
+
+    def test_export_streams_agent_table(self, agent_dbs):
+        """Agent tables export as NDJSON with filters applied in SQL."""
+        import json
+        records = [
+            {"table": "tasks", "operation": "insert", "data": {"id": f"t{i}", "task_id": f"job-{i % 2}"}}
+            for i in range(6)
+        ]
+        client.post("/relay/batch", json={"agent_id": "agent-1", "records": records, "timestamp": 0.0})
+
+        response = client.get("/relay/export/agent-1/tasks?task_id=job-0")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["id"] for row in rows] == ["t0", "t2", "t4"]
+        assert json.loads(rows[0]["data"])["task_id"] == "job-0"
+
+        assert client.get("/relay/export/agent-1/tasks?since_ts=4102444800").text == ""
+        assert client.get("/relay/export/agent-1/missing").status_code == 404
+        assert client.get("/relay/export/nobody/tasks").status_code == 404
+
+
+class TestRelayRouting:
+    """Tests for relay delivery endpoints."""
+
+    @pytest.fixture
+    def router(self):
+        """Swap in a router without a spill queue so every recipient is queued in memory."""
+        from commander_os.network.router import MessageRouter
+        router = MessageRouter()
+        with patch('commander_os.network.relay.router', router), \
+             patch('commander_os.network.relay.persist_envelope'):
+            yield router
+        router.close()
+
+    def test_poll_delivers_routed_envelope(self, router):
+        """An envelope posted to the relay is returned by the recipient's poll."""
+        envelope = CommanderProtocol.create_command("commander", "agent-1", "test")
+        response = client.post("/relay/message", json=envelope.dict())
+        assert response.json()["routed"] == 1
+
+        response = client.get("/relay/poll/agent-1", params={"timeout": 0})
+        assert response.status_code == 200
+        assert [m["id"] for m in response.json()] == [envelope.id]
+
+    def test_websocket_push(self, router):
+        """Connected recipients receive envelopes over WebSocket."""
+        envelope = CommanderProtocol.create_command("commander", "node-2", "test")
+        with client.websocket_connect("/relay/ws/node-2") as ws:
+            client.post("/relay/message", json=envelope.dict())
+            received = MessageEnvelope.model_validate_json(ws.receive_text())
+        assert received.id == envelope.id
+
+
+class TestRelayScheduling:
+    """Tests for priority scheduling of relay work."""
+
+    def test_metrics_report_priorities(self):
+        """Per-priority depth and wait metrics are exposed."""
+        envelope = CommanderProtocol.create_command("commander", "agent-1", "test")
+        from commander_os.network.router import MessageRouter
+        with patch('commander_os.network.relay.persist_envelope'), \
+             patch('commander_os.network.relay.router', MessageRouter()):
+            assert client.post("/relay/message", json=envelope.dict()).status_code == 200
+            assert scheduler.join()
+
+        metrics = client.get("/relay/metrics").json()
+        high = metrics["scheduler"]["priorities"]["HIGH"]
+        assert high["depth"] == 0
+        assert high["completed"] >= 2
+        assert set(metrics["scheduler"]["priorities"]) == {
+            "CRITICAL", "HIGH", "NORMAL", "LOW", "BACKGROUND"
+        }
@@ -0,0 +1,110 @@
+"""
+Test Suite: Message Router
+Tests for commander_os.network.router
+
+Run with: pytest tests/network/test_router.py -v
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from commander_os.core.memory import MessageStore
+from commander_os.core.protocol import MessageEnvelope, MessageType, PriorityLevel
+from commander_os.network.router import MessageRouter
+from commander_os.network.spill import SpillQueue
+
+
+def make_envelope(recipient, priority=PriorityLevel.NORMAL, text="hi"):
+    return MessageEnvelope(
+        msg_type=MessageType.COMMAND,
+        sender_id="commander",
+        recipient_id=recipient,
+        priority=priority,
+        payload={"text": text}
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MessageStore(f"sqlite:///{tmp_path}/router.db")
+
+
+@pytest.fixture
+def spill(tmp_path):
+    return SpillQueue(f"sqlite:///{tmp_path}/router.db")
+
+
+class TestMessageRouter:
+    """Tests for MessageRouter."""
+
+    @pytest.mark.asyncio
+    async def test_priority_order(self):
+        """Delivery honors PriorityLevel, FIFO within a level."""
+        router = MessageRouter()
+        router.route(make_envelope("agent-1", PriorityLevel.LOW, "low"))
+        router.route(make_envelope("agent-1", PriorityLevel.NORMAL, "n1"))
+        router.route(make_envelope("agent-1", PriorityLevel.CRITICAL, "crit"))
+        router.route(make_envelope("agent-1", PriorityLevel.NORMAL, "n2"))
+
+        messages = await router.get("agent-1", timeout=0)
+        assert [m.envelope.payload["text"] for m in messages] == ["crit", "n1", "n2", "low"]
+        router.close()
+
+    @pytest.mark.asyncio
+    async def test_fan_out_shares_payload(self):
+        """A multi-recipient envelope is queued once by reference."""
+        router = MessageRouter()
+        assert router.route(make_envelope(["a", "b", "a"])) == 2
+
+        (first,) = await router.get("a", timeout=0)
+        (second,) = await router.get("b", timeout=0)
+        assert first is second
+        assert first.json is second.json
+        router.close()
+
+    @pytest.mark.asyncio
+    async def test_waiting_consumer_wakes(self):
+        """A long-poll waiter is woken as soon as a message is routed."""
+        router = MessageRouter()
+        waiter = asyncio.create_task(router.get("node-2", timeout=5.0))
+        await asyncio.sleep(0)
+
+        started = time.perf_counter()
+        router.route(make_envelope("node-2"))
+        messages = await waiter
+        assert len(messages) == 1
+        assert time.perf_counter() - started < 0.05
+        router.close()
+
+    @pytest.mark.asyncio
+    async def test_overflow_keeps_most_urgent(self):
+        """A full queue evicts its least urgent message."""
+        router = MessageRouter(max_queue=2)
+        router.route(make_envelope("a", PriorityLevel.LOW, "low"))
+        router.route(make_envelope("a", PriorityLevel.NORMAL, "normal"))
+        router.route(make_envelope("a", PriorityLevel.CRITICAL, "crit"))
+
+        messages = await router.get("a", timeout=0)
+        assert [m.envelope.payload["text"] for m in messages] == ["crit", "normal"]
+        assert router.stats()["dropped"] == 1
+        router.close()
+
+    @pytest.mark.asyncio
+    async def test_offline_spill_and_reload(self, store, spill):
+        """Messages for offline recipients go to the spill queue and come back on poll."""
+        router = MessageRouter(spill)
+        router.route(make_envelope("sleepy", PriorityLevel.LOW, "later"))
+        router.route(make_envelope("sleepy", PriorityLevel.HIGH, "first"))
+        router._spill_executor.submit(lambda: None).result()
+
+        assert spill.count("sleepy") == 2
+        # Spilled envelopes are delivery state, not conversation history
+        assert store.query_messages() == [] and store.search_text("later") == []
+        assert router.stats()["recipients"]["sleepy"]["depth"] == 0
+
+        messages = await router.get("sleepy", timeout=0)
+        assert [m.envelope.payload["text"] for m in messages] == ["first", "later"]
+        assert spill.count("sleepy") == 0
+        router.close()
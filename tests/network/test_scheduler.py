@@ -0,0 +1,75 @@
+"""
+Test Suite: Priority Scheduler
+Tests for commander_os.network.scheduler
+
+Run with: pytest tests/network/test_scheduler.py -v
+"""
+
+import threading
+
+import pytest
+
+from commander_os.core.protocol import PriorityLevel
+from commander_os.network.scheduler import PriorityScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = PriorityScheduler(workers=1, aging_interval=10.0)
+    yield scheduler
+    scheduler.close()
+
+
+def _block(scheduler):
+    """Occupy the single worker until the returned event is set."""
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit(PriorityLevel.NORMAL, hold)
+    started.wait(5)
+    return gate
+
+
+class TestPriorityScheduler:
+    """Tests for PriorityScheduler."""
+
+    def test_runs_in_priority_order(self, scheduler):
+        """Queued jobs run most-urgent first."""
+        gate = _block(scheduler)
+        order = []
+        for level in (PriorityLevel.BACKGROUND, PriorityLevel.NORMAL, PriorityLevel.CRITICAL):
+            scheduler.submit(level, order.append, level.name)
+        gate.set()
+
+        assert scheduler.join()
+        assert order == ["CRITICAL", "NORMAL", "BACKGROUND"]
+
+    def test_aging_prevents_starvation(self):
+        """Work queued long enough ago beats newer urgent work."""
+        scheduler = PriorityScheduler(workers=1, aging_interval=0.0)
+        gate = _block(scheduler)
+        order = []
+        scheduler.submit(PriorityLevel.BACKGROUND, order.append, "old-background")
+        scheduler.submit(PriorityLevel.CRITICAL, order.append, "new-critical")
+        gate.set()
+
+        assert scheduler.join()
+        assert order == ["old-background", "new-critical"]
+        scheduler.close()
+
+    def test_results_and_metrics(self, scheduler):
+        """Futures carry results/errors and stats count per priority."""
+        assert scheduler.submit(PriorityLevel.HIGH, lambda: 42).result(5) == 42
+        failing = scheduler.submit(PriorityLevel.LOW, lambda: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            failing.result(5)
+
+        assert scheduler.join()
+        stats = scheduler.stats()["priorities"]
+        assert stats["HIGH"]["completed"] == 1
+        assert stats["LOW"]["failed"] == 1
+        assert stats["BACKGROUND"]["depth"] == 0
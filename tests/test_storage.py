@@ -13,6 +13,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 
 from commander_os.storage.base_storage import BaseStorage
 from commander_os.storage.agent_storage import AgentStorage
+from commander_os.storage.sqlite_engine import SQLiteEngine
 from commander_os.agents.recruiter.recruiter_storage import RecruiterAgentStorage
 from commander_os.agents.commander.commander_storage import CommanderStorage
 
@@ -55,7 +56,7 @@ class TestBaseStorage:
         storage.conn.commit()
         
         yield storage
-        storage.conn.close()
+        storage.engine.close()
     
     def test_initialization(self, temp_dir):
         """Test storage initialization"""
@@ -69,7 +70,7 @@ class TestBaseStorage:
         assert storage.conn is not None
         assert storage.db_path.exists()
         
-        storage.conn.close()
+        storage.engine.close()
     
     def test_wal_mode_enabled(self, temp_dir):
         """Test that WAL mode is properly enabled"""
@@ -85,7 +86,7 @@ class TestBaseStorage:
         
         assert result[0].lower() == 'wal'
         
-        storage.conn.close()
+        storage.engine.close()
     
     def test_sync_queue_creation(self, storage):
         """Test that sync queue table is created"""
@@ -134,7 +135,7 @@ class TestAgentStorage:
             enable_htpc=False
         )
         yield storage
-        storage.conn.close()
+        storage.engine.close()
     
     def test_set_and_get(self, storage):
         """Test basic set/get operations"""
@@ -183,7 +184,7 @@ class TestRecruiterAgentStorage:
             enable_htpc=False
         )
         yield storage
-        storage.conn.close()
+        storage.engine.close()
     
     @pytest.mark.asyncio
     async def test_add_candidate(self, storage):
@@ -334,7 +335,7 @@ class TestCommanderStorage:
             enable_htpc=False
         )
         yield storage
-        storage.conn.close()
+        storage.engine.close()
     
     @pytest.mark.asyncio
     async def test_register_agent(self, storage):
@@ -397,6 +398,140 @@ class TestCommanderStorage:
         })
 
 
+class TestGroupCommit:
+    """Test group commit and batched local writes"""
+    
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for tests"""
+        temp_path = Path(tempfile.mkdtemp())
+        yield temp_path
+        shutil.rmtree(temp_path, ignore_errors=True)
+    
+    @pytest.fixture
+    def storage(self, temp_dir):
+        """Create CommanderStorage instance"""
+        storage = CommanderStorage(
+            data_dir=temp_dir,
+            enable_htpc=False
+        )
+        yield storage
+        storage.engine.close()
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_writes_share_commits(self, storage):
+        """Concurrent write_data callers are grouped into few transactions"""
+        results = await asyncio.gather(*[
+            storage.record_metric('throughput', 'tps', float(i))
+            for i in range(50)
+        ])
+        
+        assert len(results) == 50
+        stats = storage.engine.stats()
+        assert stats['writes']['count'] == 50
+        assert stats['commits'] < 50
+        assert storage.query_local("SELECT COUNT(*) FROM metrics") == [(50,)]
+    
+    @pytest.mark.asyncio
+    async def test_failed_row_does_not_sink_group(self, storage):
+        """A bad record fails alone while the rest of the group commits"""
+        good, bad = await asyncio.gather(
+            storage.write_data('metrics', {'id': 'm1', 'metric_type': 'load', 'metric_name': 'cpu', 'value': 1.0}),
+            storage.write_data('tasks', {'id': 't1'})  # missing required title
+        )
+        
+        assert good is True
+        assert bad is False
+        assert storage.query_local("SELECT id FROM metrics") == [('m1',)]
+        assert storage.query_local("SELECT COUNT(*) FROM tasks") == [(0,)]
+    
+    @pytest.mark.asyncio
+    async def test_batch_write_single_transaction(self, storage):
+        """batch_write applies every valid record and skips invalid ones"""
+        records = [
+            {'table': 'metrics', 'operation': 'insert',
+             'data': {'id': f'm{i}', 'metric_type': 'load', 'metric_name': 'cpu', 'value': float(i)}}
+            for i in range(10)
+        ]
+        records.append({'table': 'tasks', 'operation': 'insert', 'data': {'id': 't1'}})
+        records.append({'table': 'tasks', 'operation': 'insert', 'data': {'id': 't2', 'title': 'Plan'}})
+        
+        written = await storage.batch_write(records)
+        
+        assert written == 11
+        assert storage.query_local("SELECT COUNT(*) FROM metrics") == [(10,)]
+        assert storage.query_local("SELECT id FROM tasks") == [('t2',)]
+
+
+class TestSQLiteEngine:
+    """Test the writer thread / reader pool engine"""
+    
+    @pytest.fixture
+    def engine(self):
+        """Create an engine over a scratch database"""
+        temp_path = Path(tempfile.mkdtemp())
+        engine = SQLiteEngine(temp_path / "engine.db", read_pool_size=2)
+        engine.conn.execute("CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER)")
+        engine.conn.commit()
+        yield engine
+        engine.close()
+        shutil.rmtree(temp_path, ignore_errors=True)
+    
+    @pytest.mark.asyncio
+    async def test_write_runs_off_event_loop(self, engine):
+        """Write jobs execute on the writer thread, not the caller's"""
+        import threading
+        
+        def job(conn):
+            conn.execute("INSERT INTO kv VALUES ('a', 1)")
+            return threading.current_thread().name
+        
+        thread_name = await engine.write(job)
+        
+        assert thread_name.startswith("sqlite-writer")
+        assert await engine.read(lambda conn: conn.execute("SELECT v FROM kv").fetchall()) == [(1,)]
+    
+    @pytest.mark.asyncio
+    async def test_failed_job_is_isolated(self, engine):
+        """A raising job rolls back alone and surfaces its exception"""
+        def bad(conn):
+            conn.execute("INSERT INTO kv VALUES ('b', 2)")
+            raise ValueError("boom")
+        
+        ok, failed = await asyncio.gather(
+            engine.write(lambda conn: conn.execute("INSERT INTO kv VALUES ('a', 1)")),
+            engine.write(bad),
+            return_exceptions=True
+        )
+        
+        assert isinstance(failed, ValueError)
+        rows = await engine.read(lambda conn: conn.execute("SELECT k FROM kv").fetchall())
+        assert rows == [('a',)]
+    
+    def test_readers_are_read_only(self, engine):
+        """Reader pool connections reject writes"""
+        import sqlite3
+        
+        future = engine.submit_read(lambda conn: conn.execute("INSERT INTO kv VALUES ('x', 0)"))
+        with pytest.raises(sqlite3.OperationalError):
+            future.result()
+    
+    def test_close_drains_pending_writes(self, engine):
+        """Writes queued before close are committed"""
+        futures = [
+            engine.submit_write(lambda conn, i=i: conn.execute("INSERT INTO kv VALUES (?, ?)", (str(i), i)))
+            for i in range(20)
+        ]
+        db_path = engine.db_path
+        engine.close()
+        
+        assert all(f.done() for f in futures)
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM kv").fetchone() == (20,)
+        conn.close()
+
+
 class TestStorageWithHTPC:
     """Test storage with HTPC integration (mocked)"""
     
@@ -432,7 +567,7 @@ class TestStorageWithHTPC:
             # Verify HTPC was called
             assert mock_post.called
             
-            storage.conn.close()
+            storage.engine.close()
             await storage.close()
     
     @pytest.mark.asyncio
@@ -458,8 +593,113 @@ class TestStorageWithHTPC:
             queue_size = storage.get_sync_queue_size()
             assert queue_size > 0
             
-            storage.conn.close()
+            storage.engine.close()
+            await storage.close()
+
+
+class TestSyncQueueDrainer:
+    """Test batched sync queue draining (mocked HTPC)"""
+    
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for tests"""
+        temp_path = Path(tempfile.mkdtemp())
+        yield temp_path
+        shutil.rmtree(temp_path, ignore_errors=True)
+    
+    def _make_storage(self, temp_dir, max_retry_count=3):
+        storage = AgentStorage(
+            agent_id="test-agent",
+            data_dir=temp_dir,
+            htpc_url="http://localhost:8001",
+            enable_htpc=True
+        )
+        storage.max_retry_count = max_retry_count
+        for i in range(5):
+            storage._queue_for_sync('agent_data', {'id': str(i), 'key': f'k{i}'}, 'insert')
+        return storage
+    
+    @pytest.mark.asyncio
+    async def test_drain_ships_single_batch(self, temp_dir):
+        """Queued rows are shipped in one /relay/batch call and deleted on ack"""
+        with patch('httpx.AsyncClient') as mock_client:
+            mock_response = MagicMock()
+            mock_response.raise_for_status = MagicMock()
+            mock_response.json = MagicMock(return_value={"status": "accepted", "count": 5})
+            mock_post = AsyncMock(return_value=mock_response)
+            mock_client.return_value.post = mock_post
+            mock_client.return_value.aclose = AsyncMock()
+            
+            storage = self._make_storage(temp_dir)
+            synced = await storage.process_sync_queue()
+            
+            assert synced == 5
+            assert mock_post.call_count == 1
+            assert mock_post.call_args[0][0].endswith('/relay/batch')
+            assert len(mock_post.call_args[1]['json']['records']) == 5
+            assert storage.get_sync_queue_size() == 0
+            
+            await storage.close()
+    
+    @pytest.mark.asyncio
+    async def test_failed_drain_does_not_duplicate(self, temp_dir):
+        """A failed batch bumps retry_count without re-queueing rows"""
+        with patch('httpx.AsyncClient') as mock_client:
+            mock_client.return_value.post = AsyncMock(side_effect=Exception("HTPC unavailable"))
+            mock_client.return_value.aclose = AsyncMock()
+            
+            storage = self._make_storage(temp_dir)
+            synced = await storage.process_sync_queue()
+            
+            assert synced == 0
+            assert storage.get_sync_queue_size() == 5
+            retries = storage.query_local("SELECT DISTINCT retry_count FROM sync_queue")
+            assert retries == [(1,)]
+            assert storage._next_sync_delay(0, 100) <= storage.sync_backoff_base
+            
+            await storage.close()
+    
+    @pytest.mark.asyncio
+    async def test_exhausted_rows_move_to_dead_letter(self, temp_dir):
+        """Rows that reach max_retry_count land in the dead-letter table"""
+        with patch('httpx.AsyncClient') as mock_client:
+            mock_client.return_value.post = AsyncMock(side_effect=Exception("HTPC unavailable"))
+            mock_client.return_value.aclose = AsyncMock()
+            
+            storage = self._make_storage(temp_dir, max_retry_count=3)
+            for _ in range(3):
+                await storage.process_sync_queue()
+            
+            assert storage.get_sync_queue_size() == 0
+            assert storage.get_dead_letter_size() == 5
+            assert storage.health_check()['dead_letter_size'] == 5
+            
+            await storage.close()
+    
+    @pytest.mark.asyncio
+    async def test_drainer_task_lifecycle(self, temp_dir):
+        """The background drainer empties the queue and stops cleanly"""
+        with patch('httpx.AsyncClient') as mock_client:
+            mock_response = MagicMock()
+            mock_response.raise_for_status = MagicMock()
+            mock_response.json = MagicMock(return_value={"status": "accepted", "count": 2})
+            mock_client.return_value.post = AsyncMock(return_value=mock_response)
+            mock_client.return_value.aclose = AsyncMock()
+            
+            storage = self._make_storage(temp_dir)
+            storage.sync_batch_size = 2
+            storage._queue_for_sync('agent_data', {'id': '5', 'key': 'k5'}, 'insert')
+            
+            task = storage.start_sync_drainer()
+            assert task is not None
+            for _ in range(50):
+                if storage.get_sync_queue_size() == 0:
+                    break
+                await asyncio.sleep(0.01)
+            
+            assert storage.get_sync_queue_size() == 0
             await storage.close()
+            assert task.done()
 
 
 # Run tests